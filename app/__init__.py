@@ -1,46 +1,115 @@
-import logging
-from logging.handlers import RotatingFileHandler
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
-from flask_migrate import Migrate
 from flask_login import LoginManager
-import sqlalchemy as sa
-import sqlalchemy.orm as so
-from config import Config
+from config import Config, ProductionConfig
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Extensions are created unbound here and attached to an app by create_app(),
+# so importing the package builds no app, engine or log file.
 
-app = Flask(__name__)
-app.config.from_object(Config)
+from app.database import RoutingSession, configure_engines
 
-mail = Mail(app)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+mail = Mail()
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+login = LoginManager()
+login.login_view = "auth.login"
 
-login = LoginManager(app)
-login.login_view = "login"
+from app.metrics import Metrics
 
-if not app.debug:
-    if not os.path.exists("logs"):
-        os.mkdir("logs")
-    file_handler = RotatingFileHandler(
-        "logs/skylog.log", maxBytes=10240, backupCount=10
-    )
-    file_handler.setFormatter(
-        logging.Formatter(
-            "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-        )
-    )
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+metrics = Metrics()
 
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('Skylog startup')
+from app.hashing import PasswordHasher
 
+hasher = PasswordHasher()
 
-from app import routes, models, errors
+from app.user_cache import UserCache
+
+user_cache = UserCache()
+
+from app.last_seen import LastSeenBuffer
+
+last_seen = LastSeenBuffer()
+
+from app.page_cache import PageCache
+
+page_cache = PageCache()
+
+from app.stats import stats_cache
+from app.leaderboard import rank_cache
+from app.scoregrid import ScoreGridCache
+
+scoregrid = ScoreGridCache()
+
+from app.live import LiveScores
+
+live_scores = LiveScores()
+
+from app.mail_queue import MailQueue
+
+mail_queue = MailQueue()
+
+from app.assets import StaticAssets
+
+assets = StaticAssets()
+
+from app.logs import LogPipeline
+
+log_pipeline = LogPipeline()
+
+
+def create_app(config=None):
+    """Build the Skylog app; config is a class or object for
+    app.config.from_object, by default chosen by SKYLOG_ENV."""
+    if config is None:
+        production = os.environ.get("SKYLOG_ENV") == "production"
+        config = ProductionConfig if production else Config
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    log_pipeline.init_app(app)
+
+    mail.init_app(app)
+    db.init_app(app)
+    configure_engines(app, db)
+    login.init_app(app)
+
+    metrics.init_app(app)
+    hasher.init_app(app)
+    user_cache.init_app(app)
+    last_seen.init_app(app)
+    page_cache.init_app(app)
+    rank_cache.init_app(app)
+    scoregrid.init_app(app)
+    live_scores.init_app(app)
+    mail_queue.init_app(app)
+    assets.init_app(app)
+
+    metrics.register_collector(hasher.metric_lines)
+    metrics.register_collector(user_cache.metric_lines)
+    metrics.register_collector(last_seen.metric_lines)
+    metrics.register_collector(page_cache.metric_lines)
+    metrics.register_collector(stats_cache.metric_lines)
+    metrics.register_collector(rank_cache.metric_lines)
+    metrics.register_collector(scoregrid.metric_lines)
+    metrics.register_collector(live_scores.metric_lines)
+    metrics.register_collector(mail_queue.metric_lines)
+    metrics.register_collector(log_pipeline.metric_lines)
+
+    # views and commands are only imported once an app is wanted
+    from app import auth, matches, scores, errors, cli
+
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(matches.bp)
+    app.register_blueprint(scores.bp)
+    app.register_blueprint(errors.bp)
+    app.register_blueprint(cli.bp)
+
+    return app
+
+
+from app import models
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from app import db
+from app.models import ArchivedMatch, ArchivedScore, Match, Score, User, DataVersion
+from app.scoreboard import pivot
+from app.scorecard import delete_matches, refresh_derived
+
+BATCH_SIZE = 500
+_MATCH_COLUMNS = ["id", "opponent", "location", "timestamp"]
+_SCORE_COLUMNS = ["id", "score", "turn_number", "user_id", "match_id"]
+
+
+class MatchIdTaken(ValueError):
+    """Raised when restoring a match whose id, or the id of one of whose
+    scores, has since been reused."""
+
+
+@dataclass
+class ArchiveStats:
+    matches: int = 0
+    scores: int = 0
+
+
+def cutoff(days):
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def archive_matches(before, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """Move the matches played before `before`, and their scores, into the
+    archive tables.
+
+    Each batch of matches is copied with two INSERT ... SELECTs and then
+    removed with one DELETE, whose cascade takes the scores and rollup rows,
+    and is committed on its own so writers are never held up for long.
+    Archived matches leave their players' totals and statistics, as if
+    deleted, until restored.
+    """
+    stats = ArchiveStats()
+    old = sa.select(Match.id).where(Match.timestamp < before)
+    if dry_run:
+        stats.matches = db.session.scalar(
+            sa.select(sa.func.count()).select_from(old.subquery())
+        )
+        stats.scores = db.session.scalar(
+            sa.select(sa.func.count(Score.id)).where(Score.match_id.in_(old))
+        )
+        return stats
+
+    while True:
+        match_ids = db.session.scalars(
+            old.order_by(Match.timestamp).limit(batch_size)
+        ).all()
+        if not match_ids:
+            return stats
+        db.session.execute(
+            sa.insert(ArchivedMatch).from_select(
+                _MATCH_COLUMNS + ["archived_at"],
+                sa.select(
+                    Match.id,
+                    Match.opponent,
+                    Match.location,
+                    Match.timestamp,
+                    sa.literal(datetime.now(timezone.utc), sa.DateTime()),
+                ).where(Match.id.in_(match_ids)),
+            )
+        )
+        stats.scores += db.session.execute(
+            sa.insert(ArchivedScore).from_select(
+                _SCORE_COLUMNS,
+                sa.select(
+                    Score.id,
+                    Score.score,
+                    Score.turn_number,
+                    Score.user_id,
+                    Score.match_id,
+                ).where(Score.match_id.in_(match_ids)),
+            )
+        ).rowcount
+        stats.matches += delete_matches(match_ids)
+        db.session.commit()
+        if progress is not None:
+            progress(stats)
+
+
+def restore_match(match_id):
+    """Move an archived match and its scores back, in the caller's
+    transaction; returns False if there is no such archived match."""
+    if db.session.get(ArchivedMatch, match_id) is None:
+        return False
+    if db.session.get(Match, match_id) is not None:
+        raise MatchIdTaken(f"match {match_id} already exists")
+    # match and score are AUTOINCREMENT, but databases created before that
+    # may already have handed archived ids out again
+    taken = db.session.scalars(
+        sa.select(Score.id).where(
+            Score.id.in_(
+                sa.select(ArchivedScore.id).where(ArchivedScore.match_id == match_id)
+            )
+        )
+    ).all()
+    if taken:
+        raise MatchIdTaken(
+            f"scores {', '.join(map(str, sorted(taken)))} of match {match_id} "
+            "already exist"
+        )
+
+    db.session.execute(
+        sa.insert(Match).from_select(
+            _MATCH_COLUMNS,
+            sa.select(
+                ArchivedMatch.id,
+                ArchivedMatch.opponent,
+                ArchivedMatch.location,
+                ArchivedMatch.timestamp,
+            ).where(ArchivedMatch.id == match_id),
+        )
+    )
+    db.session.execute(
+        sa.insert(Score).from_select(
+            _SCORE_COLUMNS,
+            sa.select(
+                ArchivedScore.id,
+                ArchivedScore.score,
+                ArchivedScore.turn_number,
+                ArchivedScore.user_id,
+                ArchivedScore.match_id,
+            ).where(ArchivedScore.match_id == match_id),
+        )
+    )
+    user_ids = db.session.scalars(
+        sa.select(ArchivedScore.user_id)
+        .where(ArchivedScore.match_id == match_id)
+        .distinct()
+    ).all()
+    db.session.execute(
+        sa.delete(ArchivedMatch).where(ArchivedMatch.id == match_id),
+        execution_options={"synchronize_session": False},
+    )
+    refresh_derived((match_id, user_id) for user_id in user_ids)
+    DataVersion.bump("matches")
+    return True
+
+
+def archived_scoreboard(match_id):
+    """The Scoreboard of an archived match, read from the archive tables."""
+    rows = db.session.execute(
+        sa.select(
+            User.id, User.username, ArchivedScore.turn_number, ArchivedScore.score
+        )
+        .join(ArchivedScore, ArchivedScore.user_id == User.id)
+        .where(ArchivedScore.match_id == match_id)
+        .order_by(User.username, ArchivedScore.turn_number)
+    ).all()
+    return pivot(match_id, rows)
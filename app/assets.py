@@ -0,0 +1,169 @@
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import urllib.request
+from flask import abort, request, send_file, url_for
+
+HASH_LENGTH = 10
+FAR_FUTURE = 365 * 24 * 60 * 60
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".json", ".txt", ".html")
+# served variants in order of preference: (Accept-Encoding token, suffix)
+ENCODINGS = (("gzip", ".gz"),)
+_FINGERPRINTED = re.compile(rf"^(.+)\.([0-9a-f]{{{HASH_LENGTH}}})(\.[^./]+)$")
+
+BOOTSTRAP_VERSION = "5.3.2"
+# the same files and Subresource Integrity hashes as the CDN tags in base.html
+BOOTSTRAP_FILES = {
+    "css/bootstrap.min.css": "sha384-T3c6CoIi6uLrA9TneNEoa7RxnatzjcDSCmG1MXxSR1GAsXEV/Dwwykc2MPK8M2HN",
+    "js/bootstrap.bundle.min.js": "sha384-VzZ2C4A4rrvlVhYQUc3K4Ae77I+bbHZC3Q6AelM9J/nqa8U6gUfxFcPQGHepW5y5",
+}
+BOOTSTRAP_DIR = "vendor/bootstrap"
+
+
+class StaticAssets:
+    """Content-hashed URLs for files under app/static.
+
+    static_url("js/matches.js") in a template gives /assets/js/matches.<hash>.js,
+    where the hash is taken from the file's contents on first use. Those URLs
+    change whenever the file does, so they are served with a year-long
+    immutable Cache-Control, and with the .gz file `flask assets build` wrote
+    for that hash when the browser accepts it.
+    """
+
+    def __init__(self, app=None):
+        self.root = None
+        self.debug = False
+        self._hashes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.static_folder
+        self.debug = app.debug
+        app.add_url_rule("/assets/<path:filename>", "assets", self.serve)
+        app.jinja_env.globals["static_url"] = self.static_url
+
+    def fingerprint(self, filename):
+        """The content hash of a static file, or None if there is no such file."""
+        path = self._path(filename)
+        if path is None:
+            return None
+        # in debug mode files change under the running server
+        key = (filename, os.path.getmtime(path)) if self.debug else filename
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = _digest(f.read())
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def static_url(self, filename):
+        digest = self.fingerprint(filename)
+        if digest is None:
+            return url_for("static", filename=filename)
+        stem, ext = os.path.splitext(filename)
+        return url_for("assets", filename=f"{stem}.{digest}{ext}")
+
+    def serve(self, filename):
+        match = _FINGERPRINTED.match(filename)
+        if match is None:
+            abort(404)
+        stem, digest, ext = match.groups()
+        original = stem + ext
+        if self.fingerprint(original) != digest:
+            abort(404)
+
+        path = self._path(original)
+        mimetype = mimetypes.guess_type(original)[0] or "application/octet-stream"
+        encoding = None
+        # variants are named after the content they were built from, so one
+        # left over from an older version of the file is never picked up
+        built = os.path.join(os.path.dirname(path), os.path.basename(filename))
+        for token, suffix in ENCODINGS:
+            if token in request.accept_encodings and os.path.isfile(built + suffix):
+                path, encoding = built + suffix, token
+                break
+
+        response = send_file(path, mimetype=mimetype, max_age=FAR_FUTURE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.content_encoding = encoding
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._hashes.clear()
+
+    def _path(self, filename):
+        path = os.path.realpath(os.path.join(self.root, filename))
+        root = os.path.realpath(self.root)
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def build(root, vendor_bootstrap=False):
+    """Write a .gz copy of each compressible file under root, named after its
+    content hash (js/app.js -> js/app.<hash>.js.gz), and remove copies built
+    from older versions; optionally vendors Bootstrap first. Returns the paths
+    written."""
+    written = []
+    if vendor_bootstrap:
+        written.extend(download_bootstrap(root))
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            fingerprinted = os.path.join(directory, f"{stem}.{_digest(data)}{ext}")
+            for other in files:
+                match = _FINGERPRINTED.match(other.rsplit(".", 1)[0])
+                if (
+                    other.endswith(".gz")
+                    and match is not None
+                    and match.group(1, 3) == (stem, ext)
+                ):
+                    os.remove(os.path.join(directory, other))
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            # not worth sending if it barely saves anything
+            if len(compressed) < len(data) * 0.9:
+                with open(fingerprinted + ".gz", "wb") as f:
+                    f.write(compressed)
+                written.append(fingerprinted + ".gz")
+    return written
+
+
+def download_bootstrap(root):
+    """Fetch the Bootstrap files base.html uses into static/vendor/bootstrap,
+    checking each against its integrity hash."""
+    written = []
+    for name, integrity in BOOTSTRAP_FILES.items():
+        url = f"https://cdn.jsdelivr.net/npm/bootstrap@{BOOTSTRAP_VERSION}/dist/{name}"
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        algorithm, expected = integrity.split("-", 1)
+        actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+        if actual != expected:
+            raise ValueError(f"{url} does not match its integrity hash")
+        path = os.path.join(root, BOOTSTRAP_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        written.append(path)
+    return written
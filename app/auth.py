@@ -0,0 +1,208 @@
+from urllib.parse import urlsplit
+from flask import Blueprint, render_template, flash, redirect, url_for, request
+from flask_login import current_user, login_user, logout_user, login_required
+import sqlalchemy as sa
+from app import db, last_seen, page_cache, user_cache
+from app.forms import (
+    LoginForm,
+    RegistrationForm,
+    UpdateProfileForm,
+    ChangePasswordForm,
+)
+from app.models import User, Score, Match, UserTotal, DataVersion
+from app.leaderboard import head_to_head
+from app.stats import FORM_MATCHES, stats_cache
+
+bp = Blueprint("auth", __name__)
+
+
+@bp.route("/login", methods=["GET", "POST"])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for("matches.matches"))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = db.session.scalar(
+            sa.select(User).where(User.username == form.username.data)
+        )
+        if user is None or not user.check_password(form.password.data):
+            flash("Invalid username or password")
+            return redirect(url_for("auth.login"))
+        if not user.is_active:
+            flash("This account has been deactivated.", "danger")
+            return redirect(url_for("auth.login"))
+        if user.rehash_password(form.password.data):
+            db.session.commit()
+        login_user(user, remember=form.remember_me.data)
+        next_page = request.args.get("next")
+        if not next_page or urlsplit(next_page).netloc != "":
+            next_page = url_for("matches.matches")
+        return redirect(url_for("matches.matches"))
+    return render_template("login.html", title="Sign In", form=form)
+
+
+@bp.route("/logout")
+def logout():
+    logout_user()
+    return redirect(url_for("matches.matches"))
+
+
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for("matches.matches"))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            forename=form.forename.data,
+            surname=form.surname.data,
+        )
+        user.set_password(form.password.data)
+        db.session.add(user)
+        DataVersion.bump("users")
+        db.session.commit()
+        flash("Congratulations, you are now a registered user!")
+        return redirect(url_for("auth.login"))
+    return render_template("register.html", title="Register", form=form)
+
+
+def user_page_keys(username):
+    user_id = db.session.scalar(sa.select(User.id).where(User.username == username))
+    return ["users", "matches", f"user:{user_id}"]
+
+
+@bp.route("/user/<username>")
+@login_required
+@page_cache.conditional(user_page_keys)
+def user(username):
+    user = (
+        db.session.execute(sa.select(User).where(User.username == username))
+        .scalars()
+        .first()
+    )
+
+    if current_user == user:
+        profile_form = UpdateProfileForm(obj=current_user)
+        password_form = ChangePasswordForm()
+    else:
+        profile_form = None
+        password_form = None
+
+    if (
+        profile_form
+        and profile_form.validate_on_submit()
+        and "update_profile" in request.form
+    ):
+        current_user.username = profile_form.username.data
+        current_user.email = profile_form.email.data
+        DataVersion.bump("users")
+        db.session.commit()
+        user_cache.invalidate(current_user.id)
+        flash("Profile updated successfully!", "success")
+        return redirect(url_for("auth.user", username=current_user.username))
+
+    if (
+        password_form
+        and password_form.validate_on_submit()
+        and "change_password" in request.form
+    ):
+        if not current_user.check_password(password_form.current_password.data):
+            flash("Current password is incorrect.", "danger")
+        else:
+            current_user.set_password(password_form.new_password.data)
+            db.session.commit()
+            flash("Password changed successfully!", "success")
+            return redirect(url_for("auth.user"))
+
+    matches = (
+        db.session.execute(
+            sa.select(Match)
+            .join(Score)
+            .where(Score.user_id == user.id)
+            .order_by(Match.timestamp.desc())
+            .distinct()
+        )
+        .scalars()
+        .all()
+    )
+    return render_template(
+        "user.html",
+        user=user,
+        totals=db.session.get(UserTotal, user.id),
+        stats=stats_cache.get(user.id),
+        form_matches=FORM_MATCHES,
+        opponents=head_to_head(user.id),
+        matches=matches,
+        profile_form=profile_form,
+        password_form=password_form,
+    )
+
+
+@bp.route("/user/<username>/opponents.json")
+@login_required
+@page_cache.conditional(user_page_keys)
+def user_opponents(username):
+    user = db.first_or_404(sa.select(User).where(User.username == username))
+    return {
+        "username": user.username,
+        "opponents": [record.to_json() for record in head_to_head(user.id)],
+    }
+
+
+@bp.before_app_request
+def before_request():
+    if current_user.is_authenticated:
+        # buffered, written at most once per LAST_SEEN_RESOLUTION per user
+        last_seen.touch(current_user.id)
+
+
+@bp.route("/profile", methods=["GET", "POST"])
+@login_required
+def profile():
+    profile_form = UpdateProfileForm(obj=current_user)
+    password_form = ChangePasswordForm()
+
+    if profile_form.validate_on_submit() and "update_profile" in request.form:
+        current_user.username = profile_form.username.data
+        current_user.email = profile_form.email.data
+        DataVersion.bump("users")
+        db.session.commit()
+        user_cache.invalidate(current_user.id)
+        flash("Profile updated successfully!", "success")
+        return redirect(url_for("auth.profile"))
+
+    if password_form.validate_on_submit() and "change_password" in request.form:
+        if not current_user.check_password(password_form.current_password.data):
+            flash("Current password is incorrect.", "danger")
+        else:
+            current_user.set_password(password_form.new_password.data)
+            db.session.commit()
+            flash("Password changed successfully!", "success")
+            return redirect(url_for("auth.profile"))
+
+    return render_template(
+        "profile.html",
+        profile_form=profile_form,
+        password_form=password_form,
+    )
+
+
+@bp.route("/user/delete/<int:user_id>", methods=["POST"])
+@login_required
+def delete_user(user_id):
+    if user_id != current_user.id:
+        flash("you are not authorised to delete this account.", "datnger")
+        return redirect(url_for("auth.user", username=current_user.username))
+
+    user = current_user
+
+    # dactivate account
+    user.is_active = False
+    DataVersion.bump("users")
+    db.session.commit()
+    user_cache.invalidate(user_id)
+
+    flash("Your account has been deleted.", "success")
+    return redirect(url_for("matches.matches"))
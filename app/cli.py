@@ -0,0 +1,252 @@
+import click
+from flask import Blueprint, current_app
+from app import db, mail_queue as outbound_mail
+from app import assets as static_assets
+from app import rollups as rollup_tables
+from app import seed as seed_data
+from app import archive as match_archive
+from app.assets import build as build_assets
+from app.export import FORMATS, export, parse_date
+from app.importer import BATCH_SIZE, InvalidRow, import_scores, read_records
+
+# commands are added to the top level of `flask`, not under a "cli" group
+bp = Blueprint("cli", __name__, cli_group=None)
+
+
+@bp.cli.command(
+    "db",
+    context_settings={"ignore_unknown_options": True, "allow_extra_args": True},
+    add_help_option=False,
+)
+@click.pass_context
+def migrate_commands(ctx):
+    """Perform database migrations."""
+    # Flask-Migrate and Alembic are only imported when this is run, not in
+    # every process that builds the app
+    from flask_migrate import Migrate
+    from flask_migrate.cli import db as db_commands
+
+    if "migrate" not in current_app.extensions:
+        Migrate(current_app, db)
+    db_commands.main(
+        ctx.args, prog_name=ctx.command_path, standalone_mode=False, obj=ctx.obj
+    )
+
+
+@bp.cli.group()
+def rollups():
+    """Score rollup table commands."""
+    pass
+
+
+@rollups.command()
+def rebuild():
+    """Rebuild the match and user totals from the score table."""
+    match_rows, user_rows = rollup_tables.rebuild()
+    click.echo(f"Rebuilt {match_rows} match totals and {user_rows} user totals.")
+
+
+@rollups.command()
+def verify():
+    """Check the match and user totals against the score table."""
+    problems = rollup_tables.verify()
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise click.ClickException(f"{len(problems)} rollup rows are out of date.")
+    click.echo("Rollups match the score table.")
+
+
+@bp.cli.group()
+def leaderboard():
+    """Leaderboard commands."""
+    pass
+
+
+@leaderboard.command("rebuild")
+def rebuild_leaderboard():
+    """Rebuild every leaderboard from the score table."""
+    entries = rollup_tables.rebuild_leaderboards()
+    db.session.commit()
+    click.echo(f"Rebuilt {entries} leaderboard entries.")
+
+
+@bp.cli.command()
+@click.option("--users", default=50, show_default=True, help="Users to create.")
+@click.option("--matches", default=500, show_default=True, help="Matches to create.")
+@click.option("--seed", type=int, default=None, help="Random seed for repeatable data.")
+@click.option(
+    "--password",
+    default="password",
+    show_default=True,
+    help="Password given to every generated user.",
+)
+def seed(users, matches, seed, password):
+    """Fill the database with synthetic users, matches and scores."""
+    user_rows, match_rows, score_rows = seed_data.generate(
+        users, matches, seed=seed, password=password
+    )
+    click.echo(
+        f"Created {user_rows} users, {match_rows} matches and {score_rows} scores."
+    )
+
+
+def _date_option(ctx, param, value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise click.BadParameter("use YYYY-MM-DD")
+
+
+@bp.cli.command("export")
+@click.argument("kind", type=click.Choice(["matches", "scores"]))
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)), default="csv")
+@click.option("--output", type=click.File("w"), default="-", help="Defaults to stdout.")
+@click.option("--user", "username", help="Only matches or scores of this username.")
+@click.option("--opponent", help="Only matches against this opponent.")
+@click.option("--since", callback=_date_option, help="First day, YYYY-MM-DD.")
+@click.option("--until", callback=_date_option, help="Last day, YYYY-MM-DD.")
+@click.option("--after", type=int, default=0, help="Resume after this row id.")
+def export_command(kind, fmt, output, username, opponent, since, until, after):
+    """Stream matches or scores as CSV or NDJSON."""
+    for chunk in export(
+        kind,
+        fmt,
+        username=username,
+        opponent=opponent,
+        since=since,
+        until=until,
+        after=after,
+    ):
+        output.write(chunk)
+
+
+@bp.cli.command("import-scores")
+@click.argument("source", type=click.File("r"))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(list(FORMATS)),
+    help="Defaults to the file's extension.",
+)
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Validate the file without writing.")
+def import_scores_command(source, fmt, batch_size, dry_run):
+    """Load scorecards from a CSV or NDJSON file (e.g. a scores export)."""
+    fmt = fmt or ("ndjson" if source.name.endswith((".ndjson", ".jsonl")) else "csv")
+
+    def progress(stats):
+        click.echo(
+            f"{stats.rows} rows ({stats.rows_per_second:.0f} rows/s)...", err=True
+        )
+
+    try:
+        stats = import_scores(
+            read_records(source, fmt),
+            batch_size=batch_size,
+            dry_run=dry_run,
+            progress=progress,
+        )
+    except InvalidRow as exc:
+        raise click.ClickException(f"{exc}; earlier batches were committed.")
+
+    for error in stats.errors:
+        click.echo(error, err=True)
+    verb = "Checked" if dry_run else "Imported"
+    click.echo(
+        f"{verb} {stats.rows} rows in {stats.seconds:.1f}s "
+        f"({stats.rows_per_second:.0f} rows/s), "
+        f"{stats.matches_created} new matches."
+    )
+    if stats.errors:
+        raise click.ClickException(f"{len(stats.errors)} invalid rows.")
+
+
+@bp.cli.group()
+def archive():
+    """Match archive commands."""
+    pass
+
+
+@archive.command("run")
+@click.option(
+    "--older-than",
+    "days",
+    type=int,
+    help="Age in days of the matches to archive; defaults to ARCHIVE_AFTER_DAYS.",
+)
+@click.option("--batch-size", default=match_archive.BATCH_SIZE, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Only count what would be archived.")
+def archive_run(days, batch_size, dry_run):
+    """Move old matches and their scores into the archive tables."""
+    if days is None:
+        days = current_app.config["ARCHIVE_AFTER_DAYS"]
+
+    def progress(stats):
+        click.echo(f"{stats.matches} matches...", err=True)
+
+    stats = match_archive.archive_matches(
+        match_archive.cutoff(days),
+        batch_size=batch_size,
+        dry_run=dry_run,
+        progress=progress,
+    )
+    verb = "Would archive" if dry_run else "Archived"
+    click.echo(
+        f"{verb} {stats.matches} matches older than {days} days "
+        f"and {stats.scores} scores."
+    )
+
+
+@archive.command("restore")
+@click.argument("match_id", type=int)
+def archive_restore(match_id):
+    """Move an archived match and its scores back."""
+    try:
+        restored = match_archive.restore_match(match_id)
+    except match_archive.MatchIdTaken as exc:
+        raise click.ClickException(str(exc))
+    if not restored:
+        raise click.ClickException(f"match {match_id} is not archived")
+    db.session.commit()
+    click.echo(f"Restored match {match_id}.")
+
+
+@bp.cli.group("mail-queue")
+def mail_queue():
+    """Outbound mail queue commands."""
+    pass
+
+
+@mail_queue.command("send")
+def send_mail():
+    """Send every queued message that is due."""
+    sent = outbound_mail.send_due()
+    click.echo(f"Sent {sent} messages.")
+
+
+@mail_queue.command("status")
+def mail_status():
+    """Show how many messages are in each state."""
+    for status, count in outbound_mail.depth().items():
+        click.echo(f"{status:<8} {count}")
+
+
+@bp.cli.group()
+def assets():
+    """Static asset commands."""
+    pass
+
+
+@assets.command("build")
+@click.option(
+    "--vendor-bootstrap",
+    is_flag=True,
+    help="Download Bootstrap into app/static/vendor first (for BOOTSTRAP_LOCAL).",
+)
+def build_assets_command(vendor_bootstrap):
+    """Write precompressed copies of the static files."""
+    written = build_assets(static_assets.root, vendor_bootstrap=vendor_bootstrap)
+    for path in written:
+        click.echo(path)
+    click.echo(f"Wrote {len(written)} files.")
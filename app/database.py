@@ -0,0 +1,93 @@
+import os
+import weakref
+import sqlalchemy as sa
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+
+READ_BIND = "read"
+READ_METHODS = ("GET", "HEAD")
+
+# the engines of every app built in this process; one fork hook, installed
+# below, resets all of them however many apps there are
+_engines = weakref.WeakSet()
+
+
+def listen_once(identifier, fn):
+    """Add a RoutingSession event listener unless an earlier app already
+    added it, as the extensions are shared by every app in the process."""
+    if not sa.event.contains(RoutingSession, identifier, fn):
+        sa.event.listen(RoutingSession, identifier, fn)
+
+
+class RoutingSession(Session):
+    """db.session that sends the SELECTs of GET and HEAD requests to the
+    read-only engine, when SQLALCHEMY_BINDS configures one.
+
+    Everything else, including any write made while handling a GET (such as
+    the last_seen flush), uses the default read-write engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        return (
+            clause is not None
+            and getattr(clause, "is_select", False)
+            and has_request_context()
+            and request.method in READ_METHODS
+            # pending changes are only visible on the writer's connection
+            and not (self.new or self.dirty or self.deleted)
+        )
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """Run PRAGMA name=value for each item on every new connection of a
+    SQLite engine."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @sa.event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def configure_engines(app, db):
+    """Apply SQLITE_PRAGMAS to the engines; the read engine also gets
+    query_only, and leaves the persistent journal_mode to the writer.
+
+    The engines' pools are also reset in any child process forked from this
+    one, as a preforking server does with its workers.
+    """
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    with app.app_context():
+        engines = dict(db.engines)
+    _engines.update(engines.values())
+    for key, engine in engines.items():
+        if key == READ_BIND:
+            read_pragmas = {
+                name: value for name, value in pragmas.items() if name != "journal_mode"
+            }
+            set_sqlite_pragmas(engine, {**read_pragmas, "query_only": "ON"})
+        else:
+            set_sqlite_pragmas(engine, pragmas)
+
+
+def dispose_after_fork(engines):
+    """Drop the pooled connections a forked child inherited, without closing
+    them, since the parent is still using them; the child opens its own."""
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: dispose_after_fork(list(_engines)))
@@ -1,13 +1,27 @@
-from flask import render_template
-from app import app, db
+from flask import Blueprint, render_template
+from app import db
+from app.hashing import HashingPoolBusy
+from app.live import TooManySubscribers
 
+bp = Blueprint("errors", __name__)
 
-@app.errorhandler(404)
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template("404.html"), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     db.session.rollback()
     return render_template("500.html"), 500
+
+
+@bp.app_errorhandler(HashingPoolBusy)
+def hashing_pool_busy_error(error):
+    return render_template("503.html"), 503, {"Retry-After": "1"}
+
+
+@bp.app_errorhandler(TooManySubscribers)
+def too_many_subscribers_error(error):
+    return render_template("503.html"), 503, {"Retry-After": "30"}
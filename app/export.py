@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from app import db
+from app.models import User, Match, Score
+
+BATCH_SIZE = 1000
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+MATCH_COLUMNS = ["id", "timestamp", "opponent", "location"]
+SCORE_COLUMNS = [
+    "id",
+    "match_id",
+    "timestamp",
+    "opponent",
+    "location",
+    "username",
+    "turn_number",
+    "score",
+]
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value; None and "" mean no filter."""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def matches_query(username=None, opponent=None, since=None, until=None, after=None):
+    query = sa.select(Match.id, Match.timestamp, Match.opponent, Match.location)
+    if username:
+        # an IN list lets SQLite look matches up by id instead of scanning
+        query = query.where(
+            Match.id.in_(
+                sa.select(Score.match_id)
+                .join(Score.user)
+                .where(User.username == username)
+            )
+        )
+    return _filter(query, Match.id, opponent, since, until, after)
+
+
+def scores_query(username=None, opponent=None, since=None, until=None, after=None):
+    query = (
+        sa.select(
+            Score.id,
+            Score.match_id,
+            Match.timestamp,
+            Match.opponent,
+            Match.location,
+            User.username,
+            Score.turn_number,
+            Score.score,
+        )
+        .join(Score.match)
+        .join(Score.user)
+    )
+    if username:
+        query = query.where(User.username == username)
+    return _filter(query, Score.id, opponent, since, until, after)
+
+
+def _filter(query, id_column, opponent, since, until, after):
+    if opponent:
+        query = query.where(Match.opponent == opponent)
+    if since:
+        query = query.where(Match.timestamp >= since)
+    if until:
+        # until is inclusive of the whole day
+        query = query.where(Match.timestamp < until + timedelta(days=1))
+    if after:
+        # resume an interrupted export after the last id received
+        query = query.where(id_column > after)
+    return query.order_by(id_column)
+
+
+def stream_rows(query):
+    """Iterate a query's rows from a server-side cursor, BATCH_SIZE at a time."""
+    result = db.session.execute(query.execution_options(yield_per=BATCH_SIZE))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def as_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value for value in row
+        )
+        # hand out roughly one batch of lines per chunk
+        if n % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def as_ndjson(rows, columns):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), default=_json_default))
+        if len(lines) == BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines.clear()
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export(kind, fmt, **filters):
+    """Yield the chosen export as text chunks, reading rows lazily."""
+    if kind == "matches":
+        query, columns = matches_query(**filters), MATCH_COLUMNS
+    else:
+        query, columns = scores_query(**filters), SCORE_COLUMNS
+    writer = as_csv if fmt == "csv" else as_ndjson
+    return writer(stream_rows(query), columns)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
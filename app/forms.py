@@ -20,6 +20,10 @@ import sqlalchemy as sa
 from app import db
 from app.models import User
 
+# the range of one turn's score, also enforced by flask import-scores
+MIN_SCORE = 0
+MAX_SCORE = 27
+
 
 class LoginForm(FlaskForm):
     username = StringField("Username", validators=[DataRequired()])
@@ -73,16 +77,44 @@ class AddScoreForm(FlaskForm):
 
 
 class EditScoresForm(FlaskForm):
-    turn_1 = IntegerField("Turn 1", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_2 = IntegerField("Turn 2", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_3 = IntegerField("Turn 3", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_4 = IntegerField("Turn 4", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_5 = IntegerField("Turn 5", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_6 = IntegerField("Turn 6", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_7 = IntegerField("Turn 7", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_8 = IntegerField("Turn 8", validators=[Optional(), NumberRange(min=0, max=27)])
-    turn_9 = IntegerField("Turn 9", validators=[Optional(), NumberRange(min=0, max=27)])
+    turn_1 = IntegerField(
+        "Turn 1",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_2 = IntegerField(
+        "Turn 2",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_3 = IntegerField(
+        "Turn 3",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_4 = IntegerField(
+        "Turn 4",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_5 = IntegerField(
+        "Turn 5",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_6 = IntegerField(
+        "Turn 6",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_7 = IntegerField(
+        "Turn 7",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_8 = IntegerField(
+        "Turn 8",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
+    turn_9 = IntegerField(
+        "Turn 9",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
+    )
     turn_10 = IntegerField(
-        "Turn 10", validators=[Optional(), NumberRange(min=0, max=27)]
+        "Turn 10",
+        validators=[Optional(), NumberRange(min=MIN_SCORE, max=MAX_SCORE)],
     )
     submit = SubmitField("Save All Scores")
@@ -0,0 +1,125 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingPoolBusy(Exception):
+    """Raised when too many hashes are already queued, or one took longer
+    than PASSWORD_HASH_TIMEOUT; answered with a 503."""
+
+
+class PasswordHasher:
+    """Runs password hashing and verification in a bounded process pool.
+
+    Hashes are CPU bound, so they are handed to PASSWORD_HASH_WORKERS worker
+    processes instead of holding the GIL in request threads. At most
+    PASSWORD_HASH_QUEUE_LIMIT hashes may be running or waiting at once; any
+    more fail fast with HashingPoolBusy, as does a hash that has not finished
+    within PASSWORD_HASH_TIMEOUT seconds. With 0 workers hashing stays inline.
+
+    Workers are started by a fork server (or spawned where there is none)
+    rather than forked from the app, whose log, last_seen and mail threads
+    may hold locks at the time of the fork.
+    """
+
+    def __init__(self, app=None):
+        self.method = "scrypt"
+        self.workers = 0
+        self.queue_limit = 0
+        self.timeout = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        self._lock = threading.Lock()
+        self._prefix = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.queue_limit = app.config["PASSWORD_HASH_QUEUE_LIMIT"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        self._slots = threading.BoundedSemaphore(self.queue_limit)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method or cost than configured."""
+        if self._prefix is None:
+            # e.g. "scrypt" is stored as "scrypt:32768:8:1"
+            self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return not pwhash or pwhash.split("$", 1)[0] != self._prefix
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_password_hash_in_flight gauge",
+            f"skylog_password_hash_in_flight {self.in_flight}",
+            "# TYPE skylog_password_hash_rejected_total counter",
+            f"skylog_password_hash_rejected_total {self.rejected}",
+            "# TYPE skylog_password_hash_timeouts_total counter",
+            f"skylog_password_hash_timeouts_total {self.timed_out}",
+        ]
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolBusy()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # a hash still waiting for a worker is dropped; one already
+            # running keeps its slot until it finishes
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise HashingPoolBusy()
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=_start_context()
+                    )
+        return self._executor
+
+
+def _start_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
@@ -0,0 +1,222 @@
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+import sqlalchemy as sa
+from app import db
+from app.forms import MIN_SCORE, MAX_SCORE
+from app.models import User, Match, ArchivedMatch, DataVersion
+from app.scoreboard import TURNS
+from app.scorecard import upsert_scores, refresh_derived
+
+BATCH_SIZE = 5000
+MAX_ERRORS = 50
+
+
+class InvalidRow(ValueError):
+    """A record that cannot be imported; the message names its line."""
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    matches_created: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) pairs from a CSV or NDJSON stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                yield line, None
+
+
+def import_scores(records, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """Load (match, player, turn, score) records in chunked transactions.
+
+    Records use the columns of the scores export: username, turn_number and
+    score, plus either the match_id of an existing match or the timestamp,
+    opponent and location of one. A match_id that is not in the database is
+    created with that id, unless an archived match has it, as that match is
+    brought back with `flask archive restore` instead; such records are
+    invalid. Matches without an id are looked up by timestamp, opponent and
+    location and created if there is none. Every batch_size records are
+    written with one executemany upsert and committed together
+    with the totals derived from them, so an import that stops part way can
+    simply be run again.
+
+    With dry_run nothing is written and every invalid record is collected in
+    the returned stats (up to MAX_ERRORS); otherwise the first invalid record
+    rolls back its batch and raises InvalidRow. progress, if given, is called
+    with the stats after each batch.
+    """
+    stats = ImportStats()
+    start = time.perf_counter()
+    users = dict(db.session.execute(sa.select(User.username, User.id)).all())
+    importer = _Importer(users, dry_run)
+    batch = {}
+
+    for line, record in records:
+        try:
+            key = importer.score_key(record)
+            score = _parse_int(record, "score", MIN_SCORE, MAX_SCORE)
+        except ValueError as exc:
+            message = f"line {line}: {exc}"
+            if not dry_run:
+                db.session.rollback()
+                raise InvalidRow(message)
+            if len(stats.errors) < MAX_ERRORS:
+                stats.errors.append(message)
+            continue
+
+        # a turn repeated within a batch keeps its last score
+        batch[key] = score
+        stats.rows += 1
+        if stats.rows % batch_size == 0:
+            importer.write(batch)
+            batch.clear()
+            stats.seconds = time.perf_counter() - start
+            stats.matches_created = importer.matches_created
+            if progress is not None:
+                progress(stats)
+
+    importer.write(batch)
+    stats.seconds = time.perf_counter() - start
+    stats.matches_created = importer.matches_created
+    return stats
+
+
+class _Importer:
+    def __init__(self, users, dry_run):
+        self.users = users
+        self.dry_run = dry_run
+        self.matches = {}
+        self.new_matches = []
+        self.matches_created = 0
+
+    def score_key(self, record):
+        if not isinstance(record, dict):
+            raise ValueError("not a JSON object")
+        username = record.get("username")
+        if username not in self.users:
+            raise ValueError(f"unknown username {username!r}")
+        turn_number = _parse_int(record, "turn_number", 1, TURNS)
+        return self.match_id(record), self.users[username], turn_number
+
+    def match_id(self, record):
+        match_id = record.get("match_id")
+        if match_id not in (None, ""):
+            match_id = _parse_int(record, "match_id", 1, None)
+            key = match_id
+        else:
+            match_id = None
+            key = (
+                _parse_timestamp(record),
+                record.get("opponent"),
+                record.get("location"),
+            )
+
+        if key not in self.matches:
+            self.matches[key] = self._find_or_create(match_id, record)
+        return self.matches[key]
+
+    def _find_or_create(self, match_id, record):
+        if match_id is not None:
+            if db.session.get(Match, match_id) is not None:
+                return match_id
+            if db.session.get(ArchivedMatch, match_id) is not None:
+                raise ValueError(f"match_id {match_id} is an archived match")
+        else:
+            timestamp = _parse_timestamp(record)
+            found = db.session.scalar(
+                sa.select(Match.id)
+                .where(
+                    Match.timestamp == timestamp,
+                    Match.opponent == record.get("opponent"),
+                    Match.location == record.get("location"),
+                )
+                .limit(1)
+            )
+            if found is not None:
+                return found
+
+        match = Match(
+            id=match_id,
+            timestamp=_parse_timestamp(record),
+            opponent=_parse_text(record, "opponent"),
+            location=_parse_text(record, "location"),
+        )
+        self.matches_created += 1
+        if self.dry_run:
+            # stands in for the id the match would be given
+            return ("new", self.matches_created)
+        db.session.add(match)
+        db.session.flush()
+        self.new_matches.append(match.id)
+        return match.id
+
+    def write(self, batch):
+        if self.dry_run or not batch:
+            return
+        db.session.execute(
+            upsert_scores(),
+            [
+                {
+                    "match_id": match_id,
+                    "user_id": user_id,
+                    "turn_number": turn_number,
+                    "score": score,
+                }
+                for (match_id, user_id, turn_number), score in batch.items()
+            ],
+        )
+        refresh_derived({(match_id, user_id) for match_id, user_id, _ in batch})
+        if self.new_matches:
+            DataVersion.bump("matches", *(f"match:{id}" for id in self.new_matches))
+            self.new_matches.clear()
+        db.session.commit()
+
+
+def _parse_int(record, name, low, high):
+    try:
+        value = int(record.get(name))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number")
+    if value < low or (high is not None and value > high):
+        bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+        raise ValueError(f"{name} must be {bounds}")
+    return value
+
+
+def _parse_timestamp(record):
+    value = record.get("timestamp")
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    raise ValueError("timestamp must be an ISO date and time")
+
+
+def _parse_text(record, name):
+    value = record.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{name} is required")
+    if len(value) > 64:
+        raise ValueError(f"{name} is longer than 64 characters")
+    return value
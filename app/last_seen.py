@@ -0,0 +1,147 @@
+import atexit
+import threading
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from app import db
+from app.models import User
+
+
+class LastSeenBuffer:
+    """Coalesces User.last_seen updates into batched writes.
+
+    touch() is called on every authenticated request but only queues a write
+    when the user's last recorded value is older than LAST_SEEN_RESOLUTION
+    seconds. Queued values are written in a single executemany UPDATE, either
+    from a background thread every LAST_SEEN_FLUSH_INTERVAL seconds or, when
+    the interval is 0, at the end of the request that queued them.
+    """
+
+    def __init__(self, app=None):
+        self.resolution = timedelta(seconds=60)
+        self.flush_interval = 0
+        self.touches = 0
+        self.writes = 0
+        self.flushes = 0
+        self._app = None
+        self._lock = threading.Lock()
+        self._recorded = {}
+        self._pending = {}
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.resolution = timedelta(seconds=app.config["LAST_SEEN_RESOLUTION"])
+        self.flush_interval = app.config["LAST_SEEN_FLUSH_INTERVAL"]
+        app.teardown_request(self._teardown_request)
+        # once per process, however many apps are built
+        atexit.unregister(self._flush_on_exit)
+        atexit.register(self._flush_on_exit)
+
+    def touch(self, user_id, now=None):
+        """Record activity for user_id; returns True if a write was queued."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            self.touches += 1
+            recorded = self._recorded.get(user_id)
+            if recorded is not None and now - recorded < self.resolution:
+                return False
+            self._recorded[user_id] = now
+            self._pending[user_id] = now
+        if self.flush_interval > 0:
+            self._ensure_thread()
+        return True
+
+    def flush(self):
+        """Write every queued value in one batched UPDATE and commit it."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        table = User.__table__
+        try:
+            db.session.execute(
+                sa.update(table)
+                .where(table.c.id == sa.bindparam("user_id"))
+                .values(last_seen=sa.bindparam("last_seen")),
+                [
+                    {"user_id": user_id, "last_seen": last_seen}
+                    for user_id, last_seen in pending.items()
+                ],
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # put the values back unless a newer touch has replaced them
+            with self._lock:
+                for user_id, last_seen in pending.items():
+                    self._pending.setdefault(user_id, last_seen)
+            raise
+
+        with self._lock:
+            self.writes += len(pending)
+            self.flushes += 1
+        return len(pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "touches": self.touches,
+                "writes": self.writes,
+                "flushes": self.flushes,
+                "pending": len(self._pending),
+                "saved": self.touches - self.writes - len(self._pending),
+            }
+
+    def metric_lines(self):
+        stats = self.stats()
+        return [
+            "# TYPE skylog_last_seen_touches_total counter",
+            f"skylog_last_seen_touches_total {stats['touches']}",
+            "# TYPE skylog_last_seen_writes_total counter",
+            f"skylog_last_seen_writes_total {stats['writes']}",
+            "# TYPE skylog_last_seen_writes_saved_total counter",
+            f"skylog_last_seen_writes_saved_total {stats['saved']}",
+            "# TYPE skylog_last_seen_pending gauge",
+            f"skylog_last_seen_pending {stats['pending']}",
+        ]
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stop.clear()
+
+    def _teardown_request(self, exc):
+        if self.flush_interval > 0 or exc is not None or not self._pending:
+            return
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="last-seen-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush_in_context()
+
+    def _flush_in_context(self):
+        with self._app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                self._app.logger.exception("Failed to flush last_seen updates")
+
+    def _flush_on_exit(self):
+        if self._pending and self._app is not None:
+            self._flush_in_context()
@@ -0,0 +1,280 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+import sqlalchemy as sa
+from app import db
+from app.database import listen_once
+from app.models import (
+    DataVersion,
+    LeaderboardEntry,
+    Match,
+    User,
+    leaderboard_version_key,
+)
+from app.page_cache import current_versions
+from app.pagination import leaderboard_page
+
+OVERALL = "overall"
+CACHE_SIZE = 256
+
+
+@dataclass
+class Standing:
+    rank: int
+    user_id: int
+    username: str
+    total: int
+    turns_played: int
+    matches_played: int
+
+    @property
+    def average(self):
+        return self.total / self.turns_played if self.turns_played else None
+
+
+@dataclass
+class HeadToHead:
+    opponent: str
+    total: int
+    turns_played: int
+    matches_played: int
+    best_match_id: Optional[int]
+    best_match_total: Optional[int]
+    best_match_timestamp: Optional[datetime]
+
+    @property
+    def average(self):
+        return self.total / self.turns_played if self.turns_played else None
+
+    def to_json(self):
+        return {
+            "opponent": self.opponent,
+            "matches_played": self.matches_played,
+            "total": self.total,
+            "turns_played": self.turns_played,
+            "average": self.average,
+            "best_match": (
+                {
+                    "id": self.best_match_id,
+                    "total": self.best_match_total,
+                    "timestamp": self.best_match_timestamp.isoformat(),
+                }
+                if self.best_match_id is not None
+                else None
+            ),
+        }
+
+
+def board_name(season=None, opponent=None):
+    """The leaderboard for a season (year) or an opponent, else the overall one."""
+    if season is not None:
+        return f"season:{season}"
+    if opponent:
+        return f"opponent:{opponent}"
+    return OVERALL
+
+
+class RankIndex:
+    """A board's totals in ascending order, and the leaderboard:<board>
+    DataVersion they were read at. A player's rank is one more than the
+    number of higher totals, found by bisection, so tied players share a
+    rank."""
+
+    __slots__ = ("totals", "version")
+
+    def __init__(self, totals, version):
+        self.totals = totals
+        self.version = version
+
+    def __len__(self):
+        return len(self.totals)
+
+    def rank(self, total):
+        return len(self.totals) - bisect_right(self.totals, total) + 1
+
+    def move(self, old, new):
+        """Replace total `old` with `new`, either None for no entry; False if
+        `old` is not on the board."""
+        if old is not None:
+            position = bisect_left(self.totals, old)
+            if position == len(self.totals) or self.totals[position] != old:
+                return False
+            del self.totals[position]
+        if new is not None:
+            insort(self.totals, new)
+        return True
+
+
+class RankCache:
+    """Process-local LRU of RankIndexes.
+
+    Each index is checked against its own board's version, which only writes
+    that move a total on that board bump, so a score saved for one season
+    leaves the other seasons' and opponents' indexes alone. Writes made in
+    this process move the totals in the cached index once their transaction
+    commits, instead of dropping it.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        listen_once("after_commit", self._after_commit)
+        listen_once("after_rollback", self._after_rollback)
+
+    def get(self, board) -> RankIndex:
+        key = leaderboard_version_key(board)
+        (version,) = current_versions([key])
+        with self._lock:
+            index = self._entries.get(board)
+            if index is not None and index.version == version:
+                self._entries.move_to_end(board)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = RankIndex(
+            db.session.scalars(
+                sa.select(LeaderboardEntry.total)
+                .where(LeaderboardEntry.board == board)
+                .order_by(LeaderboardEntry.total)
+            ).all(),
+            version,
+        )
+        # a write that committed while the totals were read may already be
+        # in them, so only keep an index the version still vouches for
+        if DataVersion.current([key]) == (version,):
+            with self._lock:
+                self._entries[board] = index
+                self._entries.move_to_end(board)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_rank_cache_hits_total counter",
+            f"skylog_rank_cache_hits_total {self.hits}",
+            "# TYPE skylog_rank_cache_misses_total counter",
+            f"skylog_rank_cache_misses_total {self.misses}",
+            "# TYPE skylog_rank_cache_entries gauge",
+            f"skylog_rank_cache_entries {len(self._entries)}",
+        ]
+
+    def _after_commit(self, session):
+        # staged by LeaderboardEntry.apply, after its version bumps
+        moves = session.info.pop("leaderboard_moves", None)
+        if not moves:
+            return
+        with self._lock:
+            for board, version, board_moves in moves:
+                index = self._entries.pop(board, None)
+                if index is None:
+                    continue
+                # only an index that was current just before this write can
+                # be moved on; anything else is reloaded on the next read
+                if index.version == version - 1 and all(
+                    index.move(old, new) for old, new in board_moves
+                ):
+                    index.version = version
+                    self._entries[board] = index
+
+    def _after_rollback(self, session):
+        session.info.pop("leaderboard_moves", None)
+
+
+rank_cache = RankCache()
+
+
+def top(board, cursor=None, per_page=25):
+    """One page of a board, highest total first, and the cursor of the next
+    page."""
+    rows, next_cursor = leaderboard_page(board, cursor=cursor, per_page=per_page)
+    index = rank_cache.get(board)
+    return [
+        _standing(index.rank(entry.total), entry, username) for entry, username in rows
+    ], next_cursor
+
+
+def standing(board, user_id) -> Optional[Standing]:
+    """A player's place on a board, or None if they have not played on it."""
+    row = db.session.execute(
+        sa.select(LeaderboardEntry, User.username)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .where(LeaderboardEntry.board == board, LeaderboardEntry.user_id == user_id)
+    ).first()
+    if row is None:
+        return None
+    entry, username = row
+    return _standing(rank_cache.get(board).rank(entry.total), entry, username)
+
+
+def _standing(rank, entry, username):
+    return Standing(
+        rank=rank,
+        user_id=entry.user_id,
+        username=username,
+        total=entry.total,
+        turns_played=entry.turns_played,
+        matches_played=entry.matches_played,
+    )
+
+
+def board_count(board):
+    return len(rank_cache.get(board))
+
+
+def boards(kind):
+    """The names after "<kind>:" of every board of a kind, e.g. the seasons."""
+    prefix = f"{kind}:"
+    # a range on the primary key rather than LIKE, which SQLite only serves
+    # from an index under case_sensitive_like
+    names = db.session.scalars(
+        sa.select(LeaderboardEntry.board)
+        .where(
+            LeaderboardEntry.board >= prefix,
+            LeaderboardEntry.board < f"{kind};",
+        )
+        .distinct()
+        .order_by(LeaderboardEntry.board)
+    ).all()
+    return [name[len(prefix) :] for name in names]
+
+
+def head_to_head(user_id):
+    """A player's record against each opponent they have scored against,
+    read from their "opponent:<name>" entries rather than from Score."""
+    prefix = "opponent:"
+    query = (
+        sa.select(LeaderboardEntry, Match.timestamp)
+        .outerjoin(Match, Match.id == LeaderboardEntry.best_match_id)
+        .where(
+            LeaderboardEntry.user_id == user_id,
+            LeaderboardEntry.board >= prefix,
+            LeaderboardEntry.board < "opponent;",
+        )
+        .order_by(LeaderboardEntry.board)
+    )
+    return [
+        HeadToHead(
+            opponent=entry.board[len(prefix) :],
+            total=entry.total,
+            turns_played=entry.turns_played,
+            matches_played=entry.matches_played,
+            best_match_id=entry.best_match_id,
+            best_match_total=entry.best_match_total,
+            best_match_timestamp=timestamp,
+        )
+        for entry, timestamp in db.session.execute(query)
+    ]
@@ -0,0 +1,212 @@
+import json
+import queue
+import threading
+from dataclasses import dataclass
+from flask import current_app
+from app import db, user_cache
+from app.database import listen_once
+from app.models import DataVersion, user_snapshot
+
+
+class TooManySubscribers(Exception):
+    """Raised when LIVE_MAX_SUBSCRIBERS streams are already open; answered
+    with a 503."""
+
+
+@dataclass(frozen=True)
+class ScoreEvent:
+    match_id: int
+    # the match:<id> DataVersion the write left behind
+    version: int
+    user_id: int
+    username: str
+    # {turn_number: score or None}
+    turns: dict
+
+    def to_sse(self):
+        data = {
+            "user_id": self.user_id,
+            "username": self.username,
+            "turns": self.turns,
+            "version": self.version,
+        }
+        return f"id: {self.version}\nevent: score\ndata: {json.dumps(data)}\n\n"
+
+
+# sent, and the stream ended, whenever a subscriber may have missed a change;
+# the page reloads and opens a new stream
+STALE = "event: stale\ndata: {}\n\n"
+
+
+class LiveScores:
+    """Server-sent events for open match pages.
+
+    Score writes through app.scorecard stage a ScoreEvent, which is handed
+    to the match's subscribers once the transaction commits. Each
+    subscriber has a bounded queue of LIVE_QUEUE_SIZE events, and at most
+    LIVE_MAX_SUBSCRIBERS streams may be open in a process; any more fail
+    fast with TooManySubscribers.
+
+    Events carry the match:<id> DataVersion, so a stream notices a change
+    it was not told about (an import, a match edit, a write handled by
+    another process) from a gap in the versions or when it checks the
+    version every LIVE_KEEPALIVE seconds, and sends "stale" instead.
+
+    Every open stream holds a server thread, so this needs a threaded or
+    async worker.
+    """
+
+    def __init__(self, app=None):
+        self.max_subscribers = 0
+        self.queue_size = 0
+        self.keepalive = 15
+        self.published = 0
+        self.rejected = 0
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_subscribers = app.config["LIVE_MAX_SUBSCRIBERS"]
+        self.queue_size = app.config["LIVE_QUEUE_SIZE"]
+        self.keepalive = app.config["LIVE_KEEPALIVE"]
+        listen_once("after_commit", self._after_commit)
+        listen_once("after_rollback", self._after_rollback)
+
+    def stage(self, match_id, user_id, changes):
+        """Queue an event for the current transaction; called after the
+        write and its DataVersion bump, and published only if the
+        transaction commits. Nothing is read when nobody is watching."""
+        if match_id not in self._subscribers:
+            return
+        (version,) = DataVersion.current([f"match:{match_id}"])
+        snapshot = user_cache.get(user_id, user_snapshot)
+        db.session.info.setdefault("live_events", []).append(
+            ScoreEvent(
+                match_id=match_id,
+                version=version,
+                user_id=user_id,
+                username=snapshot.username if snapshot else "",
+                turns=dict(changes),
+            )
+        )
+
+    def stream(self, match_id, since):
+        """Subscribe to a match and return an iterable of SSE messages for
+        the changes after DataVersion `since`, to be the body of the
+        response as it is, without stream_with_context."""
+        app = current_app._get_current_object()
+        subscriber = self._subscribe(match_id)
+        # checked once subscribed, so no write can fall between the two
+        (current,) = DataVersion.current([f"match:{match_id}"])
+
+        def release():
+            self._unsubscribe(match_id, subscriber)
+
+        def events():
+            last = since
+            try:
+                yield f"retry: {self.keepalive * 1000}\n\n"
+                if current > last:
+                    yield STALE
+                    return
+                while True:
+                    try:
+                        event = subscriber.get(timeout=self.keepalive)
+                    except queue.Empty:
+                        if self._version(app, match_id) > last:
+                            yield STALE
+                            return
+                        yield ": keepalive\n\n"
+                        continue
+                    # a gap means an event was dropped from a full queue
+                    if event.version > last + 1:
+                        yield STALE
+                        return
+                    if event.version == last + 1:
+                        last = event.version
+                        yield event.to_sse()
+            finally:
+                release()
+
+        return _Stream(events(), release)
+
+    def subscriber_count(self):
+        return self._count
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_live_subscribers gauge",
+            f"skylog_live_subscribers {self._count}",
+            "# TYPE skylog_live_events_total counter",
+            f"skylog_live_events_total {self.published}",
+            "# TYPE skylog_live_rejected_total counter",
+            f"skylog_live_rejected_total {self.rejected}",
+        ]
+
+    def _version(self, app, match_id):
+        # the request context is gone once the body is being sent, and the
+        # stream may stay open for hours, so each check gets its own app
+        # context and gives its connection back to the pool
+        with app.app_context():
+            (version,) = DataVersion.current([f"match:{match_id}"])
+            db.session.remove()
+        return version
+
+    def _subscribe(self, match_id):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers()
+            subscriber = queue.Queue(self.queue_size)
+            self._subscribers.setdefault(match_id, set()).add(subscriber)
+            self._count += 1
+            return subscriber
+
+    def _unsubscribe(self, match_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(match_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[match_id]
+            self._count -= 1
+
+    def _after_commit(self, session):
+        events = session.info.pop("live_events", None)
+        if not events:
+            return
+        with self._lock:
+            for event in events:
+                for subscriber in self._subscribers.get(event.match_id, ()):
+                    try:
+                        subscriber.put_nowait(event)
+                    except queue.Full:
+                        # the reader sees the gap in versions and reloads
+                        pass
+                self.published += 1
+
+    def _after_rollback(self, session):
+        session.info.pop("live_events", None)
+
+
+class _Stream:
+    """A response body that releases its subscription when it ends or the
+    server closes it, even if the client went away before the first message
+    was sent."""
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        try:
+            self._events.close()
+        finally:
+            self._release()
@@ -0,0 +1,240 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# ids passed in by a proxy are kept if they look like one
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# every LogRecord has these; anything else was passed as extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+access_log = logging.getLogger("app.requests")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, any extra=
+    fields, and the request fields added by RequestContextFilter."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds request_id, route, method and path to records logged while
+    handling a request. It runs in the calling thread, before the record is
+    queued, since the request is gone by the time the listener writes it."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.route = request.endpoint
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Passes every record above DEBUG, but DEBUG records for only a `rate`
+    share of requests. The choice is made from the request id, so a
+    request's debug records are all kept or all dropped."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            keep = zlib.crc32(request_id.encode()) / 2**32 < self.rate
+        else:
+            keep = random.random() < self.rate
+        if not keep:
+            self.sampled_out += 1
+        return keep
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """A QueueHandler that drops records, and counts them, when the queue is
+    full rather than making the logging thread wait for the writer."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # like QueueHandler.prepare, but the traceback is kept apart from
+        # the message so JsonFormatter can give it its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        record.stack_info = None
+        return record
+
+
+class LogPipeline:
+    """Structured, non-blocking logging for the app.
+
+    Every request gets an id, taken from a valid X-Request-ID header or
+    generated, and returned in the same header. Records logged under the
+    "app" logger are stamped with the request's id and route in the calling
+    thread, put on a bounded queue, and written as JSON lines to LOG_FILE by
+    a QueueListener thread, rotating at LOG_MAX_BYTES. Each request ends
+    with an "app.requests" record holding its status and duration. DEBUG
+    records are kept for a LOG_DEBUG_SAMPLE_RATE share of requests.
+
+    In debug and testing, records go to Flask's default stderr handler
+    instead, and no file is written.
+    """
+
+    def __init__(self, app=None):
+        self.handler = None
+        self.listener = None
+        self.sampler = None
+        self._file_handler = None
+        self._queue_size = 0
+        self._fork_hook = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.logger.setLevel(app.config["LOG_LEVEL"])
+        if app.debug or app.testing:
+            return
+
+        self.stop()
+        if self.handler is not None:
+            app.logger.removeHandler(self.handler)
+        # stderr would be written synchronously by the request thread
+        app.logger.removeHandler(default_handler)
+
+        log_file = app.config["LOG_FILE"]
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=app.config["LOG_MAX_BYTES"],
+            backupCount=app.config["LOG_BACKUP_COUNT"],
+            delay=True,
+        )
+        self._file_handler.setFormatter(JsonFormatter())
+        self._queue_size = app.config["LOG_QUEUE_SIZE"]
+        self.sampler = DebugSampler(app.config["LOG_DEBUG_SAMPLE_RATE"])
+        self.handler = NonBlockingQueueHandler(queue.Queue(self._queue_size))
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.addFilter(self.sampler)
+        app.logger.addHandler(self.handler)
+        self._start()
+        # once per process, however many apps are built
+        atexit.unregister(self.stop)
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork") and not self._fork_hook:
+            os.register_at_fork(after_in_child=self._after_fork)
+            self._fork_hook = True
+
+        app.logger.info("Skylog startup")
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self.listener is not None:
+            self.handler.queue.join()
+            self._file_handler.flush()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+    def metric_lines(self):
+        dropped = self.handler.dropped if self.handler else 0
+        sampled_out = self.sampler.sampled_out if self.sampler else 0
+        depth = self.handler.queue.qsize() if self.handler else 0
+        return [
+            "# TYPE skylog_log_queue_depth gauge",
+            f"skylog_log_queue_depth {depth}",
+            "# TYPE skylog_log_dropped_total counter",
+            f"skylog_log_dropped_total {dropped}",
+            "# TYPE skylog_log_debug_sampled_out_total counter",
+            f"skylog_log_debug_sampled_out_total {sampled_out}",
+        ]
+
+    def _start(self):
+        self.listener = QueueListener(
+            self.handler.queue, self._file_handler, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def _after_fork(self):
+        # the listener thread did not survive the fork, and the queue may
+        # have been left locked by another thread of the parent
+        if self.handler is not None:
+            self.handler.queue = queue.Queue(self._queue_size)
+            self._start()
+
+    def _before_request(self):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.log_start = time.perf_counter()
+
+    def _after_request(self, response):
+        if "request_id" not in g:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        access_log.info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - g.log_start) * 1000, 2),
+            },
+        )
+        return response
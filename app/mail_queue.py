@@ -0,0 +1,256 @@
+import atexit
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from flask_mail import Message
+from app import db, mail
+from app.database import listen_once
+from app.models import OutboundMail
+
+STATUSES = ("pending", "sending", "sent", "failed")
+# how long a claimed message is left alone before another worker may retry it
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+class MailQueue:
+    """Outbound email, stored in the OutboundMail table and sent in the
+    background.
+
+    enqueue() only adds a row to the caller's transaction, so a request never
+    waits on SMTP and mail for a rolled back change is never sent. A worker
+    thread, woken when such a transaction commits and otherwise every
+    MAIL_QUEUE_POLL_INTERVAL seconds, claims due messages MAIL_QUEUE_BATCH_SIZE
+    at a time and sends them all over one SMTP connection. Failed messages are
+    retried after MAIL_QUEUE_BACKOFF seconds, doubling each time, and marked
+    failed after MAIL_QUEUE_MAX_ATTEMPTS. With a poll interval of 0 there is
+    no worker thread and `flask mail-queue send` does the sending.
+    """
+
+    def __init__(self, app=None):
+        self.batch_size = 50
+        self.poll_interval = 0
+        self.max_attempts = 5
+        self.backoff = timedelta(seconds=30)
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._app = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.batch_size = app.config["MAIL_QUEUE_BATCH_SIZE"]
+        self.poll_interval = app.config["MAIL_QUEUE_POLL_INTERVAL"]
+        self.max_attempts = app.config["MAIL_QUEUE_MAX_ATTEMPTS"]
+        self.backoff = timedelta(seconds=app.config["MAIL_QUEUE_BACKOFF"])
+        app.before_request(self._before_request)
+        listen_once("after_commit", self._after_commit)
+        # once per process, however many apps are built
+        atexit.unregister(self.stop)
+        atexit.register(self.stop)
+
+    def enqueue(self, subject, recipients, body, html=None, sender=None):
+        """Add a message to the current transaction; it is sent after commit."""
+        message = OutboundMail(
+            subject=subject,
+            recipients=",".join(recipients),
+            body=body,
+            html=html,
+            sender=sender,
+        )
+        db.session.add(message)
+        db.session.info["mail_enqueued"] = True
+        return message
+
+    def send_due(self):
+        """Send every message that is due over one SMTP connection; returns
+        the number sent. Needs an application context."""
+        sent = 0
+        batch = self._claim()
+        if not batch:
+            return 0
+
+        unsent = list(batch)
+        try:
+            with mail.connect() as connection:
+                while unsent:
+                    delivered = []
+                    try:
+                        while unsent:
+                            row = unsent[0]
+                            try:
+                                connection.send(self._message(row))
+                            except (
+                                smtplib.SMTPRecipientsRefused,
+                                smtplib.SMTPResponseException,
+                            ) as exc:
+                                # refused by the server; the connection is still usable
+                                self._retry_later([row], exc)
+                            else:
+                                delivered.append(row.id)
+                            unsent.pop(0)
+                    finally:
+                        # record what went out even if the connection drops, so
+                        # it is not sent again when the lease runs out
+                        self._mark_sent(delivered)
+                        db.session.commit()
+                        sent += len(delivered)
+                    unsent = list(self._claim())
+        except (OSError, smtplib.SMTPException) as exc:
+            # the connection failed, so the rest of the batch waits too
+            self._retry_later(unsent, exc)
+            db.session.commit()
+        return sent
+
+    def depth(self):
+        """Number of queued messages in each status."""
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(
+            db.session.execute(
+                sa.select(OutboundMail.status, sa.func.count()).group_by(
+                    OutboundMail.status
+                )
+            ).all()
+        )
+        return counts
+
+    def metric_lines(self):
+        lines = ["# TYPE skylog_mail_queue_depth gauge"]
+        lines.extend(
+            f'skylog_mail_queue_depth{{status="{status}"}} {count}'
+            for status, count in self.depth().items()
+        )
+        lines.extend(
+            [
+                "# TYPE skylog_mail_sent_total counter",
+                f"skylog_mail_sent_total {self.sent}",
+                "# TYPE skylog_mail_retried_total counter",
+                f"skylog_mail_retried_total {self.retried}",
+                "# TYPE skylog_mail_failed_total counter",
+                f"skylog_mail_failed_total {self.failed}",
+            ]
+        )
+        return lines
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _claim(self):
+        now = datetime.now(timezone.utc)
+        due = (
+            sa.select(OutboundMail.id)
+            .where(
+                OutboundMail.status.in_(("pending", "sending")),
+                OutboundMail.next_attempt_at <= now,
+            )
+            .order_by(OutboundMail.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        # claimed and committed in one statement, so two workers never send
+        # the same message; a worker that dies leaves it to be retried once
+        # the lease runs out
+        rows = db.session.execute(
+            sa.update(OutboundMail)
+            .where(OutboundMail.id.in_(due))
+            .values(status="sending", next_attempt_at=now + CLAIM_LEASE)
+            .returning(
+                OutboundMail.id,
+                OutboundMail.sender,
+                OutboundMail.recipients,
+                OutboundMail.subject,
+                OutboundMail.body,
+                OutboundMail.html,
+                OutboundMail.attempts,
+            ),
+            execution_options={"synchronize_session": False},
+        ).all()
+        db.session.commit()
+        return sorted(rows, key=lambda row: row.id)
+
+    def _message(self, row):
+        return Message(
+            subject=row.subject,
+            recipients=row.recipients.split(","),
+            body=row.body,
+            html=row.html,
+            sender=row.sender,
+        )
+
+    def _mark_sent(self, ids):
+        if ids:
+            db.session.execute(
+                sa.update(OutboundMail)
+                .where(OutboundMail.id.in_(ids))
+                .values(
+                    status="sent", sent_at=datetime.now(timezone.utc), last_error=None
+                ),
+                execution_options={"synchronize_session": False},
+            )
+            self.sent += len(ids)
+
+    def _retry_later(self, rows, error):
+        now = datetime.now(timezone.utc)
+        updates = []
+        for row in rows:
+            attempts = row.attempts + 1
+            if attempts >= self.max_attempts:
+                status = "failed"
+                self.failed += 1
+            else:
+                status = "pending"
+                self.retried += 1
+            updates.append(
+                {
+                    "id": row.id,
+                    "status": status,
+                    "attempts": attempts,
+                    "next_attempt_at": now + self.backoff * 2 ** (attempts - 1),
+                    "last_error": str(error)[:1000],
+                }
+            )
+        if updates:
+            db.session.execute(sa.update(OutboundMail), updates)
+
+    def _before_request(self):
+        # picks up mail left queued by an earlier run
+        if self.poll_interval > 0:
+            self._ensure_thread()
+
+    def _after_commit(self, session):
+        if session.info.pop("mail_enqueued", False) and self.poll_interval > 0:
+            self._ensure_thread()
+            self._wake.set()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="mail-queue", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._app.app_context():
+                try:
+                    self.send_due()
+                except Exception:
+                    self._app.logger.exception("Sending queued mail failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
@@ -0,0 +1,187 @@
+import logging
+from datetime import datetime
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    flash,
+    redirect,
+    url_for,
+    request,
+    abort,
+    make_response,
+    Response,
+    stream_with_context,
+)
+from flask_login import login_required
+from sqlalchemy.exc import SQLAlchemyError
+from app import db, page_cache
+from app.forms import CRMatchForm
+from app.models import ArchivedMatch, Match, MatchTotal, DataVersion, leaderboards
+from app.archive import archived_scoreboard
+from app.export import FORMATS, export, parse_date
+from app.pagination import InvalidCursor, matches_page
+from app.scorecard import delete_matches
+from app.search import search_query, search_terms
+
+bp = Blueprint("matches", __name__)
+log = logging.getLogger(__name__)
+
+
+@bp.route("/")
+@bp.route("/index")
+@bp.route("/matches")
+@login_required
+@page_cache.conditional(lambda: ["matches"])
+def matches():
+    # ?q= searches opponents and locations, ?since= and ?until= are dates
+    filters = _search_filters()
+    page, next_cursor = matches_page(
+        per_page=current_app.config["MATCHES_PER_PAGE"],
+        query=search_query(**filters),
+    )
+    return render_template(
+        "matches.html",
+        matches=page,
+        next_cursor=next_cursor,
+        # the filters as given, for the form and the "Load more" URL
+        search={
+            name: request.args[name]
+            for name in ("q", "since", "until")
+            if request.args.get(name)
+        },
+        short_terms=bool(filters["text"]) and not search_terms(filters["text"]),
+        title="Matches",
+    )
+
+
+@bp.route("/matches/more")
+@login_required
+@page_cache.conditional(lambda: ["matches"])
+def more_matches():
+    # only the rows of the next page, appended to the table by matches.js
+    try:
+        page, next_cursor = matches_page(
+            cursor=request.args.get("cursor"),
+            per_page=current_app.config["MATCHES_PER_PAGE"],
+            query=search_query(**_search_filters()),
+        )
+    except InvalidCursor:
+        abort(400)
+    response = make_response(render_template("matches_rows.html", matches=page))
+    response.headers["X-Next-Cursor"] = next_cursor or ""
+    return response
+
+
+def _search_filters():
+    try:
+        return dict(
+            text=request.args.get("q", "").strip(),
+            since=parse_date(request.args.get("since")),
+            until=parse_date(request.args.get("until")),
+        )
+    except ValueError:
+        abort(400)
+
+
+@bp.route("/matches/delete/<int:match_id>", methods=["POST"])
+@login_required
+def delete_match(match_id):
+    try:
+        if not delete_matches([match_id]):
+            abort(404)
+        db.session.commit()
+        log.info("Deleted match %s", match_id)
+
+    except SQLAlchemyError:
+        log.exception("Failed to delete match %s", match_id)
+        db.session.rollback()
+        flash("An error occurred while deleting the match. Please try again.", "error")
+        return redirect(url_for("matches.matches"))
+
+    flash("Match deleted successfully!", "success")
+    return redirect(url_for("matches.matches"))
+
+
+@bp.route("/match", methods=["GET", "POST"])
+@bp.route("/match/edit/<int:match_id>", methods=["GET", "POST"])
+@login_required
+def match_form(match_id=None):
+    match = Match.query.get(match_id) if match_id else None
+    form = CRMatchForm(obj=match)
+
+    if form.validate_on_submit():
+        try:
+            date = datetime.strptime(form.date.data, "%Y-%m-%d %H:%M")
+        except (ValueError, TypeError):
+            flash("Invalid date format. Please use YYYY-MM-DD HH:MM", "danger")
+            return render_template("edit_match.html", form=form, match=match)
+
+        if match:
+            # editing existing match
+            old_boards = leaderboards(match.opponent, match.timestamp)
+            match.opponent = form.opponent.data
+            match.location = form.location.data
+            match.timestamp = date
+            new_boards = leaderboards(match.opponent, match.timestamp)
+            if new_boards != old_boards:
+                MatchTotal.move_match(match.id, old_boards, new_boards)
+            flash("Match updated!", "success")
+        else:
+            # creating new match
+            match = Match(
+                opponent=form.opponent.data,
+                location=form.location.data,
+                timestamp=date,
+            )
+            db.session.add(match)
+            db.session.flush()
+            flash("New match created!", "success")
+
+        DataVersion.bump("matches", f"match:{match.id}")
+        db.session.commit()
+        return redirect(url_for("matches.matches"))
+
+    if request.method == "GET" and match:
+        form.opponent.data = match.opponent
+        form.location.data = match.location
+        form.date.data = (
+            match.timestamp.strftime("%Y-%m-%d %H:%M") if match.timestamp else ""
+        )
+
+    return render_template("edit_match.html", form=form, match=match)
+
+
+@bp.route("/archive/<int:id>")
+@login_required
+@page_cache.conditional(lambda id: ["users", f"match:{id}"])
+def archived_match(id):
+    match = db.get_or_404(ArchivedMatch, id)
+    return render_template(
+        "archived_match.html",
+        title="Archived match",
+        match=match,
+        scoreboard=archived_scoreboard(id),
+    )
+
+
+@bp.route("/export/<any(matches, scores):kind>.<any(csv, ndjson):fmt>")
+@login_required
+def export_data(kind, fmt):
+    # rows are streamed as they are read; ?after=<id> resumes a download
+    try:
+        filters = dict(
+            username=request.args.get("user"),
+            opponent=request.args.get("opponent"),
+            since=parse_date(request.args.get("since")),
+            until=parse_date(request.args.get("until")),
+            after=int(request.args.get("after") or 0),
+        )
+    except ValueError:
+        abort(400)
+
+    return Response(
+        stream_with_context(export(kind, fmt, **filters)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'},
+    )
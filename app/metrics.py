@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from flask import Response, g, has_request_context, request
+import sqlalchemy as sa
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+@sa.event.listens_for(sa.engine.Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@sa.event.listens_for(sa.engine.Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if has_request_context() and "sql_queries" in g:
+        g.sql_queries += 1
+        g.sql_time += elapsed
+
+
+@sa.event.listens_for(sa.engine.Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute is skipped for failed statements
+    starts = context.connection.info.get("query_start") if context.connection else None
+    if starts:
+        starts.pop()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+
+
+class Metrics:
+    """Per-request SQL counting and timing, exported at /metrics.
+
+    Every response gets a Server-Timing header with the time spent in the
+    view and in the database, and each endpoint accumulates latency and
+    query-count histograms in Prometheus text format.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._collectors = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.export)
+
+    def register_collector(self, collector):
+        """Add a callable returning extra exposition lines for /metrics; one
+        already added, by an earlier app, is not added twice."""
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def _before_request(self):
+        g.request_start = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_time = 0.0
+
+    def _after_request(self, response):
+        if "request_start" not in g:
+            return response
+        duration = time.perf_counter() - g.request_start
+        response.headers["Server-Timing"] = (
+            f'db;dur={g.sql_time * 1000:.2f};desc="{g.sql_queries} queries", '
+            f"app;dur={duration * 1000:.2f}"
+        )
+
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.latency.observe(duration)
+            stats.queries.observe(g.sql_queries)
+            stats.db_seconds += g.sql_time
+        return response
+
+    def export(self):
+        lines = [
+            "# HELP skylog_request_duration_seconds Request latency by endpoint.",
+            "# TYPE skylog_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            for endpoint, stats in endpoints:
+                lines.extend(
+                    stats.latency.lines(
+                        "skylog_request_duration_seconds", f'endpoint="{endpoint}"'
+                    )
+                )
+            lines.append(
+                "# HELP skylog_request_sql_queries SQL queries per request by endpoint."
+            )
+            lines.append("# TYPE skylog_request_sql_queries histogram")
+            for endpoint, stats in endpoints:
+                lines.extend(
+                    stats.queries.lines(
+                        "skylog_request_sql_queries", f'endpoint="{endpoint}"'
+                    )
+                )
+            lines.append(
+                "# HELP skylog_request_db_seconds_total Time spent in SQL by endpoint."
+            )
+            lines.append("# TYPE skylog_request_db_seconds_total counter")
+            for endpoint, stats in endpoints:
+                lines.append(
+                    f'skylog_request_db_seconds_total{{endpoint="{endpoint}"}} '
+                    f"{stats.db_seconds}"
+                )
+
+        for collector in self._collectors:
+            lines.extend(collector())
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
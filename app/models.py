@@ -1,11 +1,14 @@
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 from typing import Optional
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from app import db, login
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db, login, hasher, user_cache
 from flask_login import UserMixin
 from hashlib import md5
+from app.user_cache import LazyUser, UserSnapshot
+
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
 
 
 class User(UserMixin, db.Model):
@@ -23,10 +26,12 @@ class User(UserMixin, db.Model):
     )
 
     # relationship with Score (intermediary table between User and Match)
-    user_scores: so.Mapped["Score"] = so.relationship("Score", back_populates="user")
+    user_scores: so.Mapped[list["Score"]] = so.relationship(
+        "Score", back_populates="user"
+    )
 
     # relationship with Match via Score
-    matches: so.Mapped["Match"] = so.relationship(
+    matches: so.Mapped[list["Match"]] = so.relationship(
         "Match",
         # defines a many-to-many relationship, where the relationship is stored in a
         # separate table (Score)
@@ -37,10 +42,17 @@ class User(UserMixin, db.Model):
     )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    def rehash_password(self, password):
+        # called after a successful login, while the plain password is known
+        if hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
 
     def avatar(self, size):
         digest = md5(self.email.lower().encode("utf-8")).hexdigest()
@@ -68,10 +80,16 @@ class User(UserMixin, db.Model):
     def remove_score(self, score):
         if score in self.get_all_scores():
             db.session.delete(score)
+            MatchTotal.refresh(score.match_id, self.id)
+            DataVersion.bump(f"match:{score.match_id}", f"user:{self.id}")
             db.session.commit()
 
 
 class Match(db.Model):
+    # AUTOINCREMENT, so SQLite never hands out the id of a deleted or
+    # archived match again, which the archive relies on to restore it
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     opponent: so.Mapped[str] = so.mapped_column(sa.String(64))
     location: so.Mapped[str] = so.mapped_column(sa.String(64))
@@ -79,12 +97,18 @@ class Match(db.Model):
         index=True, default=lambda: datetime.now(timezone.utc)
     )
 
-    match_scores: so.Mapped["Score"] = so.relationship(
-        "Score", back_populates="match", lazy=True, cascade="all, delete"
+    # score.match_id is ON DELETE CASCADE, so deleting a match leaves its
+    # scores to the database instead of loading them
+    match_scores: so.Mapped[list["Score"]] = so.relationship(
+        "Score",
+        back_populates="match",
+        lazy=True,
+        cascade="all, delete",
+        passive_deletes=True,
     )
 
     # relationship with User via Score
-    users: so.Mapped["User"] = so.relationship(
+    users: so.Mapped[list["User"]] = so.relationship(
         "User",
         secondary="score",
         back_populates="matches",
@@ -103,18 +127,536 @@ class Match(db.Model):
         )
 
 
+# Full-text index of match opponents and locations for app/search.py: an
+# FTS5 table over the match table's own columns, kept in step by triggers so
+# bulk INSERT ... SELECTs and cascading DELETEs are indexed too. SQLite only;
+# created here for create_all() and by a migration for existing databases.
+# A batch_alter_table on match would recreate it without the triggers.
+MATCH_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE match_search USING fts5("
+    "opponent, location, content='match', content_rowid='id', tokenize='trigram')",
+    'CREATE TRIGGER match_search_insert AFTER INSERT ON "match" BEGIN '
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+    'CREATE TRIGGER match_search_delete AFTER DELETE ON "match" BEGIN '
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); END",
+    'CREATE TRIGGER match_search_update AFTER UPDATE OF opponent, location ON "match" '
+    "BEGIN "
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); "
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+)
+
+for _statement in MATCH_SEARCH_DDL:
+    sa.event.listen(
+        Match.__table__,
+        "after_create",
+        sa.DDL(_statement).execute_if(dialect="sqlite"),
+    )
+sa.event.listen(
+    Match.__table__,
+    "after_drop",
+    sa.DDL("DROP TABLE IF EXISTS match_search").execute_if(dialect="sqlite"),
+)
+
+
 class Score(db.Model):
+    __table_args__ = (
+        # one score per player per turn of a match
+        sa.UniqueConstraint(
+            "match_id", "user_id", "turn_number", name="uq_score_match_user_turn"
+        ),
+        # the unique constraint's index serves lookups by match, then player;
+        # this one serves a player's scores across matches
+        sa.Index("ix_score_user_id_match_id", "user_id", "match_id"),
+        # ids are never reused, as for Match
+        {"sqlite_autoincrement": True},
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     score: so.Mapped[int] = so.mapped_column(sa.Integer)
     turn_number: so.Mapped[int] = so.mapped_column(sa.Integer, index=True)
 
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), index=True)
-    match_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Match.id), index=True)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
+    match_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey(Match.id, ondelete="CASCADE")
+    )
 
     user: so.Mapped[User] = so.relationship(back_populates="user_scores")
     match: so.Mapped[Match] = so.relationship(back_populates="match_scores")
 
 
+class ArchivedMatch(db.Model):
+    """A match moved out of the match table by `flask archive run`, with its
+    original id."""
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True, autoincrement=False)
+    opponent: so.Mapped[str] = so.mapped_column(sa.String(64))
+    location: so.Mapped[str] = so.mapped_column(sa.String(64))
+    timestamp: so.Mapped[datetime] = so.mapped_column()
+    archived_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class ArchivedScore(db.Model):
+    """A score of an ArchivedMatch, with its original id."""
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True, autoincrement=False)
+    score: so.Mapped[int] = so.mapped_column(sa.Integer)
+    turn_number: so.Mapped[int] = so.mapped_column(sa.Integer)
+    # indexed so foreign key checks on user and archived_match never scan
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), index=True)
+    match_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey(ArchivedMatch.id, ondelete="CASCADE"), index=True
+    )
+
+
+class MatchTotal(db.Model):
+    """Rollup of one player's scores in one match, kept in step with Score."""
+
+    match_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey(Match.id, ondelete="CASCADE"), primary_key=True
+    )
+    user_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey(User.id), primary_key=True, index=True
+    )
+    total: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    turns_played: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    best_turn: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer)
+
+    @classmethod
+    def refresh(cls, match_id, user_id):
+        cls.refresh_many([(match_id, user_id)])
+
+    @classmethod
+    def refresh_many(cls, pairs, chunk_size=400):
+        # recompute from the players' (at most ten) scores for these matches
+        # and apply the differences to their lifetime totals and leaderboard
+        # entries, in the caller's transaction
+        pairs = sorted(set(pairs))
+        user_deltas = {}
+        board_deltas = {}
+        board_matches = {}
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start : start + chunk_size]
+            fresh = {
+                (match_id, user_id): (total, turns_played, best_turn)
+                for match_id, user_id, total, turns_played, best_turn in (
+                    db.session.execute(
+                        sa.select(
+                            Score.match_id,
+                            Score.user_id,
+                            sa.func.sum(Score.score),
+                            sa.func.count(Score.id),
+                            sa.func.max(Score.score),
+                        )
+                        .where(sa.tuple_(Score.match_id, Score.user_id).in_(chunk))
+                        .group_by(Score.match_id, Score.user_id)
+                    )
+                )
+            }
+            rows = {
+                (row.match_id, row.user_id): row
+                for row in db.session.scalars(
+                    sa.select(cls).where(
+                        sa.tuple_(cls.match_id, cls.user_id).in_(chunk)
+                    )
+                )
+            }
+            boards = match_leaderboards({match_id for match_id, _ in chunk})
+
+            for match_id, user_id in chunk:
+                total, turns_played, best_turn = fresh.get(
+                    (match_id, user_id), (0, 0, None)
+                )
+                row = rows.get((match_id, user_id))
+                old_total, old_turns = (row.total, row.turns_played) if row else (0, 0)
+                matches_delta = 0
+
+                if turns_played == 0:
+                    if row is not None:
+                        db.session.delete(row)
+                        matches_delta = -1
+                else:
+                    if row is None:
+                        row = cls(match_id=match_id, user_id=user_id)
+                        db.session.add(row)
+                        matches_delta = 1
+                    row.total = total
+                    row.turns_played = turns_played
+                    row.best_turn = best_turn
+
+                change = (total - old_total, turns_played - old_turns, matches_delta)
+                if not any(change):
+                    continue
+                add_deltas(user_deltas, user_id, change)
+                for board in boards.get(match_id, ()):
+                    add_deltas(board_deltas, (board, user_id), change)
+                    board_matches.setdefault((board, user_id), {})[match_id] = (
+                        total if turns_played else None
+                    )
+
+        for user_id, delta in user_deltas.items():
+            UserTotal.apply(user_id, *delta)
+        LeaderboardEntry.apply(board_deltas, board_matches)
+
+    @classmethod
+    def remove_matches(cls, match_ids):
+        """Take matches out of their players' lifetime totals before the
+        matches are deleted or archived, which removes these rows by
+        cascade; returns the ids of the players they had."""
+        user_deltas = {}
+        board_deltas = {}
+        board_matches = {}
+        for (
+            match_id,
+            user_id,
+            total,
+            turns_played,
+            opponent,
+            timestamp,
+        ) in db.session.execute(
+            sa.select(
+                cls.match_id,
+                cls.user_id,
+                cls.total,
+                cls.turns_played,
+                Match.opponent,
+                Match.timestamp,
+            )
+            .join(Match, Match.id == cls.match_id)
+            .where(cls.match_id.in_(match_ids))
+        ):
+            change = (-total, -turns_played, -1)
+            add_deltas(user_deltas, user_id, change)
+            for board in leaderboards(opponent, timestamp):
+                add_deltas(board_deltas, (board, user_id), change)
+                board_matches.setdefault((board, user_id), {})[match_id] = None
+        for user_id, delta in user_deltas.items():
+            UserTotal.apply(user_id, *delta)
+        LeaderboardEntry.apply(board_deltas, board_matches)
+        return list(user_deltas)
+
+    @classmethod
+    def move_match(cls, match_id, old_boards, new_boards):
+        """Move a match's totals between leaderboards after its opponent or
+        date was edited, in the caller's transaction."""
+        board_deltas = {}
+        board_matches = {}
+        for user_id, total, turns_played in db.session.execute(
+            sa.select(cls.user_id, cls.total, cls.turns_played).where(
+                cls.match_id == match_id
+            )
+        ):
+            for board in set(old_boards) - set(new_boards):
+                add_deltas(board_deltas, (board, user_id), (-total, -turns_played, -1))
+                board_matches[(board, user_id)] = {match_id: None}
+            for board in set(new_boards) - set(old_boards):
+                add_deltas(board_deltas, (board, user_id), (total, turns_played, 1))
+                board_matches[(board, user_id)] = {match_id: total}
+        LeaderboardEntry.apply(board_deltas, board_matches)
+
+
+class UserTotal(db.Model):
+    """Lifetime rollup of a player's scores across every match."""
+
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), primary_key=True)
+    total: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    turns_played: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    matches_played: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+
+    @property
+    def average(self):
+        return self.total / self.turns_played if self.turns_played else None
+
+    @classmethod
+    def apply(cls, user_id, total, turns_played, matches_played):
+        if not (total or turns_played or matches_played):
+            return
+        row = db.session.get(cls, user_id)
+        if row is None:
+            row = cls(user_id=user_id, total=0, turns_played=0, matches_played=0)
+            db.session.add(row)
+        row.total += total
+        row.turns_played += turns_played
+        row.matches_played += matches_played
+
+
+class LeaderboardEntry(db.Model):
+    """A player's standing on one leaderboard, kept in step with MatchTotal.
+
+    Boards are "overall", "season:<year>" and "opponent:<name>"; see
+    leaderboards(). Rows with no matches left are deleted. The opponent
+    boards double as each player's head-to-head record; see
+    app.leaderboard.head_to_head().
+    """
+
+    __table_args__ = (
+        # serves both the top of a board and loading its totals for ranking
+        sa.Index("ix_leaderboard_entry_board_total", "board", "total"),
+    )
+
+    board: so.Mapped[str] = so.mapped_column(sa.String(80), primary_key=True)
+    user_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey(User.id), primary_key=True, index=True
+    )
+    total: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    turns_played: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    matches_played: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    # the player's highest match total on the board, ties going to the
+    # earliest match
+    best_match_id: so.Mapped[Optional[int]] = so.mapped_column(
+        sa.ForeignKey(Match.id, ondelete="SET NULL"), index=True
+    )
+    best_match_total: so.Mapped[Optional[int]] = so.mapped_column(sa.Integer)
+
+    @property
+    def average(self):
+        return self.total / self.turns_played if self.turns_played else None
+
+    @classmethod
+    def apply(cls, deltas, matches=None, chunk_size=400):
+        """Apply {(board, user_id): [total, turns_played, matches_played]}
+        differences, in the caller's transaction.
+
+        `matches` is {(board, user_id): {match_id: total}} for the match
+        totals that changed, with None for a match that no longer counts
+        towards the board. The best match is moved up to a better total
+        directly, and only looked up again (see best_match()) when the best
+        match itself went down or was taken off the board.
+
+        Each board whose totals moved has its leaderboard_version_key()
+        bumped, and the moves are left in session.info["leaderboard_moves"]
+        for app.leaderboard.rank_cache to apply once the transaction commits.
+        """
+        matches = matches or {}
+        keys = sorted(
+            {key for key, delta in deltas.items() if any(delta)} | matches.keys()
+        )
+        if not keys:
+            return
+        stale = []
+        # {board: [(old total, new total)]}, None for no entry
+        moves = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            # SQLite scans for a row-value IN, so this reads the cross
+            # product of boards and users off the primary key instead
+            rows = {
+                (row.board, row.user_id): row
+                for row in db.session.scalars(
+                    sa.select(cls).where(
+                        cls.board.in_({board for board, _ in chunk}),
+                        cls.user_id.in_({user_id for _, user_id in chunk}),
+                    )
+                )
+            }
+            for board, user_id in chunk:
+                total, turns_played, matches_played = deltas.get(
+                    (board, user_id), (0, 0, 0)
+                )
+                row = rows.get((board, user_id))
+                old_total = None if row is None else row.total
+                if row is None:
+                    row = cls(
+                        board=board,
+                        user_id=user_id,
+                        total=0,
+                        turns_played=0,
+                        matches_played=0,
+                    )
+                    db.session.add(row)
+                row.total += total
+                row.turns_played += turns_played
+                row.matches_played += matches_played
+                new_total = row.total
+                if row.matches_played <= 0:
+                    new_total = None
+                    if row in db.session.new:
+                        db.session.expunge(row)
+                    else:
+                        db.session.delete(row)
+                elif row.update_best(matches.get((board, user_id), {})):
+                    stale.append(row)
+                if new_total != old_total:
+                    moves.setdefault(board, []).append((old_total, new_total))
+        for row in stale:
+            removed = [
+                match_id
+                for match_id, total in matches[(row.board, row.user_id)].items()
+                if total is None
+            ]
+            row.best_match_id, row.best_match_total = best_match(
+                row.board, row.user_id, exclude=removed
+            )
+        version_keys = [leaderboard_version_key(board) for board in moves]
+        DataVersion.bump("leaderboard", *version_keys)
+        if moves:
+            versions = DataVersion.current(version_keys)
+            db.session.info.setdefault("leaderboard_moves", []).extend(
+                zip(moves, versions, moves.values())
+            )
+
+    def update_best(self, changed):
+        """Take {match_id: total} changes into the best match; returns True
+        if the best match has to be looked up again instead."""
+        for match_id, total in changed.items():
+            if match_id == self.best_match_id and (
+                total is None or total < self.best_match_total
+            ):
+                return True
+        if self.best_match_id is None and self.best_match_total is not None:
+            # the match was deleted without going through remove_matches
+            return True
+        for match_id, total in changed.items():
+            if total is not None and better_match(
+                (match_id, total), (self.best_match_id, self.best_match_total)
+            ):
+                self.best_match_id, self.best_match_total = match_id, total
+        return False
+
+
+class DataVersion(db.Model):
+    """Counter bumped whenever the data behind a cached page changes."""
+
+    key: so.Mapped[str] = so.mapped_column(sa.String(96), primary_key=True)
+    version: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+
+    @classmethod
+    def bump(cls, *keys):
+        # in the caller's transaction, so readers never see new data with an
+        # old version
+        if not keys:
+            return
+        stmt = dialect_insert(cls).on_conflict_do_update(
+            index_elements=[cls.key], set_={"version": cls.version + 1}
+        )
+        db.session.execute(stmt, [{"key": key, "version": 1} for key in keys])
+
+    @classmethod
+    def current(cls, keys):
+        found = dict(
+            db.session.execute(
+                sa.select(cls.key, cls.version).where(cls.key.in_(keys))
+            ).all()
+        )
+        return tuple(found.get(key, 0) for key in keys)
+
+
+class OutboundMail(db.Model):
+    """An email queued by app.mail_queue, kept after sending or failing."""
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    sender: so.Mapped[Optional[str]] = so.mapped_column(sa.String(120))
+    # comma separated addresses
+    recipients: so.Mapped[str] = so.mapped_column(sa.Text)
+    subject: so.Mapped[str] = so.mapped_column(sa.String(255))
+    body: so.Mapped[str] = so.mapped_column(sa.Text)
+    html: so.Mapped[Optional[str]] = so.mapped_column(sa.Text)
+    # pending -> sending -> sent, or back to pending to retry, or failed
+    status: so.Mapped[str] = so.mapped_column(sa.String(16), default="pending")
+    attempts: so.Mapped[int] = so.mapped_column(sa.Integer, default=0)
+    next_attempt_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+    last_error: so.Mapped[Optional[str]] = so.mapped_column(sa.Text)
+    created_at: so.Mapped[datetime] = so.mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+    sent_at: so.Mapped[Optional[datetime]] = so.mapped_column()
+
+    __table_args__ = (
+        sa.Index(
+            "ix_outbound_mail_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+
+
+def leaderboards(opponent, timestamp):
+    """The leaderboards a match against opponent on timestamp counts towards."""
+    return ("overall", f"season:{timestamp.year}", f"opponent:{opponent}")
+
+
+def leaderboard_version_key(board):
+    """The DataVersion key bumped when totals on a board move."""
+    return f"leaderboard:{board}"
+
+
+def match_leaderboards(match_ids):
+    return {
+        match_id: leaderboards(opponent, timestamp)
+        for match_id, opponent, timestamp in db.session.execute(
+            sa.select(Match.id, Match.opponent, Match.timestamp).where(
+                Match.id.in_(match_ids)
+            )
+        )
+    }
+
+
+def board_matches_filter(board):
+    """The WHERE clause on Match for the matches counting towards a board."""
+    kind, _, name = board.partition(":")
+    if kind == "season":
+        year = int(name)
+        return sa.and_(
+            Match.timestamp >= datetime(year, 1, 1),
+            Match.timestamp < datetime(year + 1, 1, 1),
+        )
+    if kind == "opponent":
+        return Match.opponent == name
+    return sa.true()
+
+
+def better_match(candidate, best):
+    """Whether (match_id, total) beats the best so far: a higher total, or
+    the same total in an earlier match."""
+    if best[1] is None:
+        return True
+    return (candidate[1], -candidate[0]) > (best[1], -best[0])
+
+
+def best_match(board, user_id, exclude=()):
+    """(match_id, total) of a player's best match on a board, read from
+    their MatchTotal rows, or (None, None)."""
+    query = (
+        sa.select(MatchTotal.match_id, MatchTotal.total)
+        .join(Match, Match.id == MatchTotal.match_id)
+        .where(MatchTotal.user_id == user_id, board_matches_filter(board))
+        .order_by(MatchTotal.total.desc(), MatchTotal.match_id)
+        .limit(1)
+    )
+    if exclude:
+        query = query.where(MatchTotal.match_id.not_in(exclude))
+    row = db.session.execute(query).first()
+    return tuple(row) if row is not None else (None, None)
+
+
+def add_deltas(deltas, key, change):
+    running = deltas.setdefault(key, [0, 0, 0])
+    for i, value in enumerate(change):
+        running[i] += value
+
+
+def dialect_insert(model):
+    """INSERT construct for the session's dialect, supporting ON CONFLICT."""
+    return _INSERTS[db.session.get_bind().dialect.name](model)
+
+
+def user_snapshot(user_id):
+    row = db.session.execute(
+        sa.select(User.id, User.username, User.is_active).where(User.id == user_id)
+    ).first()
+    return UserSnapshot(*row) if row is not None else None
+
+
 @login.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
+    # no query while the snapshot is cached; the full User is only loaded
+    # if the view touches something beyond id, username and is_active
+    snapshot = user_cache.get(int(id), user_snapshot)
+    if snapshot is None:
+        return None
+    return LazyUser(snapshot, lambda: db.session.get(User, snapshot.id))
@@ -0,0 +1,162 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+from flask_login import current_user
+from app.models import DataVersion
+
+
+def current_versions(keys):
+    """DataVersion.current(keys), without a query when the view is running
+    under PageCache.conditional and its ETag was made from all of them."""
+    known = g.get("data_versions") or {}
+    if all(key in known for key in keys):
+        return tuple(known[key] for key in keys)
+    return DataVersion.current(keys)
+
+
+class ResponseCache:
+    """LRU cache of rendered responses, bounded by the total size of the bodies."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._entries[key] = (body, headers)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class PageCache:
+    """ETag / If-None-Match support for pages whose data carries a DataVersion.
+
+    A view wrapped with conditional() names the DataVersion keys its output
+    depends on. The ETag combines the route, those versions and the viewer, so
+    a matching If-None-Match is answered with a 304 without running the view.
+    When RESPONSE_CACHE_ENABLED is set, rendered 200 responses are also kept
+    in a ResponseCache under the same key.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.ttl = 300
+        self.cache = ResponseCache(0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config["RESPONSE_CACHE_ENABLED"]
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        self.cache = ResponseCache(app.config["RESPONSE_CACHE_MAX_BYTES"])
+
+    def conditional(self, keys_for):
+        """Decorate a GET view; keys_for receives the view's arguments and
+        returns the DataVersion keys the page is built from."""
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapped(*args, **kwargs):
+                # a render would consume pending flash messages
+                if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                    return view(*args, **kwargs)
+
+                keys = keys_for(*args, **kwargs)
+                versions = DataVersion.current(keys)
+                etag = self._etag(keys, versions)
+                # for current_versions() while the view runs
+                g.data_versions = dict(zip(keys, versions))
+                try:
+                    return self._respond(etag, view, args, kwargs)
+                finally:
+                    g.pop("data_versions", None)
+
+            return wrapped
+
+        return decorator
+
+    def _respond(self, etag, view, args, kwargs):
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        cached = self.cache.get(etag) if self.enabled else None
+        if cached is not None:
+            body, headers = cached
+            response = make_response(body, 200, headers)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if self.enabled and not response.is_streamed:
+                self.cache.set(
+                    etag,
+                    response.get_data(),
+                    [
+                        (name, value)
+                        for name, value in response.headers.items()
+                        if name.lower() not in ("content-length", "set-cookie")
+                    ],
+                )
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    def metric_lines(self):
+        cache = self.cache
+        return [
+            "# TYPE skylog_response_cache_hits_total counter",
+            f"skylog_response_cache_hits_total {cache.hits}",
+            "# TYPE skylog_response_cache_misses_total counter",
+            f"skylog_response_cache_misses_total {cache.misses}",
+            "# TYPE skylog_response_cache_evictions_total counter",
+            f"skylog_response_cache_evictions_total {cache.evictions}",
+            "# TYPE skylog_response_cache_bytes gauge",
+            f"skylog_response_cache_bytes {cache.size}",
+        ]
+
+    def _etag(self, keys, versions):
+        viewer = current_user.get_id() if current_user.is_authenticated else "-"
+        # pages embed CSRF tokens, which depend on the session's secret and
+        # expire, so the secret is part of the key and even unchanged pages
+        # are re-rendered once per TTL
+        if current_app.config.get("WTF_CSRF_ENABLED", True):
+            generate_csrf()
+        csrf = session.get("csrf_token", "")
+        window = int(time.time() // self.ttl)
+        raw = f"{request.full_path}|{keys}|{versions}|{viewer}|{csrf}|{window}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
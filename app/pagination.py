@@ -0,0 +1,100 @@
+import base64
+import binascii
+from datetime import datetime
+import sqlalchemy as sa
+from app import db
+from app.models import LeaderboardEntry, Match, User
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(raw):
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+
+
+def encode_cursor(match):
+    return _encode(f"{match.timestamp.isoformat()}|{match.id}")
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, match_id = _decode(cursor).rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(match_id)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def encode_entry_cursor(entry):
+    return _encode(f"{entry.total}|{entry.user_id}")
+
+
+def decode_entry_cursor(cursor):
+    try:
+        total, user_id = _decode(cursor).split("|")
+        return int(total), int(user_id)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def matches_page(cursor=None, per_page=25, query=None):
+    """Return one page of matches, newest first, and the cursor of the next page.
+
+    Pages are keyed on (timestamp, id) rather than an OFFSET, so every page is
+    a range read on ix_match_timestamp no matter how deep into the list it is.
+    """
+    if query is None:
+        query = sa.select(Match)
+    query = query.order_by(Match.timestamp.desc(), Match.id.desc())
+
+    if cursor:
+        timestamp, match_id = decode_cursor(cursor)
+        query = query.where(
+            sa.or_(
+                Match.timestamp < timestamp,
+                sa.and_(Match.timestamp == timestamp, Match.id < match_id),
+            )
+        )
+
+    # fetch one extra row to find out whether there is another page
+    rows = db.session.execute(query.limit(per_page + 1)).scalars().all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+
+def leaderboard_page(board, cursor=None, per_page=25):
+    """Return one page of a board's (LeaderboardEntry, username) rows,
+    highest total first, and the cursor of the next page.
+
+    Keyed on (total, user_id) like matches_page, so a deep page is a range
+    read on ix_leaderboard_entry_board_total rather than an OFFSET.
+    """
+    query = (
+        sa.select(LeaderboardEntry, User.username)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .where(LeaderboardEntry.board == board)
+        .order_by(LeaderboardEntry.total.desc(), LeaderboardEntry.user_id)
+    )
+
+    if cursor:
+        total, user_id = decode_entry_cursor(cursor)
+        query = query.where(
+            sa.or_(
+                LeaderboardEntry.total < total,
+                sa.and_(
+                    LeaderboardEntry.total == total, LeaderboardEntry.user_id > user_id
+                ),
+            )
+        )
+
+    rows = db.session.execute(query.limit(per_page + 1)).all()
+    next_cursor = (
+        encode_entry_cursor(rows[per_page - 1][0]) if len(rows) > per_page else None
+    )
+    return rows[:per_page], next_cursor
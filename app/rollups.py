@@ -0,0 +1,195 @@
+import sqlalchemy as sa
+from app import db
+from app.models import (
+    Match,
+    Score,
+    MatchTotal,
+    UserTotal,
+    LeaderboardEntry,
+    DataVersion,
+    better_match,
+    leaderboard_version_key,
+    leaderboards,
+)
+
+
+def expected_match_totals():
+    """Recompute every MatchTotal row from the raw Score table."""
+    query = sa.select(
+        Score.match_id,
+        Score.user_id,
+        sa.func.sum(Score.score),
+        sa.func.count(Score.id),
+        sa.func.max(Score.score),
+    ).group_by(Score.match_id, Score.user_id)
+    return {
+        (match_id, user_id): (total, turns_played, best_turn)
+        for match_id, user_id, total, turns_played, best_turn in db.session.execute(
+            query
+        )
+    }
+
+
+def expected_user_totals(match_totals):
+    user_totals = {}
+    for (_, user_id), (total, turns_played, _) in match_totals.items():
+        running = user_totals.setdefault(user_id, [0, 0, 0])
+        running[0] += total
+        running[1] += turns_played
+        running[2] += 1
+    return {user_id: tuple(values) for user_id, values in user_totals.items()}
+
+
+def expected_leaderboards(match_totals):
+    boards = {
+        match_id: leaderboards(opponent, timestamp)
+        for match_id, opponent, timestamp in db.session.execute(
+            sa.select(Match.id, Match.opponent, Match.timestamp)
+        )
+    }
+    entries = {}
+    for (match_id, user_id), (total, turns_played, _) in match_totals.items():
+        for board in boards[match_id]:
+            running = entries.setdefault((board, user_id), [0, 0, 0, None, None])
+            running[0] += total
+            running[1] += turns_played
+            running[2] += 1
+            if better_match((match_id, total), running[3:]):
+                running[3:] = [match_id, total]
+    return {key: tuple(values) for key, values in entries.items()}
+
+
+def rebuild_leaderboards(match_totals=None):
+    """Replace every LeaderboardEntry with one computed from the raw Score
+    table, in the caller's transaction; returns the number of entries."""
+    if match_totals is None:
+        match_totals = expected_match_totals()
+    entries = expected_leaderboards(match_totals)
+    boards = set(db.session.scalars(sa.select(LeaderboardEntry.board).distinct())) | {
+        board for board, _ in entries
+    }
+    db.session.execute(sa.delete(LeaderboardEntry))
+    if entries:
+        db.session.execute(
+            sa.insert(LeaderboardEntry),
+            [
+                {
+                    "board": board,
+                    "user_id": user_id,
+                    "total": total,
+                    "turns_played": turns_played,
+                    "matches_played": matches_played,
+                    "best_match_id": best_match_id,
+                    "best_match_total": best_match_total,
+                }
+                for (board, user_id), (
+                    total,
+                    turns_played,
+                    matches_played,
+                    best_match_id,
+                    best_match_total,
+                ) in entries.items()
+            ],
+        )
+    DataVersion.bump(
+        "leaderboard", *(leaderboard_version_key(board) for board in sorted(boards))
+    )
+    return len(entries)
+
+
+def rebuild():
+    match_totals = expected_match_totals()
+    user_totals = expected_user_totals(match_totals)
+
+    db.session.execute(sa.delete(MatchTotal))
+    db.session.execute(sa.delete(UserTotal))
+    if match_totals:
+        db.session.execute(
+            sa.insert(MatchTotal),
+            [
+                {
+                    "match_id": match_id,
+                    "user_id": user_id,
+                    "total": total,
+                    "turns_played": turns_played,
+                    "best_turn": best_turn,
+                }
+                for (match_id, user_id), (
+                    total,
+                    turns_played,
+                    best_turn,
+                ) in match_totals.items()
+            ],
+        )
+    if user_totals:
+        db.session.execute(
+            sa.insert(UserTotal),
+            [
+                {
+                    "user_id": user_id,
+                    "total": total,
+                    "turns_played": turns_played,
+                    "matches_played": matches_played,
+                }
+                for user_id, (
+                    total,
+                    turns_played,
+                    matches_played,
+                ) in user_totals.items()
+            ],
+        )
+    rebuild_leaderboards(match_totals)
+    db.session.commit()
+    return len(match_totals), len(user_totals)
+
+
+def verify():
+    """Return a list of human readable differences between the rollups and Score."""
+    problems = []
+
+    expected = expected_match_totals()
+    stored = {
+        (row.match_id, row.user_id): (row.total, row.turns_played, row.best_turn)
+        for row in db.session.execute(sa.select(MatchTotal)).scalars()
+    }
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            problems.append(
+                f"match {key[0]} user {key[1]}: "
+                f"expected {expected.get(key)}, stored {stored.get(key)}"
+            )
+
+    expected_users = expected_user_totals(expected)
+    stored_users = {
+        row.user_id: (row.total, row.turns_played, row.matches_played)
+        for row in db.session.execute(sa.select(UserTotal)).scalars()
+        # rows emptied by removals are equivalent to missing rows
+        if row.turns_played or row.total or row.matches_played
+    }
+    for user_id in sorted(expected_users.keys() | stored_users.keys()):
+        if expected_users.get(user_id) != stored_users.get(user_id):
+            problems.append(
+                f"user {user_id}: expected {expected_users.get(user_id)}, "
+                f"stored {stored_users.get(user_id)}"
+            )
+
+    expected_entries = expected_leaderboards(expected)
+    stored_entries = {
+        (row.board, row.user_id): (
+            row.total,
+            row.turns_played,
+            row.matches_played,
+            row.best_match_id,
+            row.best_match_total,
+        )
+        for row in db.session.execute(sa.select(LeaderboardEntry)).scalars()
+    }
+    for key in sorted(expected_entries.keys() | stored_entries.keys()):
+        if expected_entries.get(key) != stored_entries.get(key):
+            problems.append(
+                f"leaderboard {key[0]} user {key[1]}: "
+                f"expected {expected_entries.get(key)}, "
+                f"stored {stored_entries.get(key)}"
+            )
+
+    return problems
@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Optional
+import sqlalchemy as sa
+from app import db
+from app.models import User, Score
+
+TURNS = 10
+
+
+@dataclass
+class PlayerRow:
+    user_id: int
+    username: str
+    # one slot per turn, None where the player has no score for that turn
+    turns: list = field(default_factory=lambda: [None] * TURNS)
+
+    @property
+    def total(self):
+        return sum(score for score in self.turns if score is not None)
+
+    @property
+    def turns_played(self):
+        return sum(1 for score in self.turns if score is not None)
+
+
+@dataclass
+class Scoreboard:
+    match_id: int
+    players: list = field(default_factory=list)
+
+    def row_for(self, user_id) -> Optional[PlayerRow]:
+        for row in self.players:
+            if row.user_id == user_id:
+                return row
+        return None
+
+
+def scoreboard_query(match_id):
+    return (
+        sa.select(User.id, User.username, Score.turn_number, Score.score)
+        .join(Score, Score.user_id == User.id)
+        .where(Score.match_id == match_id)
+        .order_by(User.username, Score.turn_number)
+    )
+
+
+def pivot(match_id, rows):
+    """Pivot (user_id, username, turn_number, score) rows into a Scoreboard.
+
+    Rows may arrive in any order and any turn may be missing; turn numbers
+    outside 1..TURNS are ignored rather than raising.
+    """
+    board = Scoreboard(match_id=match_id)
+    by_user = {}
+    for user_id, username, turn_number, score in rows:
+        row = by_user.get(user_id)
+        if row is None:
+            row = by_user[user_id] = PlayerRow(user_id=user_id, username=username)
+            board.players.append(row)
+        if 1 <= turn_number <= TURNS:
+            row.turns[turn_number - 1] = score
+    board.players.sort(key=lambda row: row.username)
+    return board
+
+
+def build_scoreboard(match_id):
+    # a single joined query whatever the number of players in the match
+    return pivot(match_id, db.session.execute(scoreboard_query(match_id)).all())
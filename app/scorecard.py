@@ -0,0 +1,108 @@
+import sqlalchemy as sa
+from app import db, live_scores, scoregrid
+from app.models import Match, Score, MatchTotal, DataVersion, dialect_insert
+from app.stats import stats_cache
+
+
+def upsert_scores(rows=None):
+    """Build one multi-row INSERT ... ON CONFLICT DO UPDATE for Score rows.
+
+    Each row is a dict with match_id, user_id, turn_number and score; a row
+    for a turn that already exists replaces that turn's score. Without rows
+    the statement is left for executemany-style parameters.
+    """
+    stmt = dialect_insert(Score)
+    if rows is not None:
+        stmt = stmt.values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[Score.match_id, Score.user_id, Score.turn_number],
+        set_={"score": stmt.excluded.score},
+    )
+
+
+def save_scorecard(match_id, user_id, turns):
+    """Save a player's scorecard in one statement, in the caller's transaction.
+
+    turns maps turn numbers to scores; turns whose score is None are left as
+    they are.
+    """
+    rows = [
+        {
+            "match_id": match_id,
+            "user_id": user_id,
+            "turn_number": turn_number,
+            "score": score,
+        }
+        for turn_number, score in sorted(turns.items())
+        if score is not None
+    ]
+    if rows:
+        db.session.execute(upsert_scores(rows))
+    _scores_changed(match_id, user_id)
+    changes = {row["turn_number"]: row["score"] for row in rows}
+    scoregrid.stage(match_id, user_id, changes)
+    live_scores.stage(match_id, user_id, changes)
+    return len(rows)
+
+
+def remove_turn(match_id, user_id, turn_number):
+    """Delete one turn of a player's scorecard; returns False if it had no score."""
+    result = db.session.execute(
+        sa.delete(Score).where(
+            Score.match_id == match_id,
+            Score.user_id == user_id,
+            Score.turn_number == turn_number,
+        )
+    )
+    if not result.rowcount:
+        return False
+    _scores_changed(match_id, user_id)
+    scoregrid.stage(match_id, user_id, {turn_number: None})
+    live_scores.stage(match_id, user_id, {turn_number: None})
+    return True
+
+
+def delete_matches(match_ids):
+    """Delete matches with a single DELETE, in the caller's transaction;
+    returns the number deleted.
+
+    Their scores and MatchTotal rows are removed by the database through
+    ON DELETE CASCADE, so none of them are loaded.
+    """
+    match_ids = list(match_ids)
+    user_ids = MatchTotal.remove_matches(match_ids)
+    deleted = db.session.execute(
+        sa.delete(Match).where(Match.id.in_(match_ids)),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    DataVersion.bump(
+        "matches",
+        *(f"match:{match_id}" for match_id in match_ids),
+        *(f"user:{user_id}" for user_id in user_ids),
+    )
+    for match_id in match_ids:
+        scoregrid.invalidate(match_id)
+    for user_id in user_ids:
+        stats_cache.invalidate(user_id)
+    return deleted
+
+
+def refresh_derived(pairs):
+    """Update what is derived from scores after (match_id, user_id) pairs were
+    written in bulk, in the caller's transaction."""
+    pairs = set(pairs)
+    MatchTotal.refresh_many(pairs)
+    for user_id in {user_id for _, user_id in pairs}:
+        stats_cache.invalidate(user_id)
+    DataVersion.bump(
+        *sorted({f"match:{match_id}" for match_id, _ in pairs}),
+        *sorted({f"user:{user_id}" for _, user_id in pairs}),
+    )
+
+
+def _scores_changed(match_id, user_id):
+    # everything derived from a player's scorecard, updated in the same
+    # transaction as the scores themselves
+    MatchTotal.refresh(match_id, user_id)
+    DataVersion.bump(f"match:{match_id}", f"user:{user_id}")
+    stats_cache.invalidate(user_id)
@@ -0,0 +1,198 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from app import db
+from app.database import listen_once
+from app.models import DataVersion
+from app.page_cache import current_versions
+from app.scoreboard import TURNS, PlayerRow, Scoreboard, scoreboard_query
+
+MISSING = -1
+# rough fixed cost of a grid beyond its arrays and usernames
+GRID_OVERHEAD = 400
+
+
+class ScoreGrid:
+    """One match's scores: player ids and usernames (in username order) and a
+    players x TURNS int8 matrix, with MISSING where a turn has no score."""
+
+    __slots__ = ("user_ids", "usernames", "turns", "versions")
+
+    def __init__(self, user_ids, usernames, turns, versions):
+        self.user_ids = user_ids
+        self.usernames = usernames
+        self.turns = turns
+        self.versions = versions
+
+    @classmethod
+    def from_rows(cls, rows, versions):
+        """Build from (user_id, username, turn_number, score) rows in
+        username order, as scoreboard_query returns them."""
+        index = {}
+        usernames = []
+        for user_id, username, _, _ in rows:
+            if user_id not in index:
+                index[user_id] = len(usernames)
+                usernames.append(username)
+        turns = np.full((len(index), TURNS), MISSING, dtype=np.int8)
+        for user_id, _, turn_number, score in rows:
+            if 1 <= turn_number <= TURNS:
+                turns[index[user_id], turn_number - 1] = score
+        user_ids = np.fromiter(index, dtype=np.int32, count=len(index))
+        return cls(user_ids, tuple(usernames), turns, versions)
+
+    @property
+    def nbytes(self):
+        return (
+            GRID_OVERHEAD
+            + self.user_ids.nbytes
+            + self.turns.nbytes
+            + sum(sys.getsizeof(name) for name in self.usernames)
+        )
+
+    def patch(self, user_id, changes):
+        """Apply {turn_number: score or None}; False if the player has no row
+        yet, since their username is not known here."""
+        found = np.flatnonzero(self.user_ids == user_id)
+        if not len(found):
+            return not any(score is not None for score in changes.values())
+        row = found[0]
+        for turn_number, score in changes.items():
+            if 1 <= turn_number <= TURNS:
+                self.turns[row, turn_number - 1] = MISSING if score is None else score
+        if (self.turns[row] == MISSING).all():
+            # players only appear on the scoreboard while they have scores
+            self.user_ids = np.delete(self.user_ids, row)
+            self.turns = np.delete(self.turns, row, axis=0)
+            self.usernames = self.usernames[:row] + self.usernames[row + 1 :]
+        return True
+
+    def to_scoreboard(self, match_id):
+        board = Scoreboard(match_id=match_id)
+        for user_id, username, turns in zip(
+            self.user_ids.tolist(), self.usernames, self.turns.tolist()
+        ):
+            board.players.append(
+                PlayerRow(
+                    user_id=user_id,
+                    username=username,
+                    turns=[None if score == MISSING else score for score in turns],
+                )
+            )
+        return board
+
+
+class ScoreGridCache:
+    """Process-local LRU of ScoreGrids, bounded by SCOREGRID_CACHE_MAX_BYTES.
+
+    Each grid remembers the match:<id> and users DataVersions it was loaded
+    at, so one primary key read tells whether it is still current, whichever
+    process wrote to the match. Writes through app.scorecard patch the cached
+    grid in place once their transaction commits, instead of dropping it.
+    """
+
+    def __init__(self, app=None):
+        self.max_bytes = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_bytes = app.config["SCOREGRID_CACHE_MAX_BYTES"]
+        listen_once("after_commit", self._after_commit)
+        listen_once("after_rollback", self._after_rollback)
+
+    def scoreboard(self, match_id):
+        """The match's Scoreboard, from the cached grid when it is current."""
+        versions = current_versions(self._keys(match_id))
+        with self._lock:
+            grid = self._entries.get(match_id)
+            if grid is not None and grid.versions == versions:
+                self._entries.move_to_end(match_id)
+                self.hits += 1
+                return grid.to_scoreboard(match_id)
+            self.misses += 1
+
+        grid = ScoreGrid.from_rows(
+            db.session.execute(scoreboard_query(match_id)).all(), versions
+        )
+        with self._lock:
+            self._store(match_id, grid)
+        return grid.to_scoreboard(match_id)
+
+    def stage(self, match_id, user_id, changes):
+        """Queue a patch for the current transaction; called after the write
+        and its DataVersion bump, and applied only if the transaction commits."""
+        versions = DataVersion.current(self._keys(match_id))
+        db.session.info.setdefault("scoregrid_patches", []).append(
+            (match_id, user_id, changes, versions)
+        )
+
+    def invalidate(self, match_id):
+        with self._lock:
+            grid = self._entries.pop(match_id, None)
+            if grid is not None:
+                self.size -= grid.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_scoregrid_cache_hits_total counter",
+            f"skylog_scoregrid_cache_hits_total {self.hits}",
+            "# TYPE skylog_scoregrid_cache_misses_total counter",
+            f"skylog_scoregrid_cache_misses_total {self.misses}",
+            "# TYPE skylog_scoregrid_cache_evictions_total counter",
+            f"skylog_scoregrid_cache_evictions_total {self.evictions}",
+            "# TYPE skylog_scoregrid_cache_bytes gauge",
+            f"skylog_scoregrid_cache_bytes {self.size}",
+        ]
+
+    def _keys(self, match_id):
+        return [f"match:{match_id}", "users"]
+
+    def _store(self, match_id, grid):
+        old = self._entries.pop(match_id, None)
+        if old is not None:
+            self.size -= old.nbytes
+        if grid.nbytes > self.max_bytes:
+            return
+        self._entries[match_id] = grid
+        self.size += grid.nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.nbytes
+            self.evictions += 1
+
+    def _after_commit(self, session):
+        patches = session.info.pop("scoregrid_patches", None)
+        if not patches:
+            return
+        with self._lock:
+            for match_id, user_id, changes, (match_version, users_version) in patches:
+                grid = self._entries.pop(match_id, None)
+                if grid is None:
+                    continue
+                self.size -= grid.nbytes
+                # only a grid that was current just before this write can be
+                # patched; anything else is reloaded on the next read
+                old_match_version, old_users_version = grid.versions
+                if (
+                    old_match_version == match_version - 1
+                    and old_users_version == users_version
+                    and grid.patch(user_id, changes)
+                ):
+                    grid.versions = (match_version, users_version)
+                    self._store(match_id, grid)
+
+    def _after_rollback(self, session):
+        session.info.pop("scoregrid_patches", None)
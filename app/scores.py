@@ -0,0 +1,134 @@
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    redirect,
+    url_for,
+    request,
+    abort,
+    Response,
+)
+from flask_login import current_user, login_required
+from app import db, live_scores, page_cache, scoregrid
+from app.forms import EditScoresForm
+from app.leaderboard import board_count, board_name, boards, standing, top
+from app.models import ArchivedMatch, Match
+from app.page_cache import current_versions
+from app.pagination import InvalidCursor
+from app.scorecard import save_scorecard, remove_turn
+
+bp = Blueprint("scores", __name__)
+
+
+@bp.route("/match/<int:id>", methods=["GET", "POST"])
+@page_cache.conditional(lambda id: ["users", f"match:{id}"])
+def match(id):
+    def get_form_field(form, name):
+        return getattr(form, name)
+
+    match = db.session.get(Match, id)
+    if match is None:
+        # links to a match stay valid after it is archived
+        if db.session.get(ArchivedMatch, id) is not None:
+            return redirect(url_for("matches.archived_match", id=id))
+        abort(404)
+
+    form = EditScoresForm()
+
+    if form.validate_on_submit():
+        # all ten turns are written in a single upsert statement
+        save_scorecard(
+            match.id,
+            current_user.id,
+            {turn: getattr(form, f"turn_{turn}").data for turn in range(1, 11)},
+        )
+        db.session.commit()
+        return redirect(url_for("scores.match", id=match.id))
+
+    # every player's turns for the match, from the grid cache or one query
+    scoreboard = scoregrid.scoreboard(match.id)
+
+    # prepopulate the form with existing scores
+    own_row = scoreboard.row_for(current_user.id)
+    if own_row is not None:
+        for turn, score in enumerate(own_row.turns, start=1):
+            if score is not None:
+                getattr(form, f"turn_{turn}").data = score
+
+    # render the page with the forms and scores
+    return render_template(
+        "match.html",
+        id=id,
+        # where the live stream picks up from
+        version=current_versions([f"match:{id}"])[0],
+        form=form,
+        scoreboard=scoreboard,
+        own_row=own_row,
+        get_form_field=get_form_field,
+    )
+
+
+@bp.route("/match/<int:id>/events")
+@login_required
+def match_events(id):
+    # Server-sent events patching the open scoreboard; EventSource resends
+    # the last event's id when it reconnects
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args["since"])
+    except (KeyError, ValueError):
+        abort(400)
+    if db.session.get(Match, id) is None:
+        abort(404)
+    return Response(
+        live_scores.stream(id, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/remove_score/<int:match_id>", methods=["POST"])
+@login_required
+def remove_score(match_id):
+    # get match and ensure validity
+    match = Match.query.get_or_404(match_id)
+
+    selected_turn = request.form.get("turn_to_remove")
+
+    if selected_turn:
+        turn_number = int(selected_turn)
+
+        if remove_turn(match.id, current_user.id, turn_number):
+            db.session.commit()
+
+    return redirect(url_for("scores.match", id=match.id))
+
+
+@bp.route("/leaderboard")
+@login_required
+@page_cache.conditional(lambda: ["leaderboard", "users"])
+def leaderboard():
+    # ?season=<year> or ?opponent=<name>, otherwise the overall board
+    season = request.args.get("season", type=int)
+    opponent = request.args.get("opponent") or None
+    cursor = request.args.get("after")
+    board = board_name(season=season, opponent=opponent)
+
+    try:
+        standings, next_cursor = top(
+            board, cursor=cursor, per_page=current_app.config["LEADERBOARD_PER_PAGE"]
+        )
+    except InvalidCursor:
+        abort(400)
+    return render_template(
+        "leaderboard.html",
+        title="Leaderboard",
+        season=season,
+        opponent=opponent,
+        cursor=cursor,
+        next_cursor=next_cursor,
+        standings=standings,
+        players=board_count(board),
+        own=standing(board, current_user.id),
+        seasons=sorted(boards("season"), reverse=True),
+        opponents=boards("opponent"),
+    )
@@ -0,0 +1,62 @@
+from datetime import timedelta
+import sqlalchemy as sa
+from app import db
+from app.models import Match
+
+# the trigram index cannot match anything shorter
+MIN_TERM_LENGTH = 3
+
+match_search = sa.table("match_search", sa.column("rowid"))
+
+
+def search_terms(text):
+    """The words of a search that are long enough to look up."""
+    return [term for term in (text or "").split() if len(term) >= MIN_TERM_LENGTH]
+
+
+def fts_query(terms):
+    # each term is a quoted FTS5 string, so punctuation in it is matched
+    # literally; terms are ANDed
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_query(text=None, since=None, until=None):
+    """Matches whose opponent or location contains every term of `text`,
+    played between since and until (inclusive dates).
+
+    Terms are looked up in the match_search FTS5 trigram index, so a term
+    matches anywhere in a word, case insensitively, and the date range is
+    read from ix_match_timestamp. Pass the result to
+    pagination.matches_page.
+    """
+    query = sa.select(Match)
+    terms = search_terms(text)
+    if terms:
+        if db.session.get_bind().dialect.name == "sqlite":
+            # Without dates, the hits are looked up by id and sorted, which
+            # costs the same however large the table is. With dates, "+ 0"
+            # keeps SQLite off the primary key, so it walks the date range
+            # on ix_match_timestamp newest first, checks each match against
+            # the hits, and stops at the end of the page.
+            id_column = Match.id + 0 if since or until else Match.id
+            query = query.where(
+                id_column.in_(
+                    sa.select(match_search.c.rowid).where(
+                        sa.text("match_search MATCH :terms").bindparams(
+                            terms=fts_query(terms)
+                        )
+                    )
+                )
+            )
+        else:
+            # unindexed elsewhere
+            for term in terms:
+                pattern = f"%{term}%"
+                query = query.where(
+                    sa.or_(Match.opponent.ilike(pattern), Match.location.ilike(pattern))
+                )
+    if since:
+        query = query.where(Match.timestamp >= since)
+    if until:
+        query = query.where(Match.timestamp < until + timedelta(days=1))
+    return query
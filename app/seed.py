@@ -0,0 +1,102 @@
+import random
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from app import db, hasher, rollups
+from app.models import User, Match, Score, DataVersion
+
+OPPONENTS = [
+    "Ashford",
+    "Bramley",
+    "Castleton",
+    "Denholme",
+    "Elmstead",
+    "Farnley",
+    "Greenhill",
+    "Harwood",
+    "Ingleby",
+    "Kirkham",
+    "Longridge",
+    "Marston",
+]
+LOCATIONS = ["Home", "Away", "Club House", "County Ground", "Indoor Range"]
+
+
+def generate(users, matches, seed=None, batch_size=5000, password="password"):
+    """Fill the database with synthetic users, matches and scores.
+
+    Each match gets between two and eight players, and each player scores
+    only some of the ten turns, so scorecards are as sparse as real ones.
+    Returns the number of users, matches and scores inserted.
+    """
+    rng = random.Random(seed)
+    # hashing one password per user would dominate the run
+    password_hash = hasher.hash(password)
+    first_user = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+
+    user_rows = [
+        {
+            "id": first_user + n,
+            "username": f"player{first_user + n}",
+            "email": f"player{first_user + n}@example.com",
+            "forename": "Player",
+            "surname": str(first_user + n),
+            "password_hash": password_hash,
+        }
+        for n in range(users)
+    ]
+    _insert_batches(User, user_rows, batch_size)
+    user_ids = [row["id"] for row in user_rows]
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    match_rows = []
+    match_scores = []
+    for n in range(matches):
+        match_rows.append(
+            {
+                "opponent": rng.choice(OPPONENTS),
+                "location": rng.choice(LOCATIONS),
+                "timestamp": now - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+            }
+        )
+        scores = []
+        match_scores.append(scores)
+        players = rng.sample(user_ids, min(len(user_ids), rng.randint(2, 8)))
+        for user_id in players:
+            played = rng.uniform(0.3, 1.0)
+            for turn in range(1, 11):
+                if rng.random() < played:
+                    scores.append(
+                        {
+                            "user_id": user_id,
+                            "turn_number": turn,
+                            "score": min(27, max(0, int(rng.gauss(14, 6)))),
+                        }
+                    )
+    # the database numbers the matches, so ids once used by a match that is
+    # now archived are not taken again
+    match_ids = _insert_batches(Match, match_rows, batch_size, returning=Match.id)
+    score_rows = [
+        dict(row, match_id=match_id)
+        for match_id, scores in zip(match_ids, match_scores)
+        for row in scores
+    ]
+    _insert_batches(Score, score_rows, batch_size)
+    DataVersion.bump("matches", "users")
+    db.session.commit()
+
+    rollups.rebuild()
+    return len(user_rows), len(match_rows), len(score_rows)
+
+
+def _insert_batches(model, rows, batch_size, returning=None):
+    """Insert rows batch_size at a time; with a returning column, returns its
+    value for each row, in the order of the rows."""
+    values = []
+    for start in range(0, len(rows), batch_size):
+        stmt = sa.insert(model)
+        if returning is not None:
+            stmt = stmt.returning(returning, sort_by_parameter_order=True)
+        result = db.session.execute(stmt, rows[start : start + batch_size])
+        if returning is not None:
+            values.extend(result.scalars())
+    return values
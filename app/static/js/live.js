@@ -0,0 +1,69 @@
+// keeps the scoreboard of an open match page up to date from the server's
+// event stream, instead of the page being reloaded to see new scores
+
+function scoreboardRow(table, userId, username) {
+    // the player's row, added in username order if they have none yet
+    const body = table.tBodies[0];
+    let row = body.querySelector(`tr[data-user-id="${userId}"]`);
+    if (row || !username) {
+        return row;
+    }
+    row = document.createElement("tr");
+    row.dataset.userId = userId;
+    const cells = [username, ...Array(10).fill("-"), "0"];
+    for (const text of cells) {
+        const cell = row.insertCell();
+        cell.textContent = text;
+    }
+    const next = Array.from(body.rows).find((other) => other.cells[0].textContent.trim() > username);
+    body.insertBefore(row, next || null);
+    return row;
+}
+
+function patchScoreboard(table, event) {
+    const data = JSON.parse(event.data);
+    const scores = Object.entries(data.turns);
+    if (!scores.some(([, score]) => score !== null) && !table.querySelector(`tr[data-user-id="${data.user_id}"]`)) {
+        return;
+    }
+    const row = scoreboardRow(table, data.user_id, data.username);
+    if (!row) {
+        return;
+    }
+    for (const [turn, score] of scores) {
+        row.cells[Number(turn)].textContent = score === null ? "-" : score;
+    }
+
+    // players only appear on the scoreboard while they have scores
+    const turns = Array.from(row.cells).slice(1, 11).map((cell) => cell.textContent.trim());
+    const played = turns.filter((text) => text !== "-");
+    if (!played.length) {
+        row.remove();
+        return;
+    }
+    row.cells[11].textContent = played.reduce((total, text) => total + Number(text), 0);
+}
+
+function followScoreboard(table) {
+    const source = new EventSource(table.dataset.events);
+    source.addEventListener("score", (event) => patchScoreboard(table, event));
+    source.addEventListener("stale", () => {
+        // a change the stream could not describe, e.g. the match was edited
+        source.close();
+        window.location.reload();
+    });
+    source.addEventListener("error", () => {
+        // the browser retries dropped connections itself, but gives up on
+        // an error response such as the 503 sent when too many are open
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(() => window.location.reload(), 30000);
+        }
+    });
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    const table = document.getElementById("scoreboard");
+    if (table && window.EventSource) {
+        followScoreboard(table);
+    }
+});
@@ -12,4 +12,35 @@ function confirmDelete(event) {
         return false;
     }
     return true;
-}
\ No newline at end of file
+}
+
+function loadMoreMatches(button) {
+    // fetch the next page of rows and append them to the matches table
+    button.disabled = true;
+    // data-url carries the search filters of the page
+    const url = new URL(button.dataset.url, window.location.href);
+    url.searchParams.set("cursor", button.dataset.cursor);
+
+    fetch(url, { credentials: "same-origin" })
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error("Failed to load matches: " + response.status);
+            }
+            const nextCursor = response.headers.get("X-Next-Cursor");
+            return response.text().then((rows) => [rows, nextCursor]);
+        })
+        .then(([rows, nextCursor]) => {
+            document.getElementById("matches-body").insertAdjacentHTML("beforeend", rows);
+            if (nextCursor) {
+                button.dataset.cursor = nextCursor;
+                button.disabled = false;
+            } else {
+                // no more pages
+                button.remove();
+            }
+        })
+        .catch((error) => {
+            console.error(error);
+            button.disabled = false;
+        });
+}
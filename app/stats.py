@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import sqlalchemy as sa
+from app import db
+from app.models import Match, Score, DataVersion
+from app.scoreboard import TURNS
+
+FORM_MATCHES = 5
+PERCENTILES = (10, 25, 50, 75, 90)
+CACHE_SIZE = 1024
+
+
+@dataclass
+class PlayerStats:
+    turns_played: int
+    matches_played: int
+    mean: float
+    stddev: float
+    best_turn: int
+    worst_turn: int
+    # average score at each turn position, None where never played
+    turn_averages: list
+    # average per turn over the last FORM_MATCHES matches, then the same
+    # rolling average ending at each of the most recent matches, oldest first
+    form: float
+    form_trend: list
+    percentiles: dict
+
+
+def score_history(user_id):
+    """A player's scores as (match_id, turn_number, score) int arrays, in
+    match order, from one query."""
+    rows = db.session.execute(
+        sa.select(Score.match_id, Score.turn_number, Score.score)
+        .join(Score.match)
+        .where(Score.user_id == user_id)
+        .order_by(Match.timestamp, Match.id, Score.turn_number)
+    ).all()
+    history = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return history[:, 0], history[:, 1], history[:, 2]
+
+
+def compute(match_ids, turn_numbers, scores):
+    """Statistics for one player's history; None if they have no scores."""
+    if not len(scores):
+        return None
+
+    # per-match averages, relying on each match's scores being contiguous
+    starts = np.flatnonzero(np.r_[True, match_ids[1:] != match_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(scores)])
+    match_averages = np.add.reduceat(scores, starts) / counts
+
+    window = min(FORM_MATCHES, len(match_averages))
+    rolling = np.convolve(match_averages, np.ones(window) / window, mode="valid")
+
+    in_range = (turn_numbers >= 1) & (turn_numbers <= TURNS)
+    turn_totals = np.bincount(
+        turn_numbers[in_range], weights=scores[in_range], minlength=TURNS + 1
+    )[1:]
+    turn_counts = np.bincount(turn_numbers[in_range], minlength=TURNS + 1)[1:]
+
+    return PlayerStats(
+        turns_played=len(scores),
+        matches_played=len(starts),
+        mean=float(scores.mean()),
+        stddev=float(scores.std()),
+        best_turn=int(scores.max()),
+        worst_turn=int(scores.min()),
+        turn_averages=[
+            float(total / count) if count else None
+            for total, count in zip(turn_totals, turn_counts)
+        ],
+        form=float(rolling[-1]),
+        form_trend=[float(value) for value in rolling[-FORM_MATCHES:]],
+        percentiles={
+            pct: float(value)
+            for pct, value in zip(PERCENTILES, np.percentile(scores, PERCENTILES))
+        },
+    )
+
+
+class StatsCache:
+    """LRU of computed PlayerStats, each stored with the DataVersions it was
+    computed at; a score write bumps user:<id>, so the next read recomputes."""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id) -> Optional[PlayerStats]:
+        # "matches" covers match dates being edited, which reorders the form
+        keys = [f"user:{user_id}", "matches"]
+        versions = DataVersion.current(keys)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        stats = compute(*score_history(user_id))
+        with self._lock:
+            self._entries[user_id] = (versions, stats)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return stats
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_stats_cache_hits_total counter",
+            f"skylog_stats_cache_hits_total {self.hits}",
+            "# TYPE skylog_stats_cache_misses_total counter",
+            f"skylog_stats_cache_misses_total {self.misses}",
+            "# TYPE skylog_stats_cache_entries gauge",
+            f"skylog_stats_cache_entries {len(self._entries)}",
+        ]
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from flask_login import UserMixin
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    username: str
+    is_active: bool
+
+
+class LazyUser(UserMixin):
+    """current_user for a request, answered from a UserSnapshot.
+
+    id, username and is_active come from the snapshot. Anything else, and
+    any assignment, loads the full ORM User once through load() and is
+    passed on to it.
+    """
+
+    def __init__(self, snapshot, load):
+        object.__setattr__(self, "_snapshot", snapshot)
+        object.__setattr__(self, "_load", load)
+        object.__setattr__(self, "_user", None)
+
+    @property
+    def user(self):
+        if self._user is None:
+            object.__setattr__(self, "_user", self._load())
+        return self._user
+
+    @property
+    def id(self):
+        return self._snapshot.id
+
+    @property
+    def username(self):
+        # once loaded, the User may have been edited during the request
+        return (self._user or self._snapshot).username
+
+    @property
+    def is_active(self):
+        return (self._user or self._snapshot).is_active
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __repr__(self):
+        return f"<LazyUser {self._snapshot.username}>"
+
+
+class UserCache:
+    """Snapshots of recently authenticated users, kept for USER_CACHE_TTL
+    seconds so login's user_loader needs no query on most requests.
+
+    Entries are dropped when a profile is updated or an account deactivated;
+    other processes pick such changes up within the TTL.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.max_entries = 10000
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.max_entries = app.config["USER_CACHE_MAX_ENTRIES"]
+
+    def get(self, user_id, load_snapshot):
+        """The cached UserSnapshot for user_id, or load_snapshot(user_id)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        snapshot = load_snapshot(user_id)
+        if snapshot is not None and self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (snapshot, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metric_lines(self):
+        return [
+            "# TYPE skylog_user_cache_hits_total counter",
+            f"skylog_user_cache_hits_total {self.hits}",
+            "# TYPE skylog_user_cache_misses_total counter",
+            f"skylog_user_cache_misses_total {self.misses}",
+        ]
@@ -0,0 +1,89 @@
+"""Measure login throughput against password hash cost.
+
+Run from the project root:
+
+    python -m benchmarks.login_throughput --threads 8 --logins 64
+
+Every method is measured twice: hashing inline in the request threads and
+hashing in the process pool.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URI", "sqlite:///" + os.path.join(_db_dir, "bench.db"))
+
+from app import create_app, db, hasher
+from app.models import User
+
+app = create_app()
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+
+
+def run_logins(threads, logins):
+    per_thread = logins // threads
+    statuses = []
+
+    def worker():
+        with app.test_client() as client:
+            for _ in range(per_thread):
+                response = client.post(
+                    "/login", data={"username": "bench", "password": "secret"}
+                )
+                statuses.append(response.status_code)
+                client.get("/logout")
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(statuses) / elapsed, statuses.count(503)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--method", action="append", dest="methods")
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        db.create_all()
+        user = User(
+            username="bench", email="bench@example.com", forename="b", surname="b"
+        )
+        db.session.add(user)
+        db.session.commit()
+
+        print(f"{'method':<24} {'mode':<8} {'logins/s':>10} {'503s':>6}")
+        for method in args.methods or DEFAULT_METHODS:
+            for workers in (0, args.workers):
+                hasher.method = method
+                hasher.workers = workers
+                hasher._prefix = None
+                user.password_hash = hasher.hash("secret")
+                db.session.commit()
+
+                rate, busy = run_logins(args.threads, args.logins)
+                mode = "inline" if workers == 0 else f"pool/{workers}"
+                print(f"{method:<24} {mode:<8} {rate:>10.1f} {busy:>6}")
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
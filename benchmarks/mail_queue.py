@@ -0,0 +1,91 @@
+"""Throughput of the outbound mail queue against a local aiosmtpd server.
+
+Run from the project root:
+
+    python -m benchmarks.mail_queue --messages 500
+
+Compares Flask-Mail's mail.send(), which opens a new SMTP connection per
+message as a request would, with MailQueue.send_due(), which sends queued
+messages in batches over one connection.
+"""
+
+import argparse
+import os
+import socket
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URI", "sqlite:///" + os.path.join(_db_dir, "bench.db"))
+os.environ["MAIL_QUEUE_POLL_INTERVAL"] = "0"
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+from flask_mail import Message
+from app import create_app, db, mail, mail_queue
+
+app = create_app()
+
+
+class CountingHandler(Sink):
+    def __init__(self):
+        self.count = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.count += 1
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_TLS=False)
+    app.config.update(MAIL_USERNAME=None, MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    mail_queue.batch_size = args.batch_size
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+            start = time.perf_counter()
+            for n in range(args.messages):
+                mail.send(
+                    Message(f"Reminder {n}", recipients=["amy@example.com"], body="Hi")
+                )
+            direct = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for n in range(args.messages):
+                mail_queue.enqueue(f"Reminder {n}", ["amy@example.com"], "Hi")
+            db.session.commit()
+            enqueued = time.perf_counter() - start
+            sent = mail_queue.send_due()
+            queued = time.perf_counter() - start - enqueued
+    finally:
+        controller.stop()
+
+    print(f"{args.messages} messages, {handler.count} received")
+    print(f"mail.send per message   {args.messages / direct:8.0f} messages/s")
+    print(
+        f"enqueue (request cost)  {args.messages / enqueued:8.0f} messages/s"
+        f"  ({enqueued / args.messages * 1000:.3f} ms each)"
+    )
+    print(f"queue worker, batched   {sent / queued:8.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
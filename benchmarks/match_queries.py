@@ -0,0 +1,103 @@
+"""Compare the number of SQL queries needed to build the /match/<id> grid.
+
+Run from the project root:
+
+    python -m benchmarks.match_queries --players 20
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+import sqlalchemy as sa
+from app import create_app, db
+from app.models import User, Match, Score
+from app.scoreboard import build_scoreboard
+
+app = create_app()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        sa.event.listen(db.engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        sa.event.remove(db.engine, "before_cursor_execute", self)
+
+
+def legacy_grid(match_id):
+    # the per-player lookups the view used before the scoreboard engine
+    usernames = {
+        username[0]: User.query.filter_by(username=username[0]).first().id
+        for username in db.session.query(User.username)
+        .join(Score, Score.user_id == User.id)
+        .filter(Score.match_id == match_id)
+        .all()
+    }
+    return {
+        username: Score.query.filter_by(match_id=match_id, user_id=user_id)
+        .order_by(Score.turn_number.asc())
+        .all()
+        for username, user_id in usernames.items()
+    }
+
+
+def seed(players):
+    match = Match(opponent="bench", location="bench")
+    db.session.add(match)
+    for n in range(players):
+        user = User(
+            username=f"player{n}",
+            email=f"player{n}@example.com",
+            forename="bench",
+            surname="bench",
+        )
+        db.session.add(user)
+        db.session.flush()
+        for turn in range(1, 11):
+            db.session.add(
+                Score(user_id=user.id, match_id=match.id, turn_number=turn, score=turn)
+            )
+    db.session.commit()
+    return match.id
+
+
+def measure(label, fn, match_id, repeat):
+    with QueryCounter() as counter:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.session.expire_all()
+            fn(match_id)
+        elapsed = time.perf_counter() - start
+    print(
+        f"{label:<12} {counter.count // repeat:>6} queries "
+        f"{elapsed / repeat * 1000:>9.2f} ms/build"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        match_id = seed(args.players)
+        print(f"match with {args.players} players x 10 turns")
+        measure("before", legacy_grid, match_id, args.repeat)
+        measure("scoreboard", build_scoreboard, match_id, args.repeat)
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Time match searches through the FTS5 index against LIKE '%...%' scans.
+
+Run from the project root:
+
+    python -m benchmarks.match_search --matches 100000
+
+Matches against generated opponent and location names are inserted into a
+temporary SQLite file (through the triggers that maintain match_search),
+then each search is run --repeat times as the first page of /matches would
+run it, and again with the same filter written as LIKE '%term%'.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def seed(db, Match, count, rng):
+    # 64 names sharing suffixes, so some terms are common
+    opponents = [
+        f"{prefix}{suffix}"
+        for prefix in ("Ash", "Bram", "Castle", "Den", "Elm", "Farn", "Green", "Har")
+        for suffix in ("ford", "ley", "ton", "holme", "stead", "hill", "wood", "by")
+    ]
+    locations = ["Home", "Away", "Club House", "County Ground", "Indoor Range"]
+    start = datetime(2015, 1, 1)
+    rows = [
+        {
+            "opponent": f"{rng.choice(opponents)} {rng.choice(('Rifles', 'RC', ''))}",
+            "location": rng.choice(locations),
+            "timestamp": start + timedelta(minutes=rng.randrange(10 * 365 * 24 * 60)),
+        }
+        for _ in range(count)
+    ]
+    # and one opponent played only a handful of times
+    for row in rows[:: max(count // 20, 1)]:
+        row["opponent"] = "Zennor Rifles"
+    for offset in range(0, count, 10_000):
+        db.session.execute(sa.insert(Match), rows[offset : offset + 10_000])
+    db.session.commit()
+
+
+def measure(label, fn, repeat):
+    rows = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<44} {len(rows):>4} rows {elapsed * 1000:>9.2f} ms")
+
+
+def main():
+    args = parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    os.environ["DATABASE_URI"] = f"sqlite:///{path}"
+    from app import create_app, db
+    from app.models import Match
+    from app.pagination import matches_page
+    from app.search import search_query
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(db, Match, args.matches, random.Random(args.seed))
+        print(
+            f"{args.matches} matches inserted and indexed in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+        def like_query(text, since=None, until=None):
+            query = sa.select(Match)
+            for term in text.split():
+                pattern = f"%{term}%"
+                query = query.where(
+                    sa.or_(Match.opponent.like(pattern), Match.location.like(pattern))
+                )
+            if since:
+                query = query.where(Match.timestamp >= since)
+            if until:
+                query = query.where(Match.timestamp < until + timedelta(days=1))
+            return query
+
+        cases = [
+            ("rare term", dict(text="zennor")),
+            ("one name of 64", dict(text="Bramholme")),
+            ("common term", dict(text="ley")),
+            ("two terms", dict(text="green rifles")),
+            (
+                "term and one month",
+                dict(
+                    text="ley", since=datetime(2020, 3, 1), until=datetime(2020, 3, 31)
+                ),
+            ),
+            ("no matches", dict(text="zzz")),
+        ]
+        for label, filters in cases:
+            measure(
+                f"fts5  {label}",
+                lambda: matches_page(per_page=25, query=search_query(**filters))[0],
+                args.repeat,
+            )
+            measure(
+                f"like  {label}",
+                lambda: matches_page(per_page=25, query=like_query(**filters))[0],
+                args.repeat,
+            )
+        measure(
+            "dates only, one month",
+            lambda: matches_page(
+                per_page=25,
+                query=search_query(
+                    since=datetime(2020, 3, 1), until=datetime(2020, 3, 31)
+                ),
+            )[0],
+            args.repeat,
+        )
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Load benchmark for the main routes, driven through the Flask test client.
+
+Run from the project root:
+
+    python -m benchmarks.routes --users 200 --matches 5000 --concurrency 4 \\
+        --save benchmarks/baseline.json
+    python -m benchmarks.routes --users 200 --matches 5000 --concurrency 4 \\
+        --compare benchmarks/baseline.json
+
+Each route is reported with p50/p95/p99 latency, SQL queries per request and
+peak Python memory allocated while it ran. Data is generated into a
+temporary SQLite file unless DATABASE_URI is set.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+_db_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URI", "sqlite:///" + os.path.join(_db_dir, "bench.db"))
+
+import sqlalchemy as sa
+from flask_login import FlaskLoginClient
+from app import create_app, db
+from app.models import User, Match
+from app.seed import generate
+
+app = create_app()
+
+
+class QueryCounter:
+    """Counts the statements each thread sends to the database."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, *args):
+        self.local.count = getattr(self.local, "count", 0) + 1
+
+    def take(self):
+        count = getattr(self.local, "count", 0)
+        self.local.count = 0
+        return count
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def route_requests(usernames, match_ids, rng):
+    """Return (name, callable(client)) pairs, one per benchmarked route."""
+
+    def score_post(client):
+        data = {f"turn_{turn}": str(rng.randint(0, 27)) for turn in range(1, 11)}
+        return client.post(f"/match/{rng.choice(match_ids)}", data=data)
+
+    return [
+        ("GET /matches", lambda client: client.get("/matches")),
+        (
+            "GET /match/<id>",
+            lambda client: client.get(f"/match/{rng.choice(match_ids)}"),
+        ),
+        (
+            "GET /user/<username>",
+            lambda client: client.get(f"/user/{rng.choice(usernames)}"),
+        ),
+        ("POST /match/<id>", score_post),
+    ]
+
+
+def run_route(fn, users, requests, concurrency, counter):
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(user):
+        with app.test_client(user=user) as client:
+            counter.take()
+            for _ in range(per_thread):
+                start = time.perf_counter()
+                response = fn(client)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    queries.append(counter.take())
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+
+    tracemalloc.start()
+    threads = [
+        threading.Thread(target=worker, args=(random.choice(users),))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries_per_request": round(statistics.mean(queries), 2),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def print_report(results, baseline=None):
+    columns = ["p50_ms", "p95_ms", "p99_ms", "queries_per_request", "peak_memory_kib"]
+    print(f"{'route':<22}" + "".join(f"{column:>22}" for column in columns))
+    for route, result in results.items():
+        cells = []
+        for column in columns:
+            cell = f"{result[column]:.2f}"
+            if baseline and route in baseline and baseline[route][column]:
+                change = result[column] / baseline[route][column] * 100 - 100
+                cell += f" ({change:+.0f}%)"
+            cells.append(f"{cell:>22}")
+        errors = f"  [{result['errors']} errors]" if result["errors"] else ""
+        print(f"{route:<22}" + "".join(cells) + errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--matches", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to diff against")
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.test_client_class = FlaskLoginClient
+    counter = QueryCounter()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db.create_all()
+        if db.session.scalar(sa.select(sa.func.count(Match.id))) == 0:
+            generate(args.users, args.matches, seed=args.seed)
+        users = db.session.scalars(sa.select(User)).all()
+        usernames = [user.username for user in users]
+        match_ids = db.session.scalars(sa.select(Match.id)).all()
+
+        sa.event.listen(db.engine, "before_cursor_execute", counter)
+        results = {}
+        for name, fn in route_requests(usernames, match_ids, rng):
+            results[name] = run_route(
+                fn, users, args.requests, args.concurrency, counter
+            )
+        sa.event.remove(db.engine, "before_cursor_execute", counter)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+
+    print(
+        f"{args.users} users, {args.matches} matches, "
+        f"{args.requests} requests per route, concurrency {args.concurrency}"
+    )
+    print_report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"arguments": vars(args), "routes": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
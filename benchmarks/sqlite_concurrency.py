@@ -0,0 +1,148 @@
+"""Reader throughput while a writer is saving scorecards, per engine profile.
+
+Run from the project root, once per profile:
+
+    python -m benchmarks.sqlite_concurrency --profile default
+    python -m benchmarks.sqlite_concurrency --profile production
+
+Reader processes request GET /matches and GET /match/<id> for --seconds
+while one writer process keeps posting scorecards. The production profile uses
+WAL, synchronous=NORMAL and a separate read pool (see ProductionConfig).
+Data is generated into a temporary SQLite file unless DATABASE_URI is set.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--profile", choices=["default", "production"], default="production"
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def load_app(profile, database_uri):
+    # the profile and database are read from the environment when the app
+    # package is first imported
+    if profile == "production":
+        os.environ["SKYLOG_ENV"] = "production"
+    os.environ["DATABASE_URI"] = database_uri
+    from flask_login import FlaskLoginClient
+    from app import create_app
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.test_client_class = FlaskLoginClient
+    return app
+
+
+def worker(role, profile, database_uri, user_id, match_ids, seconds, seed, results):
+    """Run in its own process, like one server worker, and report its counts."""
+    app = load_app(profile, database_uri)
+    from app import db
+    from app.models import User
+
+    rng = random.Random(seed)
+    with app.app_context():
+        user = db.session.get(User, user_id)
+    done = errors = 0
+    latencies = []
+    with app.test_client(user=user) as client:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if role == "reader":
+                url = rng.choice(["/matches", f"/match/{rng.choice(match_ids)}"])
+                response = client.get(url)
+            else:
+                data = {
+                    f"turn_{turn}": str(rng.randint(0, 27)) for turn in range(1, 11)
+                }
+                response = client.post(f"/match/{rng.choice(match_ids)}", data=data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code < 400:
+                done += 1
+            else:
+                errors += 1
+    results.put((role, done, errors, latencies))
+
+
+def main():
+    args = parse_args()
+    database_uri = os.environ.get("DATABASE_URI") or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(), "bench.db"
+    )
+    app = load_app(args.profile, database_uri)
+
+    import sqlalchemy as sa
+    from app import db
+    from app.models import User, Match
+    from app.seed import generate
+
+    with app.app_context():
+        db.create_all()
+        if db.session.scalar(sa.select(sa.func.count(Match.id))) == 0:
+            generate(args.users, args.matches, seed=args.seed)
+        user_ids = db.session.scalars(sa.select(User.id)).all()
+        match_ids = db.session.scalars(sa.select(Match.id)).all()
+        db.engine.dispose()
+
+    # separate processes, so the readers are not serialised by the GIL and
+    # only contend with the writer inside SQLite
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    rng = random.Random(args.seed)
+    roles = ["reader"] * args.readers + ["writer"]
+    processes = [
+        context.Process(
+            target=worker,
+            args=(
+                role,
+                args.profile,
+                database_uri,
+                rng.choice(user_ids),
+                match_ids,
+                args.seconds,
+                rng.random(),
+                results,
+            ),
+        )
+        for role in roles
+    ]
+    for process in processes:
+        process.start()
+    totals = {"reader": [0, 0, []], "writer": [0, 0, []]}
+    for _ in processes:
+        role, done, errors, latencies = results.get()
+        totals[role][0] += done
+        totals[role][1] += errors
+        totals[role][2].extend(latencies)
+    for process in processes:
+        process.join()
+
+    print(
+        f"profile {args.profile}: {args.readers} readers, 1 writer, "
+        f"{args.seconds:.0f}s"
+    )
+    for role, (done, errors, latencies) in totals.items():
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        print(
+            f"{role}s {done / args.seconds:8.1f} requests/s  "
+            f"p95 {p95:7.1f} ms  errors {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Time from a cold interpreter to the first response, and for a forked worker.
+
+Run from the project root:
+
+    python -m benchmarks.startup --runs 10
+
+Each run is a fresh Python process that imports the app package, calls
+create_app() and serves GET /login through the test client, timing each
+step. With --fork, the app is also built once here and forked the way a
+preloading server forks its workers; each child reports how long its first
+response took, using the connections it opened after the fork.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get("/login")
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps([imported - start, created - imported, served - created]))
+"""
+
+
+def cold_start(env):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def forked_first_responses(workers):
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        # the parent holds pooled connections, as a preloading master might
+        db.session.execute(db.text("SELECT count(*) FROM user"))
+        db.session.remove()
+
+    timings = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            start = time.perf_counter()
+            with app.test_client() as client:
+                status = client.get("/login").status_code
+                with app.app_context():
+                    db.session.execute(db.text("SELECT 1"))
+            elapsed = time.perf_counter() - start if status == 200 else -1
+            os.write(write_fd, json.dumps(elapsed).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            timings.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    return timings
+
+
+def summary(label, values):
+    values_ms = [value * 1000 for value in values]
+    print(
+        f"{label:<16} median {statistics.median(values_ms):8.1f} ms"
+        f"  max {max(values_ms):8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--fork", type=int, default=0, help="Forked workers to time.")
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("DATABASE_URI", "sqlite:///" + database)
+    env = {**os.environ, "MAIL_QUEUE_POLL_INTERVAL": "0"}
+
+    runs = [cold_start(env) for _ in range(args.runs)]
+    imported, created, served = zip(*runs)
+    print(f"{args.runs} cold starts")
+    summary("import app", imported)
+    summary("create_app()", created)
+    summary("first response", served)
+    summary("total", [sum(run) for run in runs])
+
+    if args.fork:
+        os.environ["MAIL_QUEUE_POLL_INTERVAL"] = "0"
+        timings = forked_first_responses(args.fork)
+        if any(timing < 0 for timing in timings):
+            sys.exit("a forked worker failed to serve /login")
+        print(f"{args.fork} forked workers")
+        summary("first response", timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,101 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@demo.com'
+    # queued mail is sent by a background thread every MAIL_QUEUE_POLL_INTERVAL
+    # seconds (0: only by `flask mail-queue send`), retried after
+    # MAIL_QUEUE_BACKOFF seconds, doubling, up to MAIL_QUEUE_MAX_ATTEMPTS times
+    MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE') or 50)
+    MAIL_QUEUE_POLL_INTERVAL = int(os.environ.get('MAIL_QUEUE_POLL_INTERVAL') or 10)
+    MAIL_QUEUE_BACKOFF = int(os.environ.get('MAIL_QUEUE_BACKOFF') or 30)
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS') or 5)
     ADMINS = ['your-email@example.com']
 
-    SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT') or 'secure-random-salt-value'
\ No newline at end of file
+    # JSON log lines go through a queue of LOG_QUEUE_SIZE records to a
+    # background writer; DEBUG records are kept for a LOG_DEBUG_SAMPLE_RATE
+    # share of requests
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_FILE = os.environ.get('LOG_FILE') or os.path.join(basedir, 'logs', 'skylog.log')
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 10)
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE') or 0.01)
+
+    MATCHES_PER_PAGE = int(os.environ.get('MATCHES_PER_PAGE') or 25)
+    LEADERBOARD_PER_PAGE = int(os.environ.get('LEADERBOARD_PER_PAGE') or 25)
+    # `flask archive run` moves matches older than this out of the match table
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 365)
+
+    # seconds between last_seen writes for one user, and between background
+    # flushes of the buffered values (0 flushes at the end of each request)
+    LAST_SEEN_RESOLUTION = int(os.environ.get('LAST_SEEN_RESOLUTION') or 60)
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL') or 10)
+
+    # password hashes run in a process pool; 0 workers hashes in the request thread
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(
+        os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+    )
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT') or 32)
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+
+    # ETags are always sent; rendered pages are only kept in memory if enabled
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED') is not None
+    RESPONSE_CACHE_MAX_BYTES = int(
+        os.environ.get('RESPONSE_CACHE_MAX_BYTES') or 16 * 1024 * 1024
+    )
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 300)
+
+    # seconds a logged-in user's id, username and is_active are reused
+    # without a query
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 10000)
+
+    # in-memory score grids of recently viewed matches
+    SCOREGRID_CACHE_MAX_BYTES = int(
+        os.environ.get('SCOREGRID_CACHE_MAX_BYTES') or 8 * 1024 * 1024
+    )
+
+    # live scoreboard streams: open streams per process, events buffered for
+    # each, and seconds between keepalives (and version checks)
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAX_SUBSCRIBERS') or 200)
+    LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE') or 64)
+    LIVE_KEEPALIVE = int(os.environ.get('LIVE_KEEPALIVE') or 15)
+
+    # serve Bootstrap from app/static/vendor (see `flask assets build
+    # --vendor-bootstrap`) rather than the jsDelivr CDN
+    BOOTSTRAP_LOCAL = os.environ.get('BOOTSTRAP_LOCAL') is not None
+
+    SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT') or 'secure-random-salt-value'
+
+    # PRAGMA name=value run on every new SQLite connection; foreign_keys
+    # is needed for score and match_total rows to go with their match
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+
+
+class ProductionConfig(Config):
+    """Selected with SKYLOG_ENV=production.
+
+    SQLite runs in WAL mode so readers no longer wait for writers, and the
+    SELECTs of GET requests use their own pool of query_only connections
+    (or READ_DATABASE_URI, if set).
+    """
+
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        # negative sizes are in KiB
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KIB') or 64 * 1024),
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_WRITE_POOL_SIZE') or 4),
+    }
+    SQLALCHEMY_BINDS = {
+        'read': {
+            'url': os.environ.get('READ_DATABASE_URI')
+            or Config.SQLALCHEMY_DATABASE_URI,
+            'pool_size': int(os.environ.get('DATABASE_READ_POOL_SIZE') or 16),
+        },
+    }
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""match search index
+
+Revision ID: 7d18fe7e03e6
+Revises: c91847e1139e
+Create Date: 2026-10-18 20:03:38.929793
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d18fe7e03e6'
+down_revision = 'c91847e1139e'
+branch_labels = None
+depends_on = None
+
+
+# a copy of MATCH_SEARCH_DDL in app/models.py as of this revision
+MATCH_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE match_search USING fts5("
+    "opponent, location, content='match', content_rowid='id', tokenize='trigram')",
+    'CREATE TRIGGER match_search_insert AFTER INSERT ON "match" BEGIN '
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+    'CREATE TRIGGER match_search_delete AFTER DELETE ON "match" BEGIN '
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); END",
+    'CREATE TRIGGER match_search_update AFTER UPDATE OF opponent, location ON "match" '
+    "BEGIN "
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); "
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+)
+
+
+def upgrade():
+    # the search falls back to unindexed ILIKE on other databases
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for statement in MATCH_SEARCH_DDL:
+        op.execute(statement)
+    # index the matches recorded before this revision
+    op.execute("INSERT INTO match_search (match_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER match_search_update")
+    op.execute("DROP TRIGGER match_search_delete")
+    op.execute("DROP TRIGGER match_search_insert")
+    op.execute("DROP TABLE match_search")
@@ -0,0 +1,85 @@
+"""autoincrement match and score ids
+
+Revision ID: f6481400359a
+Revises: 00c38e71bac8
+Create Date: 2026-10-18 20:19:09.918341
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6481400359a'
+down_revision = '00c38e71bac8'
+branch_labels = None
+depends_on = None
+
+# batch mode names the reflected foreign keys by this convention, as in
+# 27fe42c4f6e8, so the recreated tables keep the same constraint names
+naming_convention = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+# the match_search triggers, dropped along with the old match table; a copy
+# of the triggers in MATCH_SEARCH_DDL in app/models.py as of this revision
+MATCH_SEARCH_TRIGGERS = (
+    'CREATE TRIGGER match_search_insert AFTER INSERT ON "match" BEGIN '
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+    'CREATE TRIGGER match_search_delete AFTER DELETE ON "match" BEGIN '
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); END",
+    'CREATE TRIGGER match_search_update AFTER UPDATE OF opponent, location ON "match" '
+    "BEGIN "
+    "INSERT INTO match_search (match_search, rowid, opponent, location) "
+    "VALUES ('delete', old.id, old.opponent, old.location); "
+    "INSERT INTO match_search (rowid, opponent, location) "
+    "VALUES (new.id, new.opponent, new.location); END",
+)
+
+
+def recreate(autoincrement):
+    # Dropping the old match table with foreign keys on would cascade to
+    # every score, so they are switched off for the copy, outside of any
+    # transaction as SQLite requires.
+    context = op.get_context()
+    with context.autocommit_block():
+        foreign_keys = op.get_bind().exec_driver_sql("PRAGMA foreign_keys").scalar()
+        op.execute("PRAGMA foreign_keys=OFF")
+
+    for table in ('match', 'score'):
+        with op.batch_alter_table(
+            table,
+            recreate='always',
+            naming_convention=naming_convention,
+            table_kwargs={'sqlite_autoincrement': autoincrement},
+        ):
+            pass
+    for statement in MATCH_SEARCH_TRIGGERS:
+        op.execute(statement)
+
+    with context.autocommit_block():
+        op.execute(f"PRAGMA foreign_keys={foreign_keys}")
+
+
+def upgrade():
+    # other databases never reuse sequence values
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    recreate(True)
+    # start the counters after the archived ids as well as the live ones
+    for table in ('match', 'score'):
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+        op.execute(
+            "INSERT INTO sqlite_sequence (name, seq) "
+            f"SELECT '{table}', MAX("
+            f'(SELECT COALESCE(MAX(id), 0) FROM "{table}"), '
+            f"(SELECT COALESCE(MAX(id), 0) FROM archived_{table}))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    recreate(False)
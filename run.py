@@ -1,9 +1,11 @@
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from app import app, db
+from app import create_app, db
 from app.models import User, Match
 
+app = create_app()
+
 
 @app.shell_context_processor
 def make_shell_context():
-    return {'sa': sa, 'so': so, 'db': db, 'User': User, 'Match': Match}
\ No newline at end of file
+    return {'sa': sa, 'so': so, 'db': db, 'User': User, 'Match': Match}
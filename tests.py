@@ -1,24 +1,135 @@
 import os
+import io
+import logging
+import queue
+import threading
+import subprocess
+import sys
+import gzip
+import socket
+import time
+import smtplib
+import tempfile
+import json
+import re
 
-os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["DATABASE_URI"] = "sqlite://"
+os.environ["LAST_SEEN_FLUSH_INTERVAL"] = "0"
+os.environ["MAIL_QUEUE_POLL_INTERVAL"] = "0"
+os.environ["LOG_FILE"] = os.path.join(tempfile.mkdtemp(), "skylog.log")
 
 from datetime import datetime, timezone, timedelta
 import unittest
-from app import app, db
-from app.models import User, Match, Score
+from unittest.mock import patch
+import numpy as np
+from werkzeug.security import generate_password_hash
+from app import (
+    create_app,
+    assets,
+    db,
+    last_seen,
+    hasher,
+    page_cache,
+    scoregrid,
+    user_cache,
+    mail,
+    mail_queue,
+    log_pipeline,
+    live_scores,
+)
+import flask_mail
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+from flask import request, request_finished
+from flask_login import FlaskLoginClient
+from app.models import (
+    ArchivedMatch,
+    ArchivedScore,
+    User,
+    Match,
+    Score,
+    MatchTotal,
+    UserTotal,
+    DataVersion,
+    LeaderboardEntry,
+    OutboundMail,
+    leaderboard_version_key,
+    load_user,
+)
+from app.page_cache import ResponseCache
+from app import rollups
+from app.last_seen import LastSeenBuffer
+from app.scorecard import delete_matches, save_scorecard, remove_turn
+import sqlalchemy as sa
+from app.archive import (
+    MatchIdTaken,
+    archive_matches,
+    archived_scoreboard,
+    cutoff,
+    restore_match,
+)
+from app.assets import FAR_FUTURE, build as build_assets
+from app.logs import DebugSampler, NonBlockingQueueHandler
+from app.database import READ_BIND, set_sqlite_pragmas
+from app.export import export
+from app.leaderboard import (
+    RankIndex,
+    board_count,
+    head_to_head,
+    rank_cache,
+    standing,
+    top,
+)
+from app.hashing import HashingPoolBusy
+from app.importer import InvalidRow, import_scores, read_records
+from app.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_entry_cursor,
+    matches_page,
+)
+from app.scoreboard import build_scoreboard, pivot, scoreboard_query
+from app.scoregrid import ScoreGrid, ScoreGridCache
+from app.search import search_query
+from app.user_cache import LazyUser
+from app.stats import FORM_MATCHES, compute, score_history, stats_cache
 
+app = create_app()
 
-class UserModelCase(unittest.TestCase):
+
+class DatabaseTestCase(unittest.TestCase):
     def setUp(self):
         self.app_context = app.app_context()
         self.app_context.push()
         db.create_all()
+        # process-local caches would outlive the per-test database
+        stats_cache.clear()
+        rank_cache.clear()
+        scoregrid.clear()
+        user_cache.clear()
 
     def tearDown(self):
         db.session.remove()
         db.drop_all()
         self.app_context.pop()
 
+    def add_user(self, username):
+        u = User(
+            username=username,
+            email=f"{username}@example.com",
+            forename=username,
+            surname="test",
+        )
+        db.session.add(u)
+        return u
+
+    def client_for(self, user):
+        app.test_client_class = FlaskLoginClient
+        return app.test_client(user=user)
+
+
+class UserModelCase(DatabaseTestCase):
+
     def test_password_hashing(self):
         u = User(username="susan", email="susan@example.com")
         u.set_password("cat")
@@ -35,7 +146,7 @@ class UserModelCase(unittest.TestCase):
                 "https://www.gravatar.com/avatar/d4c74594d841139328695756648b6bd6?d=identicon&s=128"
             ),
         )
-    
+
     def test_score(self):
         u = User(
             username="john", email="john@example.com", forename="john", surname="wick"
@@ -44,7 +155,7 @@ class UserModelCase(unittest.TestCase):
         db.session.add(u)
         db.session.add(m)
         db.session.commit()
-        
+
         user_scores = db.session.query(Score).filter(Score.user_id == u.id).all()
         match_scores = db.session.query(Score).filter(Score.match_id == m.id).all()
         self.assertEqual(user_scores, [])
@@ -54,7 +165,7 @@ class UserModelCase(unittest.TestCase):
         s = Score(score=5, turn_number=1, user_id=u.id, match_id=m.id)
         db.session.add(s)
         db.session.commit()
-        
+
         user_scores = db.session.query(Score).filter(Score.user_id == u.id).all()
         match_scores = db.session.query(Score).filter(Score.match_id == m.id).all()
         self.assertEqual(user_scores[0].score, 5)
@@ -71,5 +182,2135 @@ class UserModelCase(unittest.TestCase):
         self.assertEqual(match_scores, [])
 
 
+class ScoreboardCase(DatabaseTestCase):
+    def test_pivot_sparse_and_out_of_order(self):
+        rows = [
+            (2, "bob", 10, 3),
+            (1, "amy", 3, 9),
+            (2, "bob", 1, 7),
+            (1, "amy", 1, 5),
+        ]
+        board = pivot(1, rows)
+        self.assertEqual([row.username for row in board.players], ["amy", "bob"])
+        amy, bob = board.players
+        self.assertEqual(
+            amy.turns, [5, None, 9, None, None, None, None, None, None, None]
+        )
+        self.assertEqual(
+            bob.turns, [7, None, None, None, None, None, None, None, None, 3]
+        )
+        self.assertEqual(amy.total, 14)
+        self.assertEqual(bob.turns_played, 2)
+        self.assertIsNone(board.row_for(3))
+
+    def test_pivot_ignores_out_of_range_turns(self):
+        board = pivot(1, [(1, "amy", 11, 4), (1, "amy", 0, 4), (1, "amy", 10, 2)])
+        self.assertEqual(board.players[0].turns[-1], 2)
+        self.assertEqual(board.players[0].total, 2)
+
+    def test_build_scoreboard(self):
+        amy = self.add_user("amy")
+        bob = self.add_user("bob")
+        m = Match(opponent="opponent", location="location")
+        db.session.add(m)
+        db.session.commit()
+        # bob skipped turn 2, amy's turns are saved out of order
+        for user, turn, score in [
+            (bob, 1, 4),
+            (bob, 3, 6),
+            (amy, 10, 27),
+            (amy, 2, 1),
+            (amy, 1, 0),
+        ]:
+            db.session.add(
+                Score(user_id=user.id, match_id=m.id, turn_number=turn, score=score)
+            )
+        db.session.commit()
+
+        board = build_scoreboard(m.id)
+        self.assertEqual(len(board.players), 2)
+        self.assertEqual(board.row_for(amy.id).turns[:2], [0, 1])
+        self.assertEqual(board.row_for(amy.id).total, 28)
+        self.assertEqual(board.row_for(bob.id).turns[:3], [4, None, 6])
+
+    def test_match_view_with_skipped_turn(self):
+        amy = self.add_user("amy")
+        m = Match(opponent="opponent", location="location")
+        db.session.add(m)
+        db.session.commit()
+        db.session.add(Score(user_id=amy.id, match_id=m.id, turn_number=5, score=8))
+        db.session.commit()
+
+        with self.client_for(amy) as client:
+            response = client.get(f"/match/{m.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Turn 5 (Score: 8)", response.data)
+
+
+class PaginationCase(DatabaseTestCase):
+    def add_matches(self):
+        base = datetime(2025, 1, 1, 12, 0)
+        # two pairs of matches share a timestamp to exercise the id tie-breaker
+        offsets = [0, 1, 1, 2, 3, 3, 4]
+        for n, offset in enumerate(offsets):
+            db.session.add(
+                Match(
+                    opponent=f"opponent{n}",
+                    location="location",
+                    timestamp=base + timedelta(days=offset),
+                )
+            )
+        db.session.commit()
+
+    def test_pages_cover_every_match_once(self):
+        self.add_matches()
+        expected = [
+            m.id for m in Match.query.order_by(Match.timestamp.desc(), Match.id.desc())
+        ]
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = matches_page(cursor=cursor, per_page=3)
+            self.assertLessEqual(len(page), 3)
+            seen.extend(m.id for m in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_last_full_page_has_no_cursor(self):
+        self.add_matches()
+        page, cursor = matches_page(per_page=7)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not a cursor")
+
+    def test_load_more_endpoint(self):
+        u = self.add_user("amy")
+        self.add_matches()
+        app.config["MATCHES_PER_PAGE"] = 4
+        try:
+            with self.client_for(u) as client:
+                first = client.get("/matches")
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(first.data.count(b"btn-outline-info"), 4)
+
+                _, cursor = matches_page(per_page=4)
+                more = client.get(f"/matches/more?cursor={cursor}")
+                self.assertEqual(more.status_code, 200)
+                self.assertEqual(more.data.count(b"btn-outline-info"), 3)
+                self.assertEqual(more.headers["X-Next-Cursor"], "")
+
+                self.assertEqual(
+                    client.get("/matches/more?cursor=%%%").status_code, 400
+                )
+        finally:
+            app.config["MATCHES_PER_PAGE"] = 25
+
+
+class SearchCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        base = datetime(2025, 3, 1, 19, 0)
+        for n, (opponent, location) in enumerate(
+            [
+                ("Bramley Rifles", "Home"),
+                ("Farnley", "County Ground"),
+                ("Greenhill", "Away"),
+                ('O\'Brien "RC"', "Home"),
+            ]
+        ):
+            db.session.add(
+                Match(
+                    opponent=opponent,
+                    location=location,
+                    timestamp=base + timedelta(days=n),
+                )
+            )
+        db.session.commit()
+
+    def opponents(self, **filters):
+        page, _ = matches_page(query=search_query(**filters))
+        return [match.opponent for match in page]
+
+    def test_terms_match_inside_words(self):
+        self.assertEqual(self.opponents(text="LEY"), ["Farnley", "Bramley Rifles"])
+        self.assertEqual(self.opponents(text="ley rifles"), ["Bramley Rifles"])
+        self.assertEqual(self.opponents(text="county"), ["Farnley"])
+        self.assertEqual(self.opponents(text='"rc"'), ['O\'Brien "RC"'])
+        self.assertEqual(self.opponents(text="zzz"), [])
+        # too short for the trigram index, so not a filter
+        self.assertEqual(len(self.opponents(text="ho")), 4)
+
+    def test_date_range(self):
+        self.assertEqual(
+            self.opponents(since=datetime(2025, 3, 2), until=datetime(2025, 3, 3)),
+            ["Greenhill", "Farnley"],
+        )
+        self.assertEqual(
+            self.opponents(text="ley", since=datetime(2025, 3, 2)), ["Farnley"]
+        )
+
+    def test_index_follows_writes(self):
+        farnley = db.session.scalar(sa.select(Match).where(Match.opponent == "Farnley"))
+        farnley.opponent = "Ashford"
+        db.session.commit()
+        self.assertEqual(self.opponents(text="farn"), [])
+        self.assertEqual(self.opponents(text="ashf"), ["Ashford"])
+
+        delete_matches([farnley.id])
+        db.session.commit()
+        self.assertEqual(self.opponents(text="ashf"), [])
+
+        # archiving moves rows with INSERT ... SELECT and DELETE
+        archive_matches(datetime(2025, 3, 2))
+        self.assertEqual(self.opponents(text="bram"), [])
+        bramley = db.session.scalar(sa.select(sa.func.min(ArchivedMatch.id)))
+        restore_match(bramley)
+        db.session.commit()
+        self.assertEqual(self.opponents(text="bram"), ["Bramley Rifles"])
+
+    def test_search_pages(self):
+        amy = self.add_user("amy")
+        db.session.commit()
+        client = self.client_for(amy)
+        app.config["MATCHES_PER_PAGE"] = 1
+        try:
+            body = client.get("/matches?q=ley&since=2025-03-01").get_data(as_text=True)
+            self.assertIn("Farnley", body)
+            self.assertNotIn("Bramley", body)
+            self.assertIn("/matches/more?q=ley&amp;since=2025-03-01", body)
+            _, cursor = matches_page(per_page=1, query=search_query(text="ley"))
+            more = client.get(f"/matches/more?q=ley&since=2025-03-01&cursor={cursor}")
+            self.assertIn("Bramley", more.get_data(as_text=True))
+            self.assertEqual(more.headers["X-Next-Cursor"], "")
+        finally:
+            app.config["MATCHES_PER_PAGE"] = 25
+        body = client.get("/matches?q=ho").get_data(as_text=True)
+        self.assertIn("at least 3 characters", body)
+        self.assertEqual(client.get("/matches?since=March").status_code, 400)
+
+
+class RollupCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.user = self.add_user("amy")
+        self.match = Match(opponent="opponent", location="location")
+        db.session.add(self.match)
+        db.session.commit()
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        super().tearDown()
+
+    def save(self, client, **turns):
+        data = {f"turn_{turn}": "" for turn in range(1, 11)}
+        data.update({key: str(value) for key, value in turns.items()})
+        return client.post(f"/match/{self.match.id}", data=data)
+
+    def test_totals_follow_saves_and_removals(self):
+        with self.client_for(self.user) as client:
+            self.save(client, turn_1=5, turn_2=9)
+            row = db.session.get(MatchTotal, (self.match.id, self.user.id))
+            self.assertEqual((row.total, row.turns_played, row.best_turn), (14, 2, 9))
+
+            # editing a turn replaces its old value in the totals
+            self.save(client, turn_2=3, turn_10=4)
+            db.session.expire_all()
+            row = db.session.get(MatchTotal, (self.match.id, self.user.id))
+            self.assertEqual((row.total, row.turns_played, row.best_turn), (12, 3, 5))
+
+            client.post(f"/remove_score/{self.match.id}", data={"turn_to_remove": "1"})
+            db.session.expire_all()
+            row = db.session.get(MatchTotal, (self.match.id, self.user.id))
+            self.assertEqual((row.total, row.turns_played, row.best_turn), (7, 2, 4))
+
+            totals = db.session.get(UserTotal, self.user.id)
+            self.assertEqual(
+                (totals.total, totals.turns_played, totals.matches_played), (7, 2, 1)
+            )
+        self.assertEqual(rollups.verify(), [])
+
+    def test_delete_match_removes_totals(self):
+        match_id, user_id = self.match.id, self.user.id
+        with self.client_for(self.user) as client:
+            self.save(client, turn_1=5)
+            client.post(f"/matches/delete/{match_id}")
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(MatchTotal, (match_id, user_id)))
+        totals = db.session.get(UserTotal, user_id)
+        self.assertEqual((totals.total, totals.matches_played), (0, 0))
+        self.assertEqual(rollups.verify(), [])
+
+    def test_rebuild_and_verify_commands(self):
+        db.session.add(
+            Score(user_id=self.user.id, match_id=self.match.id, turn_number=1, score=6)
+        )
+        db.session.commit()
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=["rollups", "verify"])
+        self.assertNotEqual(result.exit_code, 0)
+
+        result = runner.invoke(args=["rollups", "rebuild"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(db.session.get(UserTotal, self.user.id).total, 6)
+
+        result = runner.invoke(args=["rollups", "verify"])
+        self.assertEqual(result.exit_code, 0)
+
+
+class LastSeenCase(DatabaseTestCase):
+    def test_touches_within_resolution_are_coalesced(self):
+        buffer = LastSeenBuffer()
+        amy = self.add_user("amy")
+        bob = self.add_user("bob")
+        db.session.commit()
+
+        now = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        self.assertTrue(buffer.touch(amy.id, now))
+        self.assertFalse(buffer.touch(amy.id, now + timedelta(seconds=30)))
+        self.assertTrue(buffer.touch(bob.id, now + timedelta(seconds=30)))
+        self.assertTrue(buffer.touch(amy.id, now + timedelta(seconds=61)))
+
+        # both users are written in one batch
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.flush(), 0)
+        db.session.expire_all()
+        self.assertEqual(
+            db.session.get(User, amy.id).last_seen, datetime(2025, 1, 1, 12, 1, 1)
+        )
+        self.assertEqual(
+            buffer.stats(),
+            {"touches": 4, "writes": 2, "flushes": 1, "pending": 0, "saved": 2},
+        )
+
+    def test_requests_write_last_seen_once_per_resolution(self):
+        amy = self.add_user("amy")
+        db.session.commit()
+        # user ids are reused between tests, forget what earlier ones recorded
+        last_seen._recorded.clear()
+        before = last_seen.stats()
+        with self.client_for(amy) as client:
+            for _ in range(3):
+                client.get("/matches")
+        after = last_seen.stats()
+
+        self.assertEqual(after["touches"] - before["touches"], 3)
+        self.assertEqual(after["writes"] - before["writes"], 1)
+        db.session.expire_all()
+        self.assertIsNotNone(db.session.get(User, amy.id).last_seen)
+
+
+class PasswordHashingCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.user = self.add_user("amy")
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        super().tearDown()
+
+    def login(self):
+        with app.test_client() as client:
+            return client.post("/login", data={"username": "amy", "password": "secret"})
+
+    def test_rehash_on_login_when_cost_changes(self):
+        self.user.password_hash = generate_password_hash("secret", "pbkdf2:sha256:1000")
+        db.session.commit()
+        self.assertTrue(hasher.needs_rehash(self.user.password_hash))
+
+        response = self.login()
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        stored = db.session.get(User, self.user.id).password_hash
+        self.assertFalse(hasher.needs_rehash(stored))
+        self.assertTrue(db.session.get(User, self.user.id).check_password("secret"))
+
+    def test_full_queue_fails_fast_with_503(self):
+        self.user.set_password("secret")
+        db.session.commit()
+        if hasher.workers <= 0:
+            self.skipTest("password hashing runs inline")
+
+        taken = 0
+        while hasher._slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.login()
+        finally:
+            for _ in range(taken):
+                hasher._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def test_slow_hash_fails_with_503(self):
+        if hasher.workers <= 0:
+            self.skipTest("password hashing runs inline")
+        self.user.set_password("secret")
+        db.session.commit()
+        timed_out = hasher.timed_out
+        hasher.timeout = 0.01
+        try:
+            # a stalled worker
+            with self.assertRaises(HashingPoolBusy):
+                hasher._run(time.sleep, 1)
+            response = self.login()
+        finally:
+            hasher.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+            # the stalled hash keeps its slot until it finishes
+            deadline = time.monotonic() + 5
+            while hasher.in_flight and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(hasher.timed_out, timed_out + 2)
+
+    def test_workers_are_not_forked(self):
+        if hasher.workers <= 0:
+            self.skipTest("password hashing runs inline")
+        stored = generate_password_hash("secret", "pbkdf2:sha256:1000")
+        threads = [
+            threading.Thread(target=hasher.verify, args=(stored, "secret"))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertNotEqual(
+            hasher._get_executor()._mp_context.get_start_method(), "fork"
+        )
+        self.assertEqual(hasher.in_flight, 0)
+
+
+class ScorecardCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.add_user("amy")
+        self.match = Match(opponent="opponent", location="location")
+        db.session.add(self.match)
+        db.session.commit()
+
+    def turns(self):
+        return {
+            s.turn_number: s.score
+            for s in Score.query.filter_by(match_id=self.match.id, user_id=self.user.id)
+        }
+
+    def test_full_card_is_one_insert(self):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            save_scorecard(self.match.id, self.user.id, {t: t for t in range(1, 11)})
+            db.session.commit()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", record)
+
+        score_inserts = [s for s in statements if s.startswith("INSERT INTO score")]
+        self.assertEqual(len(score_inserts), 1)
+        self.assertIn("ON CONFLICT", score_inserts[0])
+        self.assertEqual(self.turns(), {t: t for t in range(1, 11)})
+
+    def test_double_submit_updates_in_place(self):
+        save_scorecard(self.match.id, self.user.id, {1: 5, 2: 6, 3: None})
+        db.session.commit()
+        save_scorecard(self.match.id, self.user.id, {1: 7, 3: 1})
+        db.session.commit()
+        self.assertEqual(self.turns(), {1: 7, 2: 6, 3: 1})
+        self.assertEqual(Score.query.filter_by(match_id=self.match.id).count(), 3)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_duplicate_turn_rejected(self):
+        for _ in range(2):
+            db.session.add(
+                Score(
+                    user_id=self.user.id,
+                    match_id=self.match.id,
+                    turn_number=1,
+                    score=1,
+                )
+            )
+        with self.assertRaises(sa.exc.IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_remove_turn(self):
+        save_scorecard(self.match.id, self.user.id, {1: 5, 2: 6})
+        self.assertTrue(remove_turn(self.match.id, self.user.id, 1))
+        self.assertFalse(remove_turn(self.match.id, self.user.id, 1))
+        db.session.commit()
+        self.assertEqual(self.turns(), {2: 6})
+        self.assertEqual(rollups.verify(), [])
+
+
+class SeedCase(DatabaseTestCase):
+    def test_seed_command(self):
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            args=["seed", "--users", "5", "--matches", "10", "--seed", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(User.id))), 5)
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Match.id))), 10)
+
+        scores = db.session.execute(sa.select(Score)).scalars().all()
+        self.assertTrue(all(0 <= s.score <= 27 for s in scores))
+        # scorecards are sparse, not every player fills every turn
+        self.assertLess(len(scores), 10 * 8 * 10)
+        self.assertEqual(rollups.verify(), [])
+
+        user = db.session.scalar(sa.select(User).where(User.username == "player1"))
+        self.assertTrue(user.check_password("password"))
+
+    def test_seed_after_archive(self):
+        old = Match(
+            opponent="o",
+            location="l",
+            timestamp=datetime.now(timezone.utc) - timedelta(days=400),
+        )
+        db.session.add(old)
+        db.session.commit()
+        archived = old.id
+        archive_matches(cutoff(365))
+        versions = DataVersion.current(["matches", "users"])
+
+        result = app.test_cli_runner().invoke(
+            args=["seed", "--users", "3", "--matches", "5", "--seed", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        ids = db.session.scalars(sa.select(Match.id)).all()
+        self.assertEqual(len(ids), 5)
+        self.assertNotIn(archived, ids)
+        # cached pages and ETags notice the new rows
+        self.assertEqual(
+            DataVersion.current(["matches", "users"]),
+            tuple(version + 1 for version in versions),
+        )
+        # and the archived match can still be restored under its own id
+        restore_match(archived)
+        db.session.commit()
+
+
+class AppFactoryCase(unittest.TestCase):
+    def run_python(self, code, **env):
+        tmp = tempfile.mkdtemp()
+        env = {
+            **os.environ,
+            "DATABASE_URI": "sqlite:///" + os.path.join(tmp, "app.db"),
+            **env,
+        }
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_import_builds_nothing(self):
+        loaded = self.run_python(
+            "import json, sys\n"
+            "import app\n"
+            "before = 'app.auth' in sys.modules\n"
+            "flask_app = app.create_app()\n"
+            "print(json.dumps([before, 'app.auth' in sys.modules,"
+            " 'flask_migrate' in sys.modules, sorted(flask_app.blueprints)]))"
+        )
+        self.assertEqual(
+            loaded, [False, True, False, ["auth", "cli", "errors", "matches", "scores"]]
+        )
+
+    def test_second_app_shares_hooks(self):
+        counts = self.run_python(
+            "import json\n"
+            "from app import create_app, db\n"
+            "def hooks(flask_app):\n"
+            "    with flask_app.app_context():\n"
+            "        return len(db.session().dispatch.after_commit)\n"
+            "def series(flask_app):\n"
+            "    body = flask_app.test_client().get('/metrics').get_data(as_text=True)\n"
+            "    return [line.split()[2] for line in body.splitlines()\n"
+            "            if line.startswith('# TYPE ')]\n"
+            "first = create_app()\n"
+            "before = hooks(first)\n"
+            "second = create_app()\n"
+            "names = series(second)\n"
+            "print(json.dumps([before, hooks(second), len(names), len(set(names))]))"
+        )
+        before, after, names, unique = counts
+        self.assertEqual(after, before)
+        self.assertEqual(names, unique)
+
+    def test_forked_child_opens_own_connections(self):
+        checked_in = self.run_python(
+            "import json, os\n"
+            "from app import create_app, db\n"
+            "flask_app = create_app()\n"
+            "with flask_app.app_context():\n"
+            "    db.session.execute(db.text('SELECT 1'))\n"
+            "    db.session.remove()\n"
+            "    parent = db.engine.pool.checkedin()\n"
+            "    read_fd, write_fd = os.pipe()\n"
+            "    if os.fork() == 0:\n"
+            "        os.write(write_fd, str(db.engine.pool.checkedin()).encode())\n"
+            "        os._exit(0)\n"
+            "    os.close(write_fd)\n"
+            "    child = int(os.read(read_fd, 16))\n"
+            "    print(json.dumps([parent, child, db.engine.pool.checkedin()]))"
+        )
+        self.assertEqual(checked_in, [1, 0, 1])
+
+
+class LoggingCase(DatabaseTestCase):
+    def log_entries(self):
+        log_pipeline.flush()
+        with open(app.config["LOG_FILE"]) as f:
+            return [json.loads(line) for line in f]
+
+    def test_request_logged_as_json(self):
+        amy = self.add_user("amy")
+        db.session.commit()
+        response = self.client_for(amy).get("/matches")
+        request_id = response.headers["X-Request-ID"]
+
+        entries = [e for e in self.log_entries() if e.get("request_id") == request_id]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["logger"], "app.requests")
+        self.assertEqual(entries[0]["route"], "matches.matches")
+        self.assertEqual(entries[0]["status"], 200)
+        self.assertGreater(entries[0]["duration_ms"], 0)
+
+    def test_request_id_taken_from_header(self):
+        client = app.test_client()
+        response = client.get("/login", headers={"X-Request-ID": "edge-42"})
+        self.assertEqual(response.headers["X-Request-ID"], "edge-42")
+        response = client.get("/login", headers={"X-Request-ID": "not an id!"})
+        self.assertRegex(response.headers["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_exception_kept_apart_from_message(self):
+        with app.test_request_context("/matches"):
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                app.logger.exception("Failed to delete match %s", 7)
+        entry = self.log_entries()[-1]
+        self.assertEqual(entry["message"], "Failed to delete match 7")
+        self.assertIn("ValueError: boom", entry["exception"])
+        self.assertEqual(entry["path"], "/matches")
+
+    def test_debug_sampled_per_request(self):
+        sampler = DebugSampler(0.5)
+        records = {
+            request_id: logging.makeLogRecord(
+                {"levelno": logging.DEBUG, "request_id": request_id}
+            )
+            for request_id in (f"request-{n}" for n in range(200))
+        }
+        kept = {request_id for request_id, r in records.items() if sampler.filter(r)}
+        self.assertTrue(50 < len(kept) < 150)
+        # the same request is always sampled the same way
+        for request_id, record in records.items():
+            self.assertEqual(sampler.filter(record), request_id in kept)
+        self.assertTrue(
+            DebugSampler(0).filter(logging.makeLogRecord({"levelno": logging.INFO}))
+        )
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(1))
+        logger = logging.getLogger("tests.full_queue")
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for n in range(3):
+                logger.warning("record %s", n)
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "record 0")
+
+
+class MetricsCase(DatabaseTestCase):
+    def test_server_timing_and_metrics(self):
+        amy = self.add_user("amy")
+        db.session.add(Match(opponent="opponent", location="location"))
+        db.session.commit()
+
+        with self.client_for(amy) as client:
+            response = client.get("/match/1")
+            timing = response.headers["Server-Timing"]
+            self.assertRegex(timing, r'^db;dur=[0-9.]+;desc="\d+ queries", app;dur=')
+
+            body = client.get("/metrics").get_data(as_text=True)
+        self.assertIn(
+            'skylog_request_duration_seconds_bucket{endpoint="scores.match",le="+Inf"}',
+            body,
+        )
+        self.assertIn('skylog_request_sql_queries_count{endpoint="scores.match"}', body)
+        self.assertIn('skylog_request_db_seconds_total{endpoint="scores.match"}', body)
+        self.assertIn("skylog_last_seen_writes_saved_total", body)
+
+
+class PageCacheCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.add_user("amy")
+        self.match = Match(opponent="opponent", location="location")
+        db.session.add(self.match)
+        db.session.commit()
+
+    def test_not_modified_until_data_changes(self):
+        with self.client_for(self.user) as client:
+            url = f"/match/{self.match.id}"
+            first = client.get(url)
+            etag = first.headers["ETag"]
+            self.assertEqual(first.status_code, 200)
+
+            again = client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again.data, b"")
+
+            save_scorecard(self.match.id, self.user.id, {1: 9})
+            db.session.commit()
+            changed = client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(changed.status_code, 200)
+            self.assertNotEqual(changed.headers["ETag"], etag)
+
+    def test_etag_depends_on_viewer(self):
+        bob = self.add_user("bob")
+        db.session.commit()
+        with self.client_for(self.user) as client:
+            etag = client.get("/matches").headers["ETag"]
+        with self.client_for(bob) as client:
+            response = client.get("/matches", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_match_write_bumps_list_version(self):
+        app.config["WTF_CSRF_ENABLED"] = False
+        try:
+            with self.client_for(self.user) as client:
+                before = DataVersion.current(["matches"])
+                client.post(
+                    "/match",
+                    data={"opponent": "o", "location": "l", "date": "2025-01-01 12:00"},
+                )
+                self.assertEqual(DataVersion.current(["matches"])[0], before[0] + 1)
+        finally:
+            app.config["WTF_CSRF_ENABLED"] = True
+
+    def test_rendered_responses_are_reused(self):
+        page_cache.enabled = True
+        page_cache.cache.clear()
+        try:
+            with self.client_for(self.user) as client:
+                first = client.get("/matches")
+                hits = page_cache.cache.hits
+                second = client.get("/matches")
+            self.assertEqual(page_cache.cache.hits, hits + 1)
+            self.assertEqual(first.data, second.data)
+        finally:
+            page_cache.enabled = False
+            page_cache.cache.clear()
+
+    def test_response_cache_evicts_least_recently_used(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.set("a", b"xxxx", [])
+        cache.set("b", b"xxxx", [])
+        cache.get("a")
+        cache.set("c", b"xxxx", [])
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual((cache.size, cache.evictions), (8, 1))
+        cache.set("huge", b"x" * 11, [])
+        self.assertIsNone(cache.get("huge"))
+
+
+class ExportCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        self.matches = [
+            Match(opponent="rovers", location="home", timestamp=datetime(2025, 1, 1)),
+            Match(opponent="united", location="away", timestamp=datetime(2025, 2, 1)),
+            Match(opponent="rovers", location="away", timestamp=datetime(2025, 3, 1)),
+        ]
+        db.session.add_all(self.matches)
+        db.session.commit()
+        for match in self.matches:
+            save_scorecard(match.id, self.amy.id, {1: 5, 2: 7})
+        save_scorecard(self.matches[1].id, self.bob.id, {1: 9})
+        db.session.commit()
+
+    def lines(self, kind, fmt, **filters):
+        return "".join(export(kind, fmt, **filters)).splitlines()
+
+    def test_csv_matches(self):
+        lines = self.lines("matches", "csv")
+        self.assertEqual(lines[0], "id,timestamp,opponent,location")
+        self.assertEqual(
+            lines[1], f"{self.matches[0].id},2025-01-01T00:00:00,rovers,home"
+        )
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson_scores(self):
+        rows = [json.loads(line) for line in self.lines("scores", "ndjson")]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]["username"], "amy")
+        self.assertEqual(rows[0]["timestamp"], "2025-01-01T00:00:00")
+        self.assertEqual([row["id"] for row in rows], sorted(row["id"] for row in rows))
+
+    def test_filters(self):
+        self.assertEqual(len(self.lines("matches", "csv", username="bob")), 2)
+        self.assertEqual(len(self.lines("matches", "csv", opponent="rovers")), 3)
+        since, until = datetime(2025, 2, 1), datetime(2025, 3, 1)
+        rows = self.lines("scores", "ndjson", since=since, until=until)
+        self.assertEqual(len(rows), 5)
+
+    def test_resume_after(self):
+        rows = [json.loads(line) for line in self.lines("scores", "ndjson")]
+        rest = [
+            json.loads(line)
+            for line in self.lines("scores", "ndjson", after=rows[2]["id"])
+        ]
+        self.assertEqual(rest, rows[3:])
+
+    def test_endpoint(self):
+        with self.client_for(self.amy) as client:
+            response = client.get("/export/matches.csv?opponent=united")
+            self.assertEqual(response.mimetype, "text/csv")
+            self.assertIn("attachment", response.headers["Content-Disposition"])
+            self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+            self.assertEqual(
+                client.get("/export/matches.csv?since=soon").status_code, 400
+            )
+            self.assertEqual(client.get("/export/users.csv").status_code, 404)
+
+
+class ImportCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        self.match = Match(opponent="rovers", location="home")
+        db.session.add(self.match)
+        db.session.commit()
+
+    def records(self, text, fmt="csv"):
+        return read_records(io.StringIO(text), fmt)
+
+    def test_csv_creates_matches_and_totals(self):
+        stats = import_scores(
+            self.records(
+                "username,turn_number,score,match_id,timestamp,opponent,location\n"
+                f"amy,1,5,{self.match.id},,,\n"
+                "amy,1,7,,2020-05-01T14:00:00,united,away\n"
+                "bob,2,9,,2020-05-01T14:00:00,united,away\n"
+                "bob,1,3,,2020-06-01T14:00:00,united,away\n"
+            ),
+            batch_size=2,
+        )
+        self.assertEqual((stats.rows, stats.matches_created), (4, 2))
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Match.id))), 3)
+        self.assertEqual(db.session.get(UserTotal, self.amy.id).total, 12)
+        self.assertEqual(db.session.get(UserTotal, self.bob.id).matches_played, 2)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_reimport_replaces_scores(self):
+        line = f'{{"match_id": {self.match.id}, "username": "amy", "turn_number": 1, '
+        import_scores(self.records(line + '"score": 4}\n', "ndjson"))
+        import_scores(self.records(line + '"score": 6}\n', "ndjson"))
+        self.assertEqual(
+            db.session.get(MatchTotal, (self.match.id, self.amy.id)).total, 6
+        )
+
+    def test_export_round_trip(self):
+        save_scorecard(self.match.id, self.amy.id, {1: 5, 2: 8})
+        db.session.commit()
+        exported = "".join(export("scores", "ndjson"))
+        db.session.execute(sa.delete(Score))
+        db.session.commit()
+        import_scores(self.records(exported, "ndjson"))
+        self.assertEqual(build_scoreboard(self.match.id).row_for(self.amy.id).total, 13)
+
+    def test_dry_run_reports_errors_without_writing(self):
+        stats = import_scores(
+            self.records(
+                "username,turn_number,score,match_id\n"
+                f"amy,1,28,{self.match.id}\n"
+                f"zed,1,5,{self.match.id}\n"
+                f"bob,11,5,{self.match.id}\n"
+                f"bob,1,5,{self.match.id}\n"
+            ),
+            dry_run=True,
+        )
+        self.assertEqual(stats.rows, 1)
+        self.assertEqual(
+            stats.errors,
+            [
+                "line 2: score must be between 0 and 27",
+                "line 3: unknown username 'zed'",
+                "line 4: turn_number must be between 1 and 10",
+            ],
+        )
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Score.id))), 0)
+
+    def test_archived_match_id_is_rejected(self):
+        save_scorecard(self.match.id, self.amy.id, {1: 5})
+        self.match.timestamp = datetime.now(timezone.utc) - timedelta(days=400)
+        db.session.commit()
+        archived = self.match.id
+        archive_matches(cutoff(365))
+        text = f"username,turn_number,score,match_id\namy,2,5,{archived}\n"
+        stats = import_scores(self.records(text), dry_run=True)
+        self.assertEqual(
+            stats.errors, [f"line 2: match_id {archived} is an archived match"]
+        )
+        with self.assertRaises(InvalidRow):
+            import_scores(self.records(text))
+        self.assertIsNone(db.session.get(Match, archived))
+        # the archived match can still be restored under its own id
+        restore_match(archived)
+        db.session.commit()
+        self.assertEqual(build_scoreboard(archived).row_for(self.amy.id).total, 5)
+
+    def test_invalid_row_rolls_back_its_batch(self):
+        text = (
+            "username,turn_number,score,match_id\n"
+            f"amy,1,5,{self.match.id}\n"
+            f"amy,2,5,{self.match.id}\n"
+            f"amy,3,x,{self.match.id}\n"
+        )
+        with self.assertRaises(InvalidRow):
+            import_scores(self.records(text), batch_size=1)
+        # the first two single-row batches were committed
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Score.id))), 2)
+
+
+class DatabaseRoutingCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = sa.create_engine("sqlite://")
+        db.engines[READ_BIND] = self.reader
+
+    def tearDown(self):
+        del db.engines[READ_BIND]
+        self.reader.dispose()
+        super().tearDown()
+
+    def test_get_selects_use_read_engine(self):
+        with app.test_request_context("/matches"):
+            self.assertIs(db.session.get_bind(clause=sa.select(User)), self.reader)
+            self.assertIs(db.session.get_bind(clause=sa.update(User)), db.engine)
+
+    def test_pending_changes_and_posts_use_default_engine(self):
+        with app.test_request_context("/matches"):
+            db.session.add(
+                User(username="amy", email="a@b.c", forename="a", surname="b")
+            )
+            self.assertIs(db.session.get_bind(clause=sa.select(User)), db.engine)
+            db.session.rollback()
+        with app.test_request_context("/match/1", method="POST"):
+            self.assertIs(db.session.get_bind(clause=sa.select(User)), db.engine)
+
+    def test_sqlite_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = sa.create_engine(f"sqlite:///{directory}/test.db")
+            set_sqlite_pragmas(
+                engine,
+                {"journal_mode": "WAL", "busy_timeout": 1234, "query_only": "ON"},
+            )
+            with engine.connect() as connection:
+                run = connection.exec_driver_sql
+                self.assertEqual(run("PRAGMA journal_mode").scalar(), "wal")
+                self.assertEqual(run("PRAGMA busy_timeout").scalar(), 1234)
+                with self.assertRaises(sa.exc.OperationalError):
+                    connection.exec_driver_sql("CREATE TABLE t (id INTEGER)")
+            engine.dispose()
+
+
+class StatsCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.matches = [
+            Match(opponent="o", location="l", timestamp=datetime(2025, 1, day))
+            for day in range(1, FORM_MATCHES + 3)
+        ]
+        db.session.add_all(self.matches)
+        db.session.commit()
+
+    def test_compute(self):
+        # entered out of date order; history comes back oldest first
+        save_scorecard(self.matches[1].id, self.amy.id, {1: 10, 2: 20})
+        save_scorecard(self.matches[0].id, self.amy.id, {1: 0, 3: 6})
+        db.session.commit()
+        stats = compute(*score_history(self.amy.id))
+        self.assertEqual(stats.turns_played, 4)
+        self.assertEqual(stats.matches_played, 2)
+        self.assertEqual(stats.mean, 9.0)
+        self.assertAlmostEqual(
+            stats.stddev, (sum((x - 9) ** 2 for x in (0, 6, 10, 20)) / 4) ** 0.5
+        )
+        self.assertEqual((stats.best_turn, stats.worst_turn), (20, 0))
+        self.assertEqual(stats.turn_averages[:4], [5.0, 20.0, 6.0, None])
+        self.assertEqual(stats.form_trend, [9.0])
+        self.assertEqual(stats.percentiles[50], 8.0)
+
+    def test_form_is_rolling_average_of_recent_matches(self):
+        for n, match in enumerate(self.matches):
+            save_scorecard(match.id, self.amy.id, {1: n})
+        db.session.commit()
+        stats = compute(*score_history(self.amy.id))
+        last = len(self.matches) - 1
+        self.assertEqual(
+            stats.form, sum(range(last - FORM_MATCHES + 1, last + 1)) / FORM_MATCHES
+        )
+        self.assertEqual(len(stats.form_trend), 3)
+
+    def test_no_scores(self):
+        self.assertIsNone(compute(*score_history(self.amy.id)))
+
+    def test_cache_invalidated_by_score_writes(self):
+        save_scorecard(self.matches[0].id, self.amy.id, {1: 4})
+        db.session.commit()
+        self.assertEqual(stats_cache.get(self.amy.id).mean, 4.0)
+        self.assertIs(stats_cache.get(self.amy.id), stats_cache.get(self.amy.id))
+
+        save_scorecard(self.matches[0].id, self.amy.id, {2: 8})
+        db.session.commit()
+        self.assertEqual(stats_cache.get(self.amy.id).mean, 6.0)
+
+        # a write from another process is seen through the DataVersion
+        db.session.execute(sa.delete(Score).where(Score.turn_number == 2))
+        DataVersion.bump(f"user:{self.amy.id}")
+        db.session.commit()
+        self.assertEqual(stats_cache.get(self.amy.id).mean, 4.0)
+
+    def test_user_page_shows_stats(self):
+        save_scorecard(self.matches[0].id, self.amy.id, {1: 4, 2: 8})
+        db.session.commit()
+        with self.client_for(self.amy) as client:
+            html = client.get("/user/amy").get_data(as_text=True)
+        self.assertIn("Statistics", html)
+        self.assertIn("6.00", html)
+
+
+class ScoreGridCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        self.match = Match(opponent="o", location="l")
+        db.session.add(self.match)
+        db.session.commit()
+        save_scorecard(self.match.id, self.amy.id, {1: 5, 3: 27})
+        save_scorecard(self.match.id, self.bob.id, {2: 0})
+        db.session.commit()
+        self.hits, self.misses = scoregrid.hits, scoregrid.misses
+        self.statements = []
+        sa.event.listen(db.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        sa.event.remove(db.engine, "before_cursor_execute", self.record)
+        super().tearDown()
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def counts(self):
+        return scoregrid.hits - self.hits, scoregrid.misses - self.misses
+
+    def assertMatchesDatabase(self):
+        self.assertEqual(
+            scoregrid.scoreboard(self.match.id), build_scoreboard(self.match.id)
+        )
+
+    def test_grid_round_trip(self):
+        rows = db.session.execute(scoreboard_query(self.match.id)).all()
+        grid = ScoreGrid.from_rows(rows, (0, 0))
+        self.assertEqual(grid.turns.dtype, np.int8)
+        self.assertEqual(grid.to_scoreboard(self.match.id), pivot(self.match.id, rows))
+
+    def test_hit_reads_only_versions(self):
+        scoregrid.scoreboard(self.match.id)
+        self.statements.clear()
+        board = scoregrid.scoreboard(self.match.id)
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn("data_version", self.statements[0])
+        self.assertEqual(board.row_for(self.amy.id).turns[:3], [5, None, 27])
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_match_page_reads_versions_once(self):
+        client = self.client_for(self.amy)
+        client.get(f"/match/{self.match.id}")
+        self.statements.clear()
+        response = client.get(f"/match/{self.match.id}")
+        self.assertEqual(response.status_code, 200)
+        reads = [s for s in self.statements if "data_version" in s]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_writes_patch_cached_grid(self):
+        scoregrid.scoreboard(self.match.id)
+        save_scorecard(self.match.id, self.amy.id, {2: 9})
+        remove_turn(self.match.id, self.bob.id, 2)
+        db.session.commit()
+        self.assertMatchesDatabase()
+        self.assertEqual(self.counts()[1], 1)
+        self.assertIsNone(scoregrid.scoreboard(self.match.id).row_for(self.bob.id))
+
+    def test_rollback_discards_patch(self):
+        scoregrid.scoreboard(self.match.id)
+        save_scorecard(self.match.id, self.amy.id, {2: 9})
+        db.session.rollback()
+        self.assertMatchesDatabase()
+        self.assertEqual(self.counts()[1], 1)
+
+    def test_new_player_and_other_writers_reload(self):
+        scoregrid.scoreboard(self.match.id)
+        cat = self.add_user("cat")
+        db.session.commit()
+        save_scorecard(self.match.id, cat.id, {1: 1})
+        db.session.commit()
+        self.assertMatchesDatabase()
+
+        # as if another process wrote to the match
+        db.session.execute(sa.update(Score).values(score=3))
+        DataVersion.bump(f"match:{self.match.id}")
+        db.session.commit()
+        self.assertMatchesDatabase()
+        self.assertEqual(self.counts()[1], 3)
+
+    def test_byte_bound(self):
+        cache = ScoreGridCache()
+        cache.max_bytes = 1024 * 1024
+        other = Match(opponent="o", location="l")
+        db.session.add(other)
+        db.session.commit()
+        save_scorecard(other.id, self.amy.id, {1: 1})
+        db.session.commit()
+        cache.scoreboard(self.match.id)
+        cache.max_bytes = cache.size + 1
+        cache.scoreboard(other.id)
+        self.assertEqual(list(cache._entries), [other.id])
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size, cache._entries[other.id].nbytes)
+
+
+class UserCacheCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.amy = self.add_user("amy")
+        db.session.commit()
+        self.amy_id = self.amy.id
+        db.session.expunge_all()
+        self.statements = []
+        sa.event.listen(db.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        sa.event.remove(db.engine, "before_cursor_execute", self.record)
+        app.config["WTF_CSRF_ENABLED"] = True
+        super().tearDown()
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def test_snapshot_reused_without_query(self):
+        first = load_user(str(self.amy_id))
+        self.assertIsInstance(first, LazyUser)
+        self.statements.clear()
+        second = load_user(str(self.amy_id))
+        self.assertEqual(
+            (second.id, second.username, second.is_active), (1, "amy", True)
+        )
+        self.assertTrue(second.is_authenticated)
+        self.assertEqual(self.statements, [])
+
+    def test_full_user_loaded_on_demand(self):
+        user = load_user(str(self.amy_id))
+        self.statements.clear()
+        self.assertEqual(user.email, "amy@example.com")
+        self.assertEqual(user.avatar(8), user.user.avatar(8))
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(user, db.session.get(User, self.amy_id))
+
+    def test_unknown_user(self):
+        self.assertIsNone(load_user("999"))
+
+    def test_ttl(self):
+        user_cache.ttl = 0
+        try:
+            load_user(str(self.amy_id))
+            self.statements.clear()
+            load_user(str(self.amy_id))
+            self.assertEqual(len(self.statements), 1)
+        finally:
+            user_cache.ttl = app.config["USER_CACHE_TTL"]
+
+    def test_profile_update_invalidates(self):
+        with self.client_for(self.amy) as client:
+            client.get("/profile")
+            response = client.post(
+                "/profile",
+                data={
+                    "username": "amelia",
+                    "email": "amelia@example.com",
+                    "update_profile": "1",
+                },
+            )
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(load_user(str(self.amy_id)).username, "amelia")
+            self.assertIn("amelia", client.get("/profile").get_data(as_text=True))
+
+    def test_delete_user_logs_out(self):
+        with self.client_for(self.amy) as client:
+            client.get("/matches")
+            client.post(f"/user/delete/{self.amy_id}")
+            self.assertFalse(load_user(str(self.amy_id)).is_active)
+            self.assertEqual(client.get("/matches").status_code, 302)
+
+
+class RecordingHandler(Sink):
+    """aiosmtpd handler that keeps what it receives, or refuses it."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.refuse = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return "550 no such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+class MailQueueCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        port = self.free_port()
+        self.handler = RecordingHandler()
+        self.smtp = Controller(self.handler, hostname="127.0.0.1", port=port)
+        self.smtp.start()
+        self.config = {
+            key: app.config.get(key)
+            for key in ("MAIL_SERVER", "MAIL_PORT", "MAIL_USE_TLS", "MAIL_USERNAME")
+        }
+        app.config.update(
+            MAIL_SERVER="127.0.0.1",
+            MAIL_PORT=port,
+            MAIL_USE_TLS=False,
+            MAIL_USERNAME=None,
+        )
+        mail.init_app(app)
+
+    def tearDown(self):
+        self.smtp.stop()
+        app.config.update(self.config)
+        mail.init_app(app)
+        super().tearDown()
+
+    def free_port(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            return probe.getsockname()[1]
+
+    def enqueue(self, n, to="amy@example.com"):
+        for i in range(n):
+            mail_queue.enqueue(f"Reminder {i}", [to], f"Body {i}")
+        db.session.commit()
+
+    def test_sends_batches_over_one_connection(self):
+        mail_queue.batch_size = 3
+        try:
+            self.enqueue(7)
+            self.assertEqual(mail_queue.depth()["pending"], 7)
+            self.assertEqual(mail_queue.send_due(), 7)
+        finally:
+            mail_queue.batch_size = app.config["MAIL_QUEUE_BATCH_SIZE"]
+        self.assertEqual(len(self.handler.messages), 7)
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertEqual(mail_queue.depth()["sent"], 7)
+        self.assertIn(b"Subject: Reminder 0", self.handler.messages[0].content)
+
+    def test_rolled_back_mail_is_not_sent(self):
+        mail_queue.enqueue("Hi", ["amy@example.com"], "Body")
+        db.session.rollback()
+        self.assertEqual(mail_queue.send_due(), 0)
+
+    def test_refused_message_retried_with_backoff(self):
+        self.handler.refuse.add("bad@example.com")
+        self.enqueue(1, to="bad@example.com")
+        self.enqueue(1)
+        self.assertEqual(mail_queue.send_due(), 1)
+        failed = db.session.scalar(
+            sa.select(OutboundMail).where(OutboundMail.attempts == 1)
+        )
+        self.assertEqual(failed.status, "pending")
+        self.assertIn("550", failed.last_error)
+        self.assertGreater(
+            failed.next_attempt_at, datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+        # not due again until the backoff has passed
+        self.assertEqual(mail_queue.send_due(), 0)
+
+        for attempt in range(2, app.config["MAIL_QUEUE_MAX_ATTEMPTS"] + 1):
+            failed.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            db.session.commit()
+            mail_queue.send_due()
+            db.session.refresh(failed)
+            self.assertEqual(failed.attempts, attempt)
+        self.assertEqual(failed.status, "failed")
+
+    def test_dropped_connection_keeps_what_was_delivered(self):
+        send = flask_mail.Connection.send
+        calls = []
+
+        def drop_on_third(connection, message):
+            calls.append(message.subject)
+            if len(calls) == 3:
+                connection.host.close()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            send(connection, message)
+
+        self.enqueue(4)
+        with patch.object(flask_mail.Connection, "send", drop_on_third):
+            self.assertEqual(mail_queue.send_due(), 2)
+        self.assertEqual(mail_queue.depth()["sent"], 2)
+        self.assertEqual(mail_queue.depth()["pending"], 2)
+
+        db.session.execute(
+            sa.update(OutboundMail).values(
+                next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+            )
+        )
+        db.session.commit()
+        self.assertEqual(mail_queue.send_due(), 2)
+        subjects = [
+            m.content.split(b"Subject: ")[1].split(b"\r\n")[0]
+            for m in self.handler.messages
+        ]
+        self.assertEqual(
+            sorted(subjects),
+            [b"Reminder 0", b"Reminder 1", b"Reminder 2", b"Reminder 3"],
+        )
+
+    def test_unreachable_server_keeps_mail_queued(self):
+        app.config["MAIL_PORT"] = self.free_port()
+        mail.init_app(app)
+        self.enqueue(2)
+        self.assertEqual(mail_queue.send_due(), 0)
+        self.assertEqual(mail_queue.depth()["pending"], 2)
+
+    def test_metrics(self):
+        self.enqueue(2)
+        body = app.test_client().get("/metrics").get_data(as_text=True)
+        self.assertIn('skylog_mail_queue_depth{status="pending"} 2', body)
+
+
+class AssetsCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_root = assets.root
+        self.tmp = tempfile.TemporaryDirectory()
+        assets.root = self.tmp.name
+        assets.clear()
+        os.mkdir(os.path.join(self.tmp.name, "js"))
+        self.source = b"console.log('skylog');\n" * 50
+        with open(os.path.join(self.tmp.name, "js", "app.js"), "wb") as f:
+            f.write(self.source)
+
+    def tearDown(self):
+        assets.root = self.original_root
+        assets.clear()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_url_contains_content_hash(self):
+        with app.test_request_context():
+            url = assets.static_url("js/app.js")
+            self.assertRegex(url, r"^/assets/js/app\.[0-9a-f]{10}\.js$")
+            with open(os.path.join(self.tmp.name, "js", "app.js"), "ab") as f:
+                f.write(b"// changed\n")
+            assets.clear()
+            self.assertNotEqual(assets.static_url("js/app.js"), url)
+            # files that do not exist fall back to the plain static URL
+            self.assertEqual(
+                assets.static_url("js/missing.js"), "/static/js/missing.js"
+            )
+
+    def test_served_immutable(self):
+        with app.test_request_context():
+            url = assets.static_url("js/app.js")
+        response = app.test_client().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.source)
+        self.assertIn("javascript", response.mimetype)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual(response.cache_control.max_age, FAR_FUTURE)
+        self.assertIn("Accept-Encoding", response.vary)
+
+    def test_stale_or_unhashed_url_not_found(self):
+        client = app.test_client()
+        self.assertEqual(client.get("/assets/js/app.0123456789.js").status_code, 404)
+        self.assertEqual(client.get("/assets/js/app.js").status_code, 404)
+
+    def test_precompressed_variant(self):
+        written = build_assets(self.tmp.name)
+        with app.test_request_context():
+            url = assets.static_url("js/app.js")
+        self.assertEqual(
+            written, [os.path.join(self.tmp.name, url[len("/assets/") :] + ".gz")]
+        )
+        client = app.test_client()
+
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.content_encoding, "gzip")
+        self.assertEqual(gzip.decompress(response.data), self.source)
+        self.assertIn("javascript", response.mimetype)
+
+        response = client.get(url)
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data, self.source)
+
+    def test_variant_from_older_content_not_served(self):
+        build_assets(self.tmp.name)
+        changed = self.source + b"// changed\n"
+        with open(os.path.join(self.tmp.name, "js", "app.js"), "wb") as f:
+            f.write(changed)
+        assets.clear()
+        with app.test_request_context():
+            url = assets.static_url("js/app.js")
+        client = app.test_client()
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data, changed)
+
+        # rebuilding replaces the old variant with one for the new content
+        build_assets(self.tmp.name)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tmp.name, "js"))),
+            [url.rsplit("/", 1)[1] + ".gz", "app.js"],
+        )
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.content_encoding, "gzip")
+        self.assertEqual(gzip.decompress(response.data), changed)
+
+    def test_matches_page_uses_hashed_script(self):
+        assets.root = self.original_root
+        amy = self.add_user("amy")
+        db.session.commit()
+        body = self.client_for(amy).get("/matches").get_data(as_text=True)
+        self.assertRegex(body, r'src="/assets/js/matches\.[0-9a-f]{10}\.js"')
+        self.assertNotIn("?v=", body)
+
+
+class ArchiveCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        now = datetime.now(timezone.utc)
+        self.old = Match(
+            opponent="old", location="l", timestamp=now - timedelta(days=400)
+        )
+        self.new = Match(opponent="new", location="l", timestamp=now)
+        db.session.add_all([self.old, self.new])
+        db.session.commit()
+        for match in (self.old, self.new):
+            save_scorecard(match.id, self.amy.id, {1: 5, 2: 7})
+            save_scorecard(match.id, self.bob.id, {1: 3})
+        db.session.commit()
+        self.old_id, self.new_id = self.old.id, self.new.id
+        self.statements = []
+        sa.event.listen(db.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        sa.event.remove(db.engine, "before_cursor_execute", self.record)
+        super().tearDown()
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def test_delete_is_one_statement(self):
+        self.statements.clear()
+        self.assertEqual(delete_matches([self.old_id]), 1)
+        db.session.commit()
+        # emptied leaderboard entries are deleted by the ORM afterwards
+        deletes = [
+            s
+            for s in self.statements
+            if s.startswith("DELETE") and "leaderboard_entry" not in s
+        ]
+        self.assertEqual(len(deletes), 1)
+        # the scores and rollups went by ON DELETE CASCADE
+        self.assertEqual(
+            db.session.scalar(
+                sa.select(sa.func.count(Score.id)).where(Score.match_id == self.old_id)
+            ),
+            0,
+        )
+        self.assertIsNone(db.session.get(MatchTotal, (self.old_id, self.amy.id)))
+        self.assertEqual(db.session.get(UserTotal, self.amy.id).total, 12)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_archive_and_restore(self):
+        self.assertEqual(archive_matches(cutoff(365), dry_run=True).matches, 1)
+        stats = archive_matches(cutoff(365))
+        self.assertEqual((stats.matches, stats.scores), (1, 3))
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Match, self.old_id))
+        self.assertIsNotNone(db.session.get(Match, self.new_id))
+        self.assertEqual(db.session.get(UserTotal, self.amy.id).matches_played, 1)
+        self.assertEqual(rollups.verify(), [])
+
+        board = archived_scoreboard(self.old_id)
+        self.assertEqual(board.row_for(self.amy.id).turns[:3], [5, 7, None])
+
+        self.assertTrue(restore_match(self.old_id))
+        db.session.commit()
+        self.assertEqual(db.session.get(Match, self.old_id).opponent, "old")
+        self.assertEqual(db.session.get(UserTotal, self.amy.id).matches_played, 2)
+        self.assertEqual(rollups.verify(), [])
+        self.assertFalse(restore_match(self.old_id))
+
+    def test_archived_ids_are_not_reused(self):
+        newest_score = db.session.scalar(sa.select(sa.func.max(Score.id)))
+        # everything, including the newest match and score
+        archive_matches(datetime.now(timezone.utc) + timedelta(days=1))
+        match = Match(opponent="next", location="l")
+        db.session.add(match)
+        db.session.commit()
+        save_scorecard(match.id, self.amy.id, {1: 4})
+        db.session.commit()
+        self.assertGreater(match.id, self.new_id)
+        self.assertGreater(
+            db.session.scalar(sa.select(sa.func.max(Score.id))), newest_score
+        )
+
+        self.assertTrue(restore_match(self.new_id))
+        self.assertTrue(restore_match(self.old_id))
+        db.session.commit()
+        self.assertEqual(db.session.get(UserTotal, self.amy.id).matches_played, 3)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_restore_refuses_taken_score_ids(self):
+        archive_matches(cutoff(365))
+        archived_id = db.session.scalar(sa.select(sa.func.min(ArchivedScore.id)))
+        # as a database from before AUTOINCREMENT could have reused it
+        db.session.add(
+            Score(
+                id=archived_id,
+                user_id=self.amy.id,
+                match_id=self.new_id,
+                turn_number=3,
+                score=1,
+            )
+        )
+        db.session.commit()
+        with self.assertRaisesRegex(MatchIdTaken, f"scores {archived_id} "):
+            restore_match(self.old_id)
+
+    def test_archived_match_readable(self):
+        archive_matches(cutoff(365))
+        client = self.client_for(self.amy)
+        response = client.get(f"/match/{self.old_id}")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith(f"/archive/{self.old_id}"))
+        body = client.get(f"/archive/{self.old_id}").get_data(as_text=True)
+        self.assertIn("Archived matches are read only", body)
+        self.assertIn("<td>12</td>", body)
+        self.assertEqual(client.get(f"/archive/{self.new_id}").status_code, 404)
+
+    def test_archive_command(self):
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["archive", "run", "--older-than", "30"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn(
+            "Archived 1 matches older than 30 days and 3 scores.", result.output
+        )
+        result = runner.invoke(args=["archive", "restore", str(self.old_id)])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(args=["archive", "restore", str(self.old_id)])
+        self.assertNotEqual(result.exit_code, 0)
+
+
+class LeaderboardCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        self.cat = self.add_user("cat")
+        self.home = Match(
+            opponent="Bramley", location="l", timestamp=datetime(2025, 5, 1, 19, 0)
+        )
+        self.away = Match(
+            opponent="Denholme", location="l", timestamp=datetime(2026, 5, 1, 19, 0)
+        )
+        db.session.add_all([self.home, self.away])
+        db.session.commit()
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        super().tearDown()
+
+    def entry(self, board, user):
+        return db.session.get(LeaderboardEntry, (board, user.id))
+
+    def test_ties_share_a_rank_across_pages(self):
+        dan = self.add_user("dan")
+        for user, total in ((self.amy, 3), (self.bob, 5), (self.cat, 9), (dan, 5)):
+            save_scorecard(self.home.id, user.id, {1: total})
+        db.session.commit()
+
+        page, cursor = top("overall", per_page=2)
+        self.assertEqual([(s.rank, s.username) for s in page], [(1, "cat"), (2, "bob")])
+        page, cursor = top("overall", cursor=cursor, per_page=2)
+        self.assertEqual([(s.rank, s.username) for s in page], [(2, "dan"), (4, "amy")])
+        self.assertIsNone(cursor)
+        self.assertEqual(standing("overall", dan.id).rank, 2)
+        self.assertEqual(board_count("overall"), 4)
+
+    def test_entries_follow_score_writes(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 5, 2: 7})
+        save_scorecard(self.away.id, self.amy.id, {1: 9})
+        save_scorecard(self.home.id, self.bob.id, {1: 20})
+        db.session.commit()
+        self.assertEqual(self.entry("overall", self.amy).total, 21)
+        self.assertEqual(self.entry("season:2025", self.amy).total, 12)
+        self.assertEqual(self.entry("opponent:Denholme", self.amy).matches_played, 1)
+        self.assertIsNone(self.entry("opponent:Denholme", self.bob))
+
+        remove_turn(self.away.id, self.amy.id, 1)
+        db.session.commit()
+        self.assertIsNone(self.entry("season:2026", self.amy))
+        self.assertEqual(self.entry("overall", self.amy).matches_played, 1)
+        self.assertEqual(rollups.verify(), [])
+
+        delete_matches([self.home.id])
+        db.session.commit()
+        self.assertEqual(
+            db.session.scalar(sa.select(sa.func.count()).select_from(LeaderboardEntry)),
+            0,
+        )
+
+    def test_ranks_and_pages(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 10})
+        save_scorecard(self.home.id, self.bob.id, {1: 20})
+        save_scorecard(self.home.id, self.cat.id, {1: 10})
+        db.session.commit()
+
+        page, cursor = top("overall", per_page=2)
+        self.assertIsNotNone(cursor)
+        self.assertEqual([(s.rank, s.username) for s in page], [(1, "bob"), (2, "amy")])
+        page, cursor = top("overall", cursor=cursor, per_page=2)
+        self.assertIsNone(cursor)
+        self.assertEqual([(s.rank, s.username) for s in page], [(2, "cat")])
+        self.assertEqual(standing("overall", self.cat.id).rank, 2)
+        self.assertIsNone(standing("season:2026", self.cat.id))
+
+        # the write moves cat's total in the cached index, so it shows at
+        # once without reading the board again
+        misses = rank_cache.misses
+        save_scorecard(self.away.id, self.cat.id, {1: 15})
+        db.session.commit()
+        self.assertEqual(standing("overall", self.cat.id).rank, 1)
+        self.assertEqual(standing("overall", self.bob.id).rank, 2)
+        self.assertEqual(rank_cache.misses, misses)
+
+    def test_rank_index_shares_ties(self):
+        index = RankIndex([3, 5, 5, 9], 1)
+        self.assertEqual([index.rank(t) for t in (9, 5, 3)], [1, 2, 4])
+        # a total not on the board ranks where it would be inserted
+        self.assertEqual(index.rank(6), 2)
+        self.assertTrue(index.move(5, 10))
+        self.assertTrue(index.move(None, 1))
+        self.assertTrue(index.move(3, None))
+        self.assertEqual(index.totals, [1, 5, 9, 10])
+        self.assertFalse(index.move(4, 6))
+
+    def test_rank_cache_checks_each_board(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 10})
+        save_scorecard(self.away.id, self.bob.id, {1: 20})
+        db.session.commit()
+        self.assertEqual(standing("season:2025", self.amy.id).rank, 1)
+        misses = rank_cache.misses
+
+        # another season's write leaves this board's index alone
+        save_scorecard(self.away.id, self.cat.id, {1: 30})
+        db.session.commit()
+        self.assertEqual(standing("season:2025", self.amy.id).rank, 1)
+        self.assertEqual(rank_cache.misses, misses)
+
+        # a write this process did not see, e.g. from another worker, is
+        # caught by the board's version
+        db.session.add(
+            LeaderboardEntry(
+                board="season:2025",
+                user_id=self.cat.id,
+                total=50,
+                turns_played=1,
+                matches_played=1,
+            )
+        )
+        DataVersion.bump(leaderboard_version_key("season:2025"))
+        db.session.commit()
+        self.assertEqual(standing("season:2025", self.amy.id).rank, 2)
+        self.assertEqual(rank_cache.misses, misses + 1)
+
+        # a rolled back write moves nothing
+        save_scorecard(self.home.id, self.bob.id, {1: 60})
+        db.session.rollback()
+        self.assertEqual(standing("season:2025", self.amy.id).rank, 2)
+        self.assertEqual(board_count("season:2025"), 2)
+
+    def test_editing_match_moves_boards(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 5})
+        db.session.commit()
+        with self.client_for(self.amy) as client:
+            client.post(
+                f"/match/edit/{self.home.id}",
+                data={
+                    "opponent": "Castleton",
+                    "location": "l",
+                    "date": "2026-06-01 19:00",
+                },
+            )
+        self.assertIsNone(self.entry("opponent:Bramley", self.amy))
+        self.assertIsNone(self.entry("season:2025", self.amy))
+        self.assertEqual(self.entry("opponent:Castleton", self.amy).total, 5)
+        self.assertEqual(self.entry("season:2026", self.amy).total, 5)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_leaderboard_page(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 10})
+        save_scorecard(self.away.id, self.bob.id, {1: 20})
+        db.session.commit()
+        client = self.client_for(self.amy)
+        body = client.get("/leaderboard").get_data(as_text=True)
+        self.assertIn("You are <strong>#2</strong> of 2", body)
+        self.assertIn('<option value="2026"', body)
+        body = client.get("/leaderboard?season=2025").get_data(as_text=True)
+        self.assertIn("You are <strong>#1</strong> of 1", body)
+        self.assertNotIn(">bob<", body)
+        body = client.get("/leaderboard?opponent=Denholme").get_data(as_text=True)
+        self.assertNotIn("You are", body)
+        self.assertIn(">bob<", body)
+        self.assertEqual(client.get("/leaderboard?after=bogus").status_code, 400)
+
+    def test_head_to_head_best_match(self):
+        spare = Match(
+            opponent="Bramley", location="l", timestamp=datetime(2025, 6, 1, 19, 0)
+        )
+        db.session.add(spare)
+        db.session.commit()
+        save_scorecard(self.home.id, self.amy.id, {1: 5, 2: 7})
+        save_scorecard(spare.id, self.amy.id, {1: 9})
+        save_scorecard(self.away.id, self.amy.id, {1: 4})
+        db.session.commit()
+        home = self.home.id
+        bramley = self.entry("opponent:Bramley", self.amy)
+        self.assertEqual((bramley.best_match_id, bramley.best_match_total), (home, 12))
+
+        # the best match going down looks the best up again
+        remove_turn(home, self.amy.id, 2)
+        db.session.commit()
+        self.assertEqual(
+            (bramley.best_match_id, bramley.best_match_total), (spare.id, 9)
+        )
+        self.assertEqual(self.entry("season:2025", self.amy).best_match_id, spare.id)
+
+        # and so does renaming the opponent of the best match
+        with self.client_for(self.amy) as client:
+            client.post(
+                f"/match/edit/{spare.id}",
+                data={
+                    "opponent": "Denholme",
+                    "location": "l",
+                    "date": "2025-06-01 19:00",
+                },
+            )
+        self.assertEqual((bramley.best_match_id, bramley.best_match_total), (home, 5))
+        self.assertEqual(
+            self.entry("opponent:Denholme", self.amy).best_match_id, spare.id
+        )
+        self.assertEqual(rollups.verify(), [])
+
+        delete_matches([spare.id])
+        db.session.commit()
+        self.assertEqual(self.entry("overall", self.amy).best_match_id, home)
+        self.assertEqual(rollups.verify(), [])
+
+        records = head_to_head(self.amy.id)
+        self.assertEqual(
+            [
+                (r.opponent, r.matches_played, r.total, r.best_match_total)
+                for r in records
+            ],
+            [("Bramley", 1, 5, 5), ("Denholme", 1, 4, 4)],
+        )
+
+    def test_opponents_json(self):
+        save_scorecard(self.home.id, self.amy.id, {1: 6, 2: 4})
+        db.session.commit()
+        client = self.client_for(self.bob)
+        data = client.get("/user/amy/opponents.json").get_json()
+        self.assertEqual(data["username"], "amy")
+        self.assertEqual(
+            data["opponents"],
+            [
+                {
+                    "opponent": "Bramley",
+                    "matches_played": 1,
+                    "total": 10,
+                    "turns_played": 2,
+                    "average": 5.0,
+                    "best_match": {
+                        "id": self.home.id,
+                        "total": 10,
+                        "timestamp": "2025-05-01T19:00:00",
+                    },
+                }
+            ],
+        )
+        self.assertEqual(
+            client.get("/user/bob/opponents.json").get_json()["opponents"], []
+        )
+        self.assertEqual(client.get("/user/nobody/opponents.json").status_code, 404)
+        body = client.get("/user/amy").get_data(as_text=True)
+        self.assertIn("Head to Head", body)
+
+    def test_rebuild_command(self):
+        db.session.add(
+            Score(user_id=self.amy.id, match_id=self.home.id, turn_number=1, score=6)
+        )
+        db.session.commit()
+        self.assertNotEqual(rollups.verify(), [])
+        result = app.test_cli_runner().invoke(args=["leaderboard", "rebuild"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Rebuilt 3 leaderboard entries.", result.output)
+        self.assertEqual(self.entry("season:2025", self.amy).total, 6)
+
+
+class LiveScoresCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amy = self.add_user("amy")
+        self.bob = self.add_user("bob")
+        self.match = Match(opponent="o", location="l")
+        db.session.add(self.match)
+        db.session.commit()
+        self.responses = []
+
+    def tearDown(self):
+        for response in self.responses:
+            response.close()
+        live_scores.max_subscribers = app.config["LIVE_MAX_SUBSCRIBERS"]
+        live_scores.keepalive = app.config["LIVE_KEEPALIVE"]
+        super().tearDown()
+
+    def open_stream(self, since=0):
+        response = self.client_for(self.amy).get(
+            f"/match/{self.match.id}/events?since={since}"
+        )
+        self.responses.append(response)
+        return response
+
+    def test_stream_sends_score_events(self):
+        response = self.open_stream()
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = iter(response.response)
+        self.assertTrue(next(events).startswith(b"retry:"))
+
+        save_scorecard(self.match.id, self.bob.id, {1: 5, 2: 7})
+        db.session.commit()
+        message = next(events).decode()
+        self.assertTrue(message.startswith("id: 1\nevent: score\n"))
+        data = json.loads(message.split("data: ", 1)[1])
+        self.assertEqual(data["username"], "bob")
+        self.assertEqual(data["turns"], {"1": 5, "2": 7})
+
+        remove_turn(self.match.id, self.bob.id, 1)
+        db.session.commit()
+        data = json.loads(next(events).decode().split("data: ", 1)[1])
+        self.assertEqual((data["version"], data["turns"]), (2, {"1": None}))
+
+        self.assertEqual(live_scores.subscriber_count(), 1)
+        response.close()
+        self.assertEqual(live_scores.subscriber_count(), 0)
+
+    def test_rolled_back_write_is_not_sent(self):
+        response = self.open_stream()
+        events = iter(response.response)
+        next(events)
+        save_scorecard(self.match.id, self.bob.id, {1: 5})
+        db.session.rollback()
+        save_scorecard(self.match.id, self.bob.id, {1: 9})
+        db.session.commit()
+        data = json.loads(next(events).decode().split("data: ", 1)[1])
+        self.assertEqual(data["turns"], {"1": 9})
+
+    def test_missed_change_is_stale(self):
+        save_scorecard(self.match.id, self.bob.id, {1: 5})
+        db.session.commit()
+        # the page was rendered before that write
+        body = self.open_stream(since=0).get_data(as_text=True)
+        self.assertTrue(body.endswith("event: stale\ndata: {}\n\n"))
+        self.assertEqual(live_scores.subscriber_count(), 0)
+
+    def test_keepalive_notices_unannounced_change(self):
+        live_scores.keepalive = 0
+        events = iter(self.open_stream().response)
+        next(events)
+        self.assertEqual(next(events), b": keepalive\n\n")
+        # e.g. a match edit, or a write handled by another process
+        DataVersion.bump(f"match:{self.match.id}")
+        db.session.commit()
+        self.assertEqual(next(events), b"event: stale\ndata: {}\n\n")
+
+    def test_subscriber_cap(self):
+        live_scores.max_subscribers = 1
+        first = self.open_stream()
+        self.assertEqual(first.status_code, 200)
+        second = self.open_stream()
+        self.assertEqual(second.status_code, 503)
+        self.assertEqual(second.headers["Retry-After"], "30")
+        first.close()
+        self.assertEqual(self.open_stream().status_code, 200)
+
+    def test_match_page_links_stream(self):
+        save_scorecard(self.match.id, self.bob.id, {1: 5})
+        db.session.commit()
+        body = self.client_for(self.amy).get(f"/match/{self.match.id}")
+        body = body.get_data(as_text=True)
+        self.assertIn(f"/match/{self.match.id}/events?since=1", body)
+        self.assertIn(f'data-user-id="{self.bob.id}"', body)
+        response = self.client_for(self.amy).get(f"/match/{self.match.id}/events")
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryPlanCase(DatabaseTestCase):
+    """Runs EXPLAIN QUERY PLAN on every statement issued by the views in
+    the auth, matches and scores blueprints and the methods in app/models.py, and fails on full scans.
+    """
+
+    def setUp(self):
+        super().setUp()
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.statements = []
+        self.endpoints = set()
+        sa.event.listen(db.engine, "before_cursor_execute", self.record)
+        request_finished.connect(self.record_endpoint, app)
+
+    def tearDown(self):
+        request_finished.disconnect(self.record_endpoint, app)
+        sa.event.remove(db.engine, "before_cursor_execute", self.record)
+        app.config["WTF_CSRF_ENABLED"] = True
+        super().tearDown()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0]
+        self.statements.append((statement, parameters))
+
+    def record_endpoint(self, sender, response, **extra):
+        self.endpoints.add(request.endpoint)
+
+    def full_scans(self):
+        scans = []
+        connection = db.engine.raw_connection()
+        try:
+            for statement, parameters in self.statements:
+                if statement.split(None, 1)[0].upper() not in (
+                    "SELECT",
+                    "UPDATE",
+                    "DELETE",
+                    "INSERT",
+                ):
+                    continue
+                plan = connection.execute(
+                    "EXPLAIN QUERY PLAN " + statement, parameters
+                ).fetchall()
+                for row in plan:
+                    detail = row[-1]
+                    if (
+                        detail.startswith("SCAN ")
+                        and " USING " not in detail
+                        and not detail.startswith("SCAN (")
+                        and "CONSTANT ROW" not in detail
+                        # an FTS5 lookup by MATCH
+                        and not re.search(r"VIRTUAL TABLE INDEX \d+:M", detail)
+                    ):
+                        scans.append(f"{detail}: {statement}")
+        finally:
+            connection.close()
+        return scans
+
+    def test_no_full_table_scans(self):
+        amy = self.add_user("amy")
+        amy.set_password("secret")
+        bob = self.add_user("bob")
+        bob.set_password("secret")
+        db.session.commit()
+        self.statements.clear()
+
+        def expect(status, response):
+            # a request that fails, e.g. with a 405, plans nothing
+            self.assertEqual(response.status_code, status, response.request.path)
+            return response
+
+        with app.test_client() as client:
+            expect(200, client.get("/register"))
+            expect(
+                302,
+                client.post(
+                    "/register",
+                    data={
+                        "username": "cat",
+                        "email": "cat@example.com",
+                        "forename": "cat",
+                        "surname": "test",
+                        "password": "secret",
+                        "password_check": "secret",
+                    },
+                ),
+            )
+            expect(200, client.get("/login"))
+            expect(
+                302,
+                client.post("/login", data={"username": "amy", "password": "secret"}),
+            )
+            expect(200, client.get("/matches"))
+            expect(
+                302,
+                client.post(
+                    "/match",
+                    data={"opponent": "o", "location": "l", "date": "2025-01-01 12:00"},
+                ),
+            )
+            match_id = db.session.scalar(sa.select(sa.func.max(Match.id)))
+            expect(200, client.get(f"/match/edit/{match_id}"))
+            expect(
+                302,
+                client.post(
+                    f"/match/edit/{match_id}",
+                    data={
+                        "opponent": "o2",
+                        "location": "l",
+                        "date": "2025-01-02 12:00",
+                    },
+                ),
+            )
+            expect(200, client.get("/matches/more"))
+            expect(200, client.get("/matches?q=o2&since=2025-01-01&until=2025-12-31"))
+            expect(200, client.get("/matches/more?q=o2"))
+            expect(200, client.get(f"/match/{match_id}"))
+            expect(
+                302,
+                client.post(f"/match/{match_id}", data={"turn_1": "3", "turn_2": "4"}),
+            )
+            expect(200, client.get(f"/match/{match_id}/events?since=0")).get_data()
+            expect(
+                302,
+                client.post(f"/remove_score/{match_id}", data={"turn_to_remove": "1"}),
+            )
+            expect(200, client.get("/user/amy"))
+            expect(200, client.get("/user/bob"))
+            expect(200, client.get("/user/amy/opponents.json"))
+            expect(200, client.get("/leaderboard"))
+            expect(200, client.get("/leaderboard?season=2025"))
+            expect(
+                200,
+                client.get(
+                    "/leaderboard?after="
+                    + encode_entry_cursor(LeaderboardEntry(total=7, user_id=amy.id))
+                ),
+            )
+            expect(200, client.get("/leaderboard?opponent=o2"))
+            # unfiltered exports read every row by design
+            expect(200, client.get("/export/scores.csv?user=amy&after=1"))
+            expect(200, client.get("/export/matches.ndjson?user=amy"))
+            expect(200, client.get("/profile"))
+            expect(
+                302,
+                client.post(
+                    "/profile",
+                    data={
+                        "username": "amy",
+                        "email": "amy@example.org",
+                        "update_profile": "1",
+                    },
+                ),
+            )
+            expect(
+                302,
+                client.post(
+                    "/profile",
+                    data={
+                        "current_password": "secret",
+                        "new_password": "secret2",
+                        "confirm_new_password": "secret2",
+                        "change_password": "1",
+                    },
+                ),
+            )
+            # archived and restored, to cover the archive page and queries
+            archive_matches(cutoff(0))
+            expect(302, client.get(f"/match/{match_id}"))
+            expect(200, client.get(f"/archive/{match_id}"))
+            restore_match(match_id)
+            db.session.commit()
+            expect(302, client.post(f"/matches/delete/{match_id}"))
+            expect(302, client.get("/logout"))
+            expect(
+                302,
+                client.post("/login", data={"username": "bob", "password": "secret"}),
+            )
+            expect(302, client.post(f"/user/delete/{bob.id}"))
+
+        # model methods not reached through the views above
+        match = Match(opponent="o", location="l")
+        db.session.add(match)
+        db.session.commit()
+        save_scorecard(match.id, amy.id, {1: 5})
+        db.session.commit()
+        db.session.execute(match.get_scores()).all()
+        load_user(str(amy.id))
+        score = amy.get_all_scores()[0]
+        amy.remove_score(score)
+
+        view_endpoints = {
+            endpoint
+            for endpoint, view in app.view_functions.items()
+            if view.__module__ in ("app.auth", "app.matches", "app.scores")
+        }
+        self.assertEqual(view_endpoints - self.endpoints, set())
+        self.assertEqual(self.full_scans(), [])
+
+    def test_detects_full_scan(self):
+        db.session.execute(sa.select(Score).where(Score.score == 27)).all()
+        self.assertEqual(len(self.full_scans()), 1)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)